@@ -0,0 +1,11 @@
+BEGIN;
+
+CREATE TABLE api_key_usage (
+  api_key       TEXT   NOT NULL, -- FK to api_key (value)
+  request_count BIGINT NOT NULL DEFAULT 0,
+  last_used     TIMESTAMP WITH TIME ZONE
+);
+
+ALTER TABLE api_key_usage ADD CONSTRAINT api_key_usage_pkey PRIMARY KEY (api_key);
+
+COMMIT;
@@ -0,0 +1,5 @@
+BEGIN;
+
+ALTER TABLE "user" ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+COMMIT;
@@ -0,0 +1,94 @@
+"""
+Moves recording MBIDs from dataset_class_member into the recording table.
+
+Until the last step, a trigger fills whichever of the old (mbid) and new
+(recording) columns is missing in new rows, so the previous version of the
+code keeps working while existing rows are updated. Deploy the new version
+right after the migration.
+
+If the migration fails after the mbid column has been dropped, running it again
+only adds the foreign key; the trigger can't be recreated without that column.
+"""
+
+
+def upgrade(op):
+    if _column_exists(op, "mbid"):
+        _move_mbids(op)
+    op.add_constraint("dataset_class_member", "class_member_fk_recording",
+                      "FOREIGN KEY (recording) REFERENCES recording (id)")
+
+
+def _column_exists(op, column):
+    return bool(op.query("""
+        SELECT 1
+          FROM information_schema.columns
+         WHERE table_name = 'dataset_class_member'
+           AND column_name = :column
+    """, {"column": column}))
+
+
+def _move_mbids(op):
+    with op.transaction() as execute:
+        execute("""
+            CREATE TABLE IF NOT EXISTS recording (
+              id   SERIAL,
+              mbid UUID NOT NULL,
+              CONSTRAINT recording_pkey PRIMARY KEY (id),
+              CONSTRAINT recording_mbid_key UNIQUE (mbid)
+            )
+        """)
+        if not _column_exists(op, "recording"):
+            execute("ALTER TABLE dataset_class_member ADD COLUMN recording INT")
+        execute("""
+            CREATE OR REPLACE FUNCTION dataset_class_member_sync_recording() RETURNS TRIGGER AS $$
+            BEGIN
+              IF NEW.recording IS NULL THEN
+                INSERT INTO recording (mbid) VALUES (NEW.mbid) ON CONFLICT (mbid) DO NOTHING;
+                SELECT id INTO NEW.recording FROM recording WHERE mbid = NEW.mbid;
+              ELSIF NEW.mbid IS NULL THEN
+                SELECT mbid INTO NEW.mbid FROM recording WHERE id = NEW.recording;
+              END IF;
+              RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        execute("DROP TRIGGER IF EXISTS dataset_class_member_sync_recording ON dataset_class_member")
+        execute("""
+            CREATE TRIGGER dataset_class_member_sync_recording
+              BEFORE INSERT ON dataset_class_member
+              FOR EACH ROW EXECUTE PROCEDURE dataset_class_member_sync_recording()
+        """)
+
+    op.backfill("dataset_class_member", "class", [
+        """
+        INSERT INTO recording (mbid)
+             SELECT DISTINCT mbid
+               FROM dataset_class_member
+              WHERE class >= :start AND class < :end
+                AND recording IS NULL
+        ON CONFLICT (mbid) DO NOTHING
+        """,
+        """
+        UPDATE dataset_class_member
+           SET recording = recording.id
+          FROM recording
+         WHERE class >= :start AND class < :end
+           AND dataset_class_member.recording IS NULL
+           AND recording.mbid = dataset_class_member.mbid
+        """,
+    ])
+
+    op.create_index("dataset_class_member_pkey_new", "dataset_class_member", "class, recording", unique=True)
+    op.create_index("recording_ndx_dataset_class_member", "dataset_class_member", "recording")
+
+    with op.transaction() as execute:
+        execute("DROP TRIGGER dataset_class_member_sync_recording ON dataset_class_member")
+        execute("DROP FUNCTION dataset_class_member_sync_recording()")
+        execute("ALTER TABLE dataset_class_member DROP CONSTRAINT dataset_class_member_pkey")
+        # Primary key columns are made NOT NULL, which takes a scan of the table
+        execute("""
+            ALTER TABLE dataset_class_member
+              ADD CONSTRAINT dataset_class_member_pkey
+              PRIMARY KEY USING INDEX dataset_class_member_pkey_new
+        """)
+        execute("ALTER TABLE dataset_class_member DROP COLUMN mbid")
@@ -0,0 +1,15 @@
+"""
+Adds indexes for lookups of API keys by their values and owners, and of
+datasets by their authors.
+"""
+
+
+def upgrade(op):
+    op.create_index("api_key_value_key", "api_key", "value", unique=True)
+    if op.query("SELECT 1 FROM pg_constraint WHERE conname = 'api_key_value_key'") == []:
+        op.execute("ALTER TABLE api_key ADD CONSTRAINT api_key_value_key UNIQUE USING INDEX api_key_value_key")
+    op.create_index("owner_ndx_api_key", "api_key", "owner")
+    op.create_index("author_ndx_dataset", "dataset", "author")
+
+    op.add_constraint("api_key_usage", "api_key_usage_fk_api_key",
+                      "FOREIGN KEY (api_key) REFERENCES api_key (value)")
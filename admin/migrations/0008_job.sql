@@ -0,0 +1,34 @@
+BEGIN;
+
+CREATE TYPE job_status AS ENUM ('pending', 'running', 'done', 'failed', 'cancelled');
+
+CREATE TABLE job (
+  id               UUID,
+  type             VARCHAR    NOT NULL,
+  status           job_status NOT NULL DEFAULT 'pending',
+  priority         INTEGER    NOT NULL DEFAULT 0, -- jobs with higher priority run first
+  owner            INTEGER, -- FK to user
+  payload          JSONB, -- removed when the job is finished
+  result           JSONB,
+  error            TEXT,
+  progress         REAL       NOT NULL DEFAULT 0,
+  attempts         INTEGER    NOT NULL DEFAULT 0,
+  max_attempts     INTEGER    NOT NULL DEFAULT 1,
+  cancel_requested BOOLEAN    NOT NULL DEFAULT FALSE,
+  run_after        TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  heartbeat        TIMESTAMP WITH TIME ZONE, -- updated by the worker that runs the job
+  created          TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  finished         TIMESTAMP WITH TIME ZONE
+);
+
+ALTER TABLE job ADD CONSTRAINT job_pkey PRIMARY KEY (id);
+
+ALTER TABLE job
+  ADD CONSTRAINT job_fk_user
+  FOREIGN KEY (owner)
+  REFERENCES "user" (id)
+  ON DELETE CASCADE;
+
+CREATE INDEX queue_ndx_job ON job (priority DESC, run_after) WHERE status IN ('pending', 'running');
+
+COMMIT;
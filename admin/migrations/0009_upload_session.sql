@@ -0,0 +1,41 @@
+BEGIN;
+
+-- Resumable uploads of datasets (see db/upload.py)
+CREATE TABLE upload_session (
+  id            UUID,
+  owner         INTEGER NOT NULL, -- FK to user
+  dataset       JSONB   NOT NULL, -- dataset without recordings
+  dataset_id    UUID, -- ID of the dataset created on commit
+  created       TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  last_activity TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Received chunks of uploads and their recordings. These tables are unlogged,
+-- so writing into them is fast, but they are emptied if the database server
+-- crashes. Chunks are lost together with their recordings, and clients can
+-- see which ones they need to send again.
+CREATE UNLOGGED TABLE upload_chunk (
+  session UUID    NOT NULL, -- FK to upload_session
+  seq     INTEGER NOT NULL,
+  size    INTEGER NOT NULL -- number of recordings
+);
+
+CREATE UNLOGGED TABLE upload_staging (
+  session    UUID    NOT NULL, -- FK to upload_session
+  class_name VARCHAR NOT NULL,
+  recording  UUID    NOT NULL
+);
+
+ALTER TABLE upload_session ADD CONSTRAINT upload_session_pkey PRIMARY KEY (id);
+ALTER TABLE upload_chunk ADD CONSTRAINT upload_chunk_pkey PRIMARY KEY (session, seq);
+
+ALTER TABLE upload_session
+  ADD CONSTRAINT upload_session_fk_user
+  FOREIGN KEY (owner)
+  REFERENCES "user" (id)
+  ON DELETE CASCADE;
+
+CREATE INDEX session_ndx_upload_staging ON upload_staging (session);
+CREATE INDEX last_activity_ndx_upload_session ON upload_session (last_activity);
+
+COMMIT;
@@ -0,0 +1,53 @@
+BEGIN;
+
+-- Number of recordings in datasets and their classes (see db/dataset.py).
+-- Counts are updated together with members of classes, so they can be read
+-- without counting members.
+CREATE TABLE dataset_stats (
+  dataset    UUID, -- FK to dataset
+  classes    INTEGER NOT NULL DEFAULT 0,
+  recordings INTEGER NOT NULL DEFAULT 0 -- sum of sizes of all classes
+);
+
+CREATE TABLE dataset_class_stats (
+  class      INT, -- FK to class
+  recordings INTEGER NOT NULL DEFAULT 0
+);
+
+ALTER TABLE dataset_stats ADD CONSTRAINT dataset_stats_pkey PRIMARY KEY (dataset);
+ALTER TABLE dataset_class_stats ADD CONSTRAINT dataset_class_stats_pkey PRIMARY KEY (class);
+
+ALTER TABLE dataset_stats
+  ADD CONSTRAINT dataset_stats_fk_dataset
+  FOREIGN KEY (dataset)
+  REFERENCES dataset (id)
+  ON UPDATE CASCADE
+  ON DELETE CASCADE;
+
+ALTER TABLE dataset_class_stats
+  ADD CONSTRAINT dataset_class_stats_fk_class
+  FOREIGN KEY (class)
+  REFERENCES dataset_class (id)
+  ON UPDATE CASCADE
+  ON DELETE CASCADE;
+
+-- Counts of existing datasets. Changes made by code that doesn't update
+-- statistics yet are fixed with `manage.py check_dataset_stats --fix` after
+-- the deployment.
+INSERT INTO dataset_class_stats (class, recordings)
+     SELECT dataset_class.id, count(dataset_class_member.recording)
+       FROM dataset_class
+  LEFT JOIN dataset_class_member
+         ON dataset_class_member.class = dataset_class.id
+   GROUP BY dataset_class.id;
+
+INSERT INTO dataset_stats (dataset, classes, recordings)
+     SELECT dataset.id, count(dataset_class_stats.class), coalesce(sum(dataset_class_stats.recordings), 0)
+       FROM dataset
+  LEFT JOIN dataset_class
+         ON dataset_class.dataset = dataset.id
+  LEFT JOIN dataset_class_stats
+         ON dataset_class_stats.class = dataset_class.id
+   GROUP BY dataset.id;
+
+COMMIT;
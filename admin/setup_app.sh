@@ -21,3 +21,4 @@ python manage.py init_test_db
 
 npm install
 ./node_modules/.bin/gulp
+python manage.py compress_static
@@ -21,9 +21,45 @@ ALTER TABLE dataset_class_member
   ON UPDATE CASCADE
   ON DELETE CASCADE;
 
+ALTER TABLE dataset_class_member
+  ADD CONSTRAINT class_member_fk_recording
+  FOREIGN KEY (recording)
+  REFERENCES recording (id);
+
 ALTER TABLE api_key
   ADD CONSTRAINT api_key_fk_user
   FOREIGN KEY (owner)
   REFERENCES "user" (id);
 
+ALTER TABLE api_key_usage
+  ADD CONSTRAINT api_key_usage_fk_api_key
+  FOREIGN KEY (api_key)
+  REFERENCES api_key (value);
+
+ALTER TABLE job
+  ADD CONSTRAINT job_fk_user
+  FOREIGN KEY (owner)
+  REFERENCES "user" (id)
+  ON DELETE CASCADE;
+
+ALTER TABLE upload_session
+  ADD CONSTRAINT upload_session_fk_user
+  FOREIGN KEY (owner)
+  REFERENCES "user" (id)
+  ON DELETE CASCADE;
+
+ALTER TABLE dataset_stats
+  ADD CONSTRAINT dataset_stats_fk_dataset
+  FOREIGN KEY (dataset)
+  REFERENCES dataset (id)
+  ON UPDATE CASCADE
+  ON DELETE CASCADE;
+
+ALTER TABLE dataset_class_stats
+  ADD CONSTRAINT dataset_class_stats_fk_class
+  FOREIGN KEY (class)
+  REFERENCES dataset_class (id)
+  ON UPDATE CASCADE
+  ON DELETE CASCADE;
+
 COMMIT;
@@ -2,4 +2,11 @@ BEGIN;
 
 CREATE UNIQUE INDEX lower_musicbrainz_id_ndx_user ON "user" (lower(musicbrainz_id));
 
+CREATE INDEX recording_ndx_dataset_class_member ON dataset_class_member (recording);
+CREATE INDEX owner_ndx_api_key ON api_key (owner);
+CREATE INDEX author_ndx_dataset ON dataset (author);
+CREATE INDEX queue_ndx_job ON job (priority DESC, run_after) WHERE status IN ('pending', 'running');
+CREATE INDEX session_ndx_upload_staging ON upload_staging (session);
+CREATE INDEX last_activity_ndx_upload_session ON upload_session (last_activity);
+
 COMMIT;
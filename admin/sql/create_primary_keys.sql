@@ -4,6 +4,14 @@ BEGIN;
 ALTER TABLE "user" ADD CONSTRAINT user_pkey PRIMARY KEY (id);
 ALTER TABLE dataset ADD CONSTRAINT dataset_pkey PRIMARY KEY (id);
 ALTER TABLE dataset_class ADD CONSTRAINT dataset_class_pkey PRIMARY KEY (id);
-ALTER TABLE dataset_class_member ADD CONSTRAINT dataset_class_member_pkey PRIMARY KEY (class, mbid);
+ALTER TABLE recording ADD CONSTRAINT recording_pkey PRIMARY KEY (id);
+ALTER TABLE dataset_class_member ADD CONSTRAINT dataset_class_member_pkey PRIMARY KEY (class, recording);
+ALTER TABLE api_key_usage ADD CONSTRAINT api_key_usage_pkey PRIMARY KEY (api_key);
+ALTER TABLE schema_version ADD CONSTRAINT schema_version_pkey PRIMARY KEY (version);
+ALTER TABLE job ADD CONSTRAINT job_pkey PRIMARY KEY (id);
+ALTER TABLE upload_session ADD CONSTRAINT upload_session_pkey PRIMARY KEY (id);
+ALTER TABLE upload_chunk ADD CONSTRAINT upload_chunk_pkey PRIMARY KEY (session, seq);
+ALTER TABLE dataset_stats ADD CONSTRAINT dataset_stats_pkey PRIMARY KEY (dataset);
+ALTER TABLE dataset_class_stats ADD CONSTRAINT dataset_class_stats_pkey PRIMARY KEY (class);
 
 COMMIT;
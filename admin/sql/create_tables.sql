@@ -4,7 +4,8 @@ CREATE TABLE "user" (
   id             SERIAL,
   created        TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   musicbrainz_id VARCHAR,
-  admin          BOOLEAN NOT NULL         DEFAULT FALSE
+  admin          BOOLEAN NOT NULL         DEFAULT FALSE,
+  version        INTEGER NOT NULL         DEFAULT 1 -- incremented on every change
 );
 ALTER TABLE "user" ADD CONSTRAINT user_musicbrainz_id_key UNIQUE (musicbrainz_id);
 
@@ -25,9 +26,17 @@ CREATE TABLE dataset_class (
   dataset     UUID    NOT NULL -- FK to dataset
 );
 
+-- Recordings are referenced by many datasets, so their MBIDs are stored once
+-- and members refer to them by a compact ID.
+CREATE TABLE recording (
+  id   SERIAL,
+  mbid UUID NOT NULL
+);
+ALTER TABLE recording ADD CONSTRAINT recording_mbid_key UNIQUE (mbid);
+
 CREATE TABLE dataset_class_member (
-  class INT, -- FK to class
-  mbid  UUID
+  class     INT, -- FK to class
+  recording INT  -- FK to recording
 );
 
 CREATE TABLE api_key (
@@ -36,5 +45,79 @@ CREATE TABLE api_key (
   owner     INTEGER NOT NULL,
   created   TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
+ALTER TABLE api_key ADD CONSTRAINT api_key_value_key UNIQUE (value);
+
+CREATE TABLE api_key_usage (
+  api_key       TEXT   NOT NULL, -- FK to api_key (value)
+  request_count BIGINT NOT NULL DEFAULT 0,
+  last_used     TIMESTAMP WITH TIME ZONE
+);
+
+-- Number of recordings in datasets and their classes (see db/dataset.py).
+-- Counts are updated together with members of classes, so they can be read
+-- without counting members.
+CREATE TABLE dataset_stats (
+  dataset    UUID, -- FK to dataset
+  classes    INTEGER NOT NULL DEFAULT 0,
+  recordings INTEGER NOT NULL DEFAULT 0 -- sum of sizes of all classes
+);
+
+CREATE TABLE dataset_class_stats (
+  class      INT, -- FK to class
+  recordings INTEGER NOT NULL DEFAULT 0
+);
+
+-- Background jobs (see db/job.py)
+CREATE TABLE job (
+  id               UUID,
+  type             VARCHAR    NOT NULL,
+  status           job_status NOT NULL DEFAULT 'pending',
+  priority         INTEGER    NOT NULL DEFAULT 0, -- jobs with higher priority run first
+  owner            INTEGER, -- FK to user
+  payload          JSONB, -- removed when the job is finished
+  result           JSONB,
+  error            TEXT,
+  progress         REAL       NOT NULL DEFAULT 0,
+  attempts         INTEGER    NOT NULL DEFAULT 0,
+  max_attempts     INTEGER    NOT NULL DEFAULT 1,
+  cancel_requested BOOLEAN    NOT NULL DEFAULT FALSE,
+  run_after        TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  heartbeat        TIMESTAMP WITH TIME ZONE, -- updated by the worker that runs the job
+  created          TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  finished         TIMESTAMP WITH TIME ZONE
+);
+
+-- Resumable uploads of datasets (see db/upload.py)
+CREATE TABLE upload_session (
+  id            UUID,
+  owner         INTEGER NOT NULL, -- FK to user
+  dataset       JSONB   NOT NULL, -- dataset without recordings
+  dataset_id    UUID, -- ID of the dataset created on commit
+  created       TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  last_activity TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Received chunks of uploads and their recordings. These tables are unlogged,
+-- so writing into them is fast, but they are emptied if the database server
+-- crashes. Chunks are lost together with their recordings, and clients can
+-- see which ones they need to send again.
+CREATE UNLOGGED TABLE upload_chunk (
+  session UUID    NOT NULL, -- FK to upload_session
+  seq     INTEGER NOT NULL,
+  size    INTEGER NOT NULL -- number of recordings
+);
+
+CREATE UNLOGGED TABLE upload_staging (
+  session    UUID    NOT NULL, -- FK to upload_session
+  class_name VARCHAR NOT NULL,
+  recording  UUID    NOT NULL
+);
+
+-- Applied schema migrations (see db/migrations.py)
+CREATE TABLE schema_version (
+  version INTEGER NOT NULL,
+  name    TEXT    NOT NULL,
+  applied TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
 
 COMMIT;
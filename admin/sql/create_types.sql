@@ -1 +1,2 @@
 CREATE TYPE gid_type AS ENUM ('mbid', 'msid');
+CREATE TYPE job_status AS ENUM ('pending', 'running', 'done', 'failed', 'cancelled');
@@ -0,0 +1,92 @@
+"""
+Benchmark of JSON encoders used for API responses.
+
+Encodes a dataset with 1M recordings (split into 10 classes) with every
+available encoder and reports encoding time, size of the output and peak
+memory allocated during encoding. Flask's `jsonify` is included for
+comparison: it pretty-prints responses by default.
+
+Usage:
+    $ python benchmarks/json_encode.py --recordings 1000000 --repeat 5
+"""
+from __future__ import print_function, division
+import os
+import sys
+import time
+import uuid
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from datetime import datetime
+from flask import Flask, jsonify
+from webserver import serialization
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def _make_dataset(recordings, classes):
+    return {
+        "id": str(uuid.uuid4()),
+        "name": "Benchmark",
+        "description": "Dataset for benchmarking JSON encoders.",
+        "author": 1,
+        "public": True,
+        "created": datetime.now(),
+        "last_edited": datetime.now(),
+        "classes": [{
+            "id": str(i),
+            "name": "Class %d" % i,
+            "description": None,
+            "recordings": [str(uuid.uuid4()) for _ in range(recordings // classes)],
+        } for i in range(classes)],
+    }
+
+
+def _measure(encode, repeat):
+    """Returns best time, output size and peak allocation of an encoding function."""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        output = encode()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        encode()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, len(output), peak
+
+
+@click.command()
+@click.option("--recordings", default=1000000, show_default=True)
+@click.option("--classes", default=10, show_default=True)
+@click.option("--repeat", default=5, show_default=True)
+def main(recordings, classes, repeat):
+    dataset = _make_dataset(recordings, classes)
+    app = Flask(__name__)
+
+    candidates = [(name, (lambda n: lambda: serialization.dumps(dataset, encoder=n))(name))
+                  for _, name in serialization._priority]
+
+    def encode_jsonify():
+        with app.test_request_context():
+            return jsonify(dataset).get_data()
+    candidates.append(("flask.jsonify", encode_jsonify))
+
+    print("%-15s %10s %12s %14s" % ("Encoder", "Time (ms)", "Size (MB)", "Peak mem (MB)"))
+    for name, encode in candidates:
+        elapsed, size, peak = _measure(encode, repeat)
+        print("%-15s %10.1f %12.1f %14s" % (
+            name, elapsed * 1000, size / 2 ** 20,
+            "%.1f" % (peak / 2 ** 20) if peak is not None else "n/a",
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the MusicBrainz login flow.
+
+Runs complete logins (redirect to the provider, callback, user creation) against
+a local fake OAuth server, so that results don't depend on MusicBrainz. Users are
+created in the test database (see `manage.py init_test_db`).
+
+Usage:
+    $ python benchmarks/login_throughput.py --logins 2000 --threads 8 --users 500
+"""
+from __future__ import print_function, division
+import os
+import sys
+import threading
+import time
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from six.moves.urllib.parse import urlparse, parse_qs
+from webserver import create_app
+from webserver.login import provider
+from webserver.login.testing import FakeOAuthServer
+import config
+import db
+
+
+def _login(client, username):
+    resp = client.get("/login/musicbrainz")
+    state = parse_qs(urlparse(resp.location).query)["state"][0]
+    resp = client.get("/login/musicbrainz/post?code=%s&state=%s" % (username, state))
+    assert resp.status_code == 302
+    client.get("/login/logout/")
+
+
+def _worker(app, usernames, latencies):
+    client = app.test_client()
+    for username in usernames:
+        start = time.time()
+        _login(client, username)
+        latencies.append(time.time() - start)
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+@click.command()
+@click.option("--logins", default=1000, show_default=True, help="Total number of logins.")
+@click.option("--threads", default=4, show_default=True, help="Number of concurrent clients.")
+@click.option("--users", default=100, show_default=True,
+              help="Number of distinct users. First login of each user creates it.")
+def main(logins, threads, users):
+    server = FakeOAuthServer()
+    server.start()
+
+    app = create_app()
+    db.init_db_engine(config.SQLALCHEMY_TEST_URI)
+    provider.init("client", "secret", base_url=server.url)
+
+    prefix = "bench-%d-" % int(time.time())
+    usernames = [prefix + str(i % users) for i in range(logins)]
+    latencies = []
+    workers = [
+        threading.Thread(target=_worker, args=(app, usernames[i::threads], latencies))
+        for i in range(threads)
+    ]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.time() - start
+    server.stop()
+
+    latencies.sort()
+    print("Logins:      %d (%d users, %d threads)" % (logins, users, threads))
+    print("Throughput:  %.1f logins/s" % (logins / elapsed))
+    print("Latency p50: %.2f ms" % (_percentile(latencies, 0.5) * 1000))
+    print("Latency p99: %.2f ms" % (_percentile(latencies, 0.99) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark of hash partitioning of dataset class members.
+
+Fills a plain and a hash partitioned copy of the dataset_class_member table
+with the same --rows members (100 per class) and measures the queries that
+`db.dataset` uses on them:
+* insert: adding a dataset with 10 classes of --dataset-size recordings,
+* read: loading members of all classes of a dataset,
+* delete: removing members of all classes of a dataset.
+
+Tables are created in a separate schema of the test database (see
+`manage.py init_test_db`), which is dropped afterwards. Filling the tables
+with 10M rows takes a few minutes.
+
+Usage:
+    $ python benchmarks/partitioning.py --rows 10000000 --partitions 16
+"""
+from __future__ import print_function, division
+import os
+import sys
+import time
+import click
+import sqlalchemy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from db import partitioning
+import config
+
+SCHEMA = "benchmark_partitioning"
+MEMBERS_PER_CLASS = 100
+CLASSES_PER_DATASET = 10
+RECORDINGS = 1000000
+
+
+def _create(connection, rows, partitions):
+    if partitions:
+        partitioning.create_table(connection, partitions, table="member")
+    else:
+        connection.execute("CREATE TABLE member (class INT, recording INT)")
+    start = time.time()
+    connection.execute(sqlalchemy.text("""
+        INSERT INTO member (class, recording)
+             SELECT class, (class * 7919 + n) % :recordings + 1
+               FROM generate_series(1, :classes) AS class
+                  , generate_series(1, :per_class) AS n
+    """), {
+        "recordings": RECORDINGS,
+        "classes": rows // MEMBERS_PER_CLASS,
+        "per_class": MEMBERS_PER_CLASS,
+    })
+    connection.execute("ALTER TABLE member ADD PRIMARY KEY (class, recording)")
+    connection.execute("CREATE INDEX ON member (recording)")
+    connection.execute("ANALYZE member")
+    return time.time() - start
+
+
+def _measure(connection, dataset_size, repeat):
+    """Measure insert, read and delete of datasets.
+
+    Returns:
+        Dictionary with the best time of each operation.
+    """
+    times = {"insert": [], "read": [], "delete": []}
+    first_class = connection.execute("SELECT max(class) FROM member").fetchone()[0] + 1
+    for i in range(repeat):
+        class_ids = list(range(first_class + i * CLASSES_PER_DATASET,
+                               first_class + (i + 1) * CLASSES_PER_DATASET))
+        start = time.time()
+        with connection.begin():
+            for class_id in class_ids:
+                connection.execute(sqlalchemy.text("""
+                    INSERT INTO member (class, recording)
+                         SELECT :class_id, unnest(CAST(:recording_ids AS INT[]))
+                """), {"class_id": class_id, "recording_ids": list(range(1, dataset_size + 1))})
+        times["insert"].append(time.time() - start)
+
+        start = time.time()
+        result = connection.execute(sqlalchemy.text("""
+            SELECT class, recording.mbid::text
+              FROM member
+              JOIN recording
+                ON recording.id = member.recording
+             WHERE class = ANY(:class_ids)
+        """), {"class_ids": class_ids})
+        assert len(result.fetchall()) == dataset_size * CLASSES_PER_DATASET
+        times["read"].append(time.time() - start)
+
+        start = time.time()
+        with connection.begin():
+            connection.execute(sqlalchemy.text("""
+                DELETE FROM member
+                      WHERE class = ANY(:class_ids)
+            """), {"class_ids": class_ids})
+        times["delete"].append(time.time() - start)
+    return {name: min(values) for name, values in times.items()}
+
+
+@click.command()
+@click.option("--rows", default=10000000, show_default=True, help="Number of existing members.")
+@click.option("--partitions", default=16, show_default=True, help="Number of partitions.")
+@click.option("--dataset-size", default=1000, show_default=True,
+              help="Number of recordings in each class of inserted datasets.")
+@click.option("--repeat", default=5, show_default=True, help="Number of runs of each operation.")
+def main(rows, partitions, dataset_size, repeat):
+    engine = sqlalchemy.create_engine(config.SQLALCHEMY_TEST_URI, poolclass=sqlalchemy.pool.NullPool)
+    connection = engine.connect()
+    try:
+        connection.execute("DROP SCHEMA IF EXISTS %s CASCADE" % SCHEMA)
+        connection.execute("CREATE SCHEMA %s" % SCHEMA)
+        connection.execute("SET search_path = %s, public" % SCHEMA)
+        connection.execute(sqlalchemy.text("""
+            CREATE TABLE recording AS
+                 SELECT id, md5(id::text)::uuid AS mbid
+                   FROM generate_series(1, :recordings) AS id
+        """), {"recordings": RECORDINGS})
+        connection.execute("ALTER TABLE recording ADD PRIMARY KEY (id)")
+
+        results = {}
+        for name, count in [("plain", 0), ("partitioned", partitions)]:
+            fill_time = _create(connection, rows, count)
+            print("%s: filled %d rows in %.1f s" % (name, rows, fill_time))
+            results[name] = _measure(connection, dataset_size, repeat)
+            connection.execute("DROP TABLE member")
+
+        print()
+        print("%-10s %12s %12s" % ("", "plain", "partitioned"))
+        for operation in ["insert", "read", "delete"]:
+            print("%-10s %9.1f ms %9.1f ms" % (
+                operation, results["plain"][operation] * 1000,
+                results["partitioned"][operation] * 1000))
+    finally:
+        connection.execute("DROP SCHEMA IF EXISTS %s CASCADE" % SCHEMA)
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
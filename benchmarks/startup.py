@@ -0,0 +1,101 @@
+"""
+Benchmark of startup time.
+
+Measures cold start of a fresh interpreter for:
+* worker boot: importing the application and calling `create_app`,
+* every `manage.py` command: importing manage.py and then the modules that the
+  command imports (and the app it creates) before it starts its work.
+  Commands import most of what they need in their bodies, which --help doesn't
+  run, so these imports are listed in COMMANDS and have to be kept up to date
+  with manage.py.
+
+Each target is started --repeat times; the best wall time is reported together
+with the slowest imports from the last run, taken from `python -X importtime`
+(Python 3.7+).
+
+Usage:
+    $ python benchmarks/startup.py --repeat 5 --top 10
+"""
+from __future__ import print_function, division
+import os
+import subprocess
+import sys
+import time
+import click
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+sys.path.insert(0, ROOT_DIR)
+
+WORKER_BOOT = "from webserver import create_app; create_app()"
+# Statements that each manage.py command runs before it starts its work
+COMMANDS = {
+    "runserver": WORKER_BOOT,
+    "serve": "from webserver.server import run; " + WORKER_BOOT,
+    "init_db": "import db.build, db.migrations, db.partitioning",
+    "init_test_db": "import db.migrations, db.partitioning",
+    "api_key_usage": "import db.api_key",
+    "migrate": "import db.migrations",
+    "partition_class_members": "import db.partitioning",
+    "worker": "from webserver import jobs; " + WORKER_BOOT,
+    "delete_abandoned_uploads": "import db.upload",
+    "check_dataset_stats": "import db.dataset",
+    "profile_token": "from webserver import profiling; " + WORKER_BOOT,
+    "compress_static": "from webserver import static_manager, compression",
+}
+
+
+def _run(args):
+    """Run Python with given arguments.
+
+    Returns:
+        Tuple with wall time and list of (cumulative microseconds, module)
+        tuples for top-level imports.
+    """
+    start = time.time()
+    process = subprocess.Popen([sys.executable, "-X", "importtime"] + args, cwd=ROOT_DIR,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    elapsed = time.time() - start
+    if process.returncode != 0:
+        raise click.ClickException("%s failed:\n%s" % (" ".join(args), stderr.decode("utf-8")))
+    imports = []
+    for line in stderr.decode("utf-8").splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented
+        if not name[1:].startswith(" "):
+            imports.append((int(cumulative), name.strip()))
+    return elapsed, imports
+
+
+def _measure(name, args, repeat, top):
+    times = []
+    for _ in range(repeat):
+        elapsed, imports = _run(args)
+        times.append(elapsed)
+    print("%-24s %8.1f ms  (imports: %.1f ms)" % (
+        name, min(times) * 1000, sum(c for c, _ in imports) / 1000))
+    for cumulative, module in sorted(imports, reverse=True)[:top]:
+        print("    %-40s %8.1f ms" % (module, cumulative / 1000))
+
+
+@click.command()
+@click.option("--repeat", default=5, show_default=True, help="Number of runs of each target.")
+@click.option("--top", default=5, show_default=True, help="Number of slowest imports to show.")
+def main(repeat, top):
+    if sys.version_info < (3, 7):
+        raise click.ClickException("-X importtime requires Python 3.7 or newer.")
+    import manage
+    # Newer versions of click replace underscores in names of commands
+    missing = sorted(set(c.replace("-", "_") for c in manage.cli.commands) - set(COMMANDS))
+    if missing:
+        raise click.ClickException("Imports of these commands are missing in COMMANDS: %s" % ", ".join(missing))
+    _measure("worker boot", ["-c", WORKER_BOOT], repeat, top)
+    for command in sorted(COMMANDS):
+        _measure("manage.py %s" % command, ["-c", "import manage; " + COMMANDS[command]], repeat, top)
+
+
+if __name__ == "__main__":
+    main()
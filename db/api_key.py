@@ -94,6 +94,98 @@ def is_active(value):
         return row["is_active"]
 
 
+def record_usage(usage):
+    """Add request counts to usage statistics of API keys.
+
+    All keys are updated in a single statement, so this function is meant to
+    be called with batches of usage data accumulated in memory.
+
+    Args:
+        usage: Dictionary that maps key values to (request count, last use
+            time) tuples. Last use time must be a timezone-aware datetime.
+    """
+    if not usage:
+        return
+    # Sorting keys to make sure that concurrent flushes from different
+    # processes lock rows in the same order.
+    values = sorted(usage.keys())
+    with db.engine.begin() as connection:
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO api_key_usage (api_key, request_count, last_used)
+                 SELECT *
+                   FROM unnest(CAST(:values AS TEXT[]),
+                               CAST(:counts AS BIGINT[]),
+                               CAST(:last_used AS TIMESTAMP WITH TIME ZONE[]))
+            ON CONFLICT (api_key)
+              DO UPDATE SET request_count = api_key_usage.request_count + EXCLUDED.request_count
+                          , last_used = GREATEST(api_key_usage.last_used, EXCLUDED.last_used)
+        """), {
+            "values": values,
+            "counts": [usage[v][0] for v in values],
+            "last_used": [usage[v][1] for v in values],
+        })
+
+
+def get_usage(owner_id):
+    """Get usage statistics for all keys (including revoked) of a user.
+
+    Doesn't check if user exists.
+
+    Args:
+        owner_id: ID of a user who owns the keys.
+
+    Returns:
+        List of dictionaries with the following keys: "value", "is_active",
+        "created", "request_count", "last_used". Newest keys go first.
+    """
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            SELECT api_key.value
+                 , api_key.is_active
+                 , api_key.created
+                 , COALESCE(api_key_usage.request_count, 0) AS request_count
+                 , api_key_usage.last_used
+              FROM api_key
+         LEFT JOIN api_key_usage
+                ON api_key_usage.api_key = api_key.value
+             WHERE api_key.owner = :owner
+          ORDER BY api_key.created DESC
+        """), {"owner": owner_id})
+        return [dict(row) for row in result.fetchall()]
+
+
+def get_top_by_usage(limit=100, active_only=False):
+    """Get keys that have received the most requests.
+
+    Args:
+        limit: Maximum number of keys to return.
+        active_only: True to exclude revoked keys.
+
+    Returns:
+        List of dictionaries with the following keys: "value", "is_active",
+        "owner", "musicbrainz_id", "request_count", "last_used".
+    """
+    where = "WHERE api_key.is_active = TRUE" if active_only else ""
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            SELECT api_key.value
+                 , api_key.is_active
+                 , api_key.owner
+                 , "user".musicbrainz_id
+                 , api_key_usage.request_count
+                 , api_key_usage.last_used
+              FROM api_key_usage
+              JOIN api_key
+                ON api_key.value = api_key_usage.api_key
+              JOIN "user"
+                ON "user".id = api_key.owner
+              %s
+          ORDER BY api_key_usage.request_count DESC
+             LIMIT :limit
+        """ % where), {"limit": limit})
+        return [dict(row) for row in result.fetchall()]
+
+
 def _generate_key(length):
     """Generates random string with a specified length."""
     return ''.join(random.SystemRandom().choice(string.ascii_letters + string.digits)
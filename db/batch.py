@@ -0,0 +1,305 @@
+"""
+Batches of changes to datasets.
+
+A batch is an ordered list of operations that are run on one connection in a
+single transaction. In atomic mode, the whole batch is rolled back if one of
+the operations fails. Otherwise each operation runs in its own savepoint, so
+failed operations are rolled back without affecting the others.
+
+Work that is common to all operations is done once for the whole batch:
+operations are validated before anything is written, MBIDs of all recordings
+are looked up with a single query, and datasets that the operations change
+are locked and checked with another one. In atomic mode, consecutive
+operations that add recordings (or remove them) are also run together, with
+one statement for each step instead of one for each operation.
+
+Supported operations:
+* {"op": "create", "dataset": {...}}
+* {"op": "update", "dataset_id": "...", "dataset": {...}}
+* {"op": "delete", "dataset_id": "..."}
+* {"op": "add_recordings", "dataset_id": "...", "class_name": "...", "recordings": [...]}
+* {"op": "remove_recordings", "dataset_id": "...", "class_name": "...", "recordings": [...]}
+"""
+import db
+import db.dataset
+import db.exceptions
+import db.recording
+import logging
+import sqlalchemy
+import sqlalchemy.exc
+import uuid
+from six import string_types
+from utils import dataset_validator
+
+OPERATIONS = ["create", "update", "delete", "add_recordings", "remove_recordings"]
+
+# Operations that are grouped in atomic batches
+_GROUPED_OPERATIONS = ["add_recordings", "remove_recordings"]
+
+# Errors that are reported as results of operations
+_EXPECTED_ERRORS = (
+    dataset_validator.ValidationException,
+    db.exceptions.NoDataFoundException,
+    db.exceptions.BadDataException,
+)
+
+
+class _OperationError(Exception):
+    """Error of one of the operations in a group."""
+
+    def __init__(self, index, error):
+        super(_OperationError, self).__init__(str(error))
+        self.index = index
+        self.error = error
+
+
+def run(operations, user_id, atomic=True):
+    """Run a batch of operations on datasets of a user.
+
+    Args:
+        operations: List of operations (dictionaries, see above).
+        user_id: ID of the user who runs the batch. Only datasets created by
+            this user can be changed.
+        atomic: True to roll back the whole batch if one of the operations
+            fails, False to roll back only failed operations.
+
+    Returns:
+        Tuple with a boolean that is True if changes have been committed, and
+        a list with the result of each operation. Results are dictionaries
+        with "success" field and either "error" or output of the operation
+        (for example, "dataset_id" of created datasets).
+    """
+    results = [None] * len(operations)
+    for i, operation in enumerate(operations):
+        try:
+            _validate(operation)
+        except _EXPECTED_ERRORS as e:
+            results[i] = _error(e)
+    if atomic and any(results):
+        return False, [r or _error("Not run because another operation is invalid.") for r in results]
+
+    with db.engine.connect() as connection, connection.begin() as transaction:
+        recording_ids = db.recording.get_ids(connection, {
+            mbid for i, operation in enumerate(operations) if results[i] is None
+            for mbid in _added_recordings(operation)
+        })
+        authors = _lock_datasets(connection, [
+            operation["dataset_id"] for i, operation in enumerate(operations)
+            if results[i] is None and "dataset_id" in operation
+        ])
+        for group in _group(operations, results, atomic):
+            i = group[0]
+            savepoint = None if atomic else connection.begin_nested()
+            try:
+                if len(group) > 1:
+                    for j, result in zip(group, _run_group(connection, [operations[j] for j in group],
+                                                           user_id, authors, recording_ids)):
+                        results[j] = result
+                else:
+                    results[i] = _run_operation(connection, operations[i], user_id, authors, recording_ids)
+            except _EXPECTED_ERRORS + (_OperationError, sqlalchemy.exc.DBAPIError) as e:
+                if isinstance(e, _OperationError):
+                    i, e = group[e.index], e.error
+                elif isinstance(e, sqlalchemy.exc.DBAPIError):
+                    logging.exception("Operation %d of a batch failed", i)
+                    e = "Database error."
+                results[i] = _error(e)
+                if atomic:
+                    transaction.rollback()
+                    return False, [r if r is results[i] else _error("Rolled back because another operation failed.")
+                                   for r in results]
+                savepoint.rollback()
+            else:
+                if savepoint is not None:
+                    savepoint.commit()
+
+    if any(result["success"] for result in results):
+        db.dataset.bump_user_version(user_id)
+    return True, results
+
+
+def _validate(operation):
+    """Check the structure of an operation.
+
+    Datasets are validated when they are created or updated, before anything
+    is written.
+    """
+    if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+        raise dataset_validator.ValidationException(
+            "Operation must be a dictionary with `op` field, one of: %s." % ", ".join(OPERATIONS))
+    op = operation["op"]
+    required = {
+        "create": ["dataset"],
+        "update": ["dataset_id", "dataset"],
+        "delete": ["dataset_id"],
+        "add_recordings": ["dataset_id", "class_name", "recordings"],
+        "remove_recordings": ["dataset_id", "class_name", "recordings"],
+    }[op]
+    for field in required:
+        if field not in operation:
+            raise dataset_validator.ValidationException("Field `%s` is missing from %s operation." % (field, op))
+    if "dataset_id" in operation:
+        try:
+            operation["dataset_id"] = str(uuid.UUID(str(operation["dataset_id"])))
+        except ValueError:
+            raise dataset_validator.ValidationException("`dataset_id` must be a UUID.")
+    if "dataset" in operation:
+        dataset = operation["dataset"]
+        if isinstance(dataset, dict):
+            dataset.setdefault("public", True)
+            dataset.setdefault("classes", [])
+        dataset_validator.validate(dataset)
+    if "class_name" in operation and not isinstance(operation["class_name"], string_types):
+        raise dataset_validator.ValidationException("`class_name` must be a string.")
+    if "recordings" in operation:
+        dataset_validator.validate_recordings(operation["recordings"])
+
+
+def _added_recordings(operation):
+    if operation["op"] in ("create", "update"):
+        return [mbid for cls in operation["dataset"]["classes"] for mbid in cls["recordings"]]
+    if operation["op"] == "add_recordings":
+        return operation["recordings"]
+    return []
+
+
+def _lock_datasets(connection, dataset_ids):
+    """Lock datasets that will be changed.
+
+    Returns:
+        Dictionary that maps IDs of existing datasets to their authors.
+    """
+    if not dataset_ids:
+        return {}
+    result = connection.execute(sqlalchemy.text("""
+        SELECT id::text, author
+          FROM dataset
+         WHERE id = ANY(CAST(:dataset_ids AS UUID[]))
+      ORDER BY id
+           FOR UPDATE
+    """), {"dataset_ids": sorted(set(dataset_ids))})
+    return {row["id"]: row["author"] for row in result}
+
+
+def _group(operations, results, atomic):
+    """Split operations that haven't failed validation into groups that are
+    run together.
+
+    Returns:
+        List of lists of indexes of operations.
+    """
+    groups = []
+    previous = None
+    for i, operation in enumerate(operations):
+        if results[i] is not None:
+            continue
+        if atomic and previous is not None and operation["op"] in _GROUPED_OPERATIONS \
+                and operation["op"] == operations[previous]["op"] and groups[-1][-1] == previous:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+        previous = i
+    return groups
+
+
+def _check_author(dataset_id, user_id, authors):
+    if dataset_id not in authors:
+        raise db.exceptions.NoDataFoundException("Can't find this dataset.")
+    if authors[dataset_id] != user_id:
+        raise db.exceptions.BadDataException("You can't change this dataset.")
+
+
+def _run_group(connection, operations, user_id, authors, recording_ids):
+    """Run operations that add recordings to classes, or remove them, with
+    set-based statements.
+
+    Datasets must be locked already.
+
+    Returns:
+        List with results of the operations.
+
+    Raises:
+        _OperationError: One of the operations can't be run. Its index in the
+            list is in the exception.
+    """
+    classes = [(operation["dataset_id"], operation["class_name"]) for operation in operations]
+    class_ids = db.dataset.get_class_ids(connection, classes)
+    members = []
+    for i, operation in enumerate(operations):
+        try:
+            _check_author(operation["dataset_id"], user_id, authors)
+            class_id = db.dataset.check_class_ids(class_ids.get(classes[i], []), operation["class_name"])
+        except _EXPECTED_ERRORS as e:
+            raise _OperationError(i, e)
+        members.extend((class_id, mbid) for mbid in operation["recordings"])
+
+    if operations[0]["op"] == "add_recordings":
+        result = connection.execute(sqlalchemy.text("""
+            WITH member AS (
+                INSERT INTO dataset_class_member (class, recording)
+                     SELECT DISTINCT *
+                       FROM unnest(CAST(:class_ids AS INT[]), CAST(:recording_ids AS INT[]))
+                ON CONFLICT DO NOTHING
+                  RETURNING class
+            )
+              SELECT class, count(*)
+                FROM member
+            GROUP BY class
+        """), {
+            "class_ids": [class_id for class_id, _ in members],
+            "recording_ids": [recording_ids[mbid] for _, mbid in members],
+        })
+        changes = {row["class"]: row["count"] for row in result}
+    else:
+        result = connection.execute(sqlalchemy.text("""
+            WITH member AS (
+                DELETE FROM dataset_class_member
+                      USING unnest(CAST(:class_ids AS INT[]), CAST(:mbids AS UUID[])) AS removed (class, mbid)
+                          , recording
+                      WHERE recording.mbid = removed.mbid
+                        AND dataset_class_member.class = removed.class
+                        AND dataset_class_member.recording = recording.id
+                  RETURNING dataset_class_member.class
+            )
+              SELECT class, count(*)
+                FROM member
+            GROUP BY class
+        """), {
+            "class_ids": [class_id for class_id, _ in members],
+            "mbids": [mbid for _, mbid in members],
+        })
+        changes = {row["class"]: -row["count"] for row in result}
+
+    db.dataset.update_class_stats(connection, changes)
+    connection.execute(sqlalchemy.text("""
+        UPDATE dataset
+           SET last_edited = now()
+         WHERE id = ANY(CAST(:dataset_ids AS UUID[]))
+    """), {"dataset_ids": sorted({operation["dataset_id"] for operation in operations})})
+    return [{"success": True} for _ in operations]
+
+
+def _run_operation(connection, operation, user_id, authors, recording_ids):
+    op = operation["op"]
+    if op == "create":
+        dataset_id = db.dataset.create(connection, operation["dataset"], user_id, recording_ids=recording_ids)
+        return {"success": True, "dataset_id": str(dataset_id)}
+
+    dataset_id = operation["dataset_id"]
+    _check_author(dataset_id, user_id, authors)
+    if op == "update":
+        db.dataset._update(connection, dataset_id, operation["dataset"], user_id, recording_ids=recording_ids)
+    elif op == "delete":
+        db.dataset._delete(connection, dataset_id)
+        # Later operations can't change it anymore
+        del authors[dataset_id]
+    elif op == "add_recordings":
+        db.dataset._add_recordings(connection, dataset_id, operation["class_name"], operation["recordings"],
+                                   recording_ids=recording_ids)
+    elif op == "remove_recordings":
+        db.dataset._remove_recordings(connection, dataset_id, operation["class_name"], operation["recordings"])
+    return {"success": True}
+
+
+def _error(error):
+    return {"success": False, "error": str(error)}
@@ -0,0 +1,174 @@
+"""
+Parallel creation of primary keys, foreign keys and indexes.
+
+After a bulk import, building keys and indexes takes most of the time of
+`manage.py init_db`. Statements from admin/sql scripts are split into steps
+that are run concurrently on multiple connections, in an order that respects
+their dependencies:
+* indexes of a table are built after its primary key,
+* foreign keys are added after primary keys of both of their tables.
+
+Each connection gets its own `maintenance_work_mem`, so it should be set with
+the number of connections in mind. Statistics of all tables are updated when
+everything has been built.
+"""
+from __future__ import print_function, division
+import db
+import db.exceptions
+import re
+import threading
+import time
+
+_NAME = r'("[^"]+"|\w+)'
+_PRIMARY_KEY_RE = re.compile(r"^ALTER TABLE %s ADD CONSTRAINT %s PRIMARY KEY" % (_NAME, _NAME), re.I)
+_FOREIGN_KEY_RE = re.compile(r"^ALTER TABLE %s ADD CONSTRAINT %s FOREIGN KEY .* REFERENCES %s" % (
+    _NAME, _NAME, _NAME), re.I)
+_INDEX_RE = re.compile(r"^CREATE (?:UNIQUE )?INDEX %s ON %s" % (_NAME, _NAME), re.I)
+
+
+class Step(object):
+    """Statement that creates a key or an index.
+
+    Attributes:
+        statement: SQL statement.
+        kind: "primary key", "foreign key", "index", or None for other statements.
+        table: Table that the statement changes.
+        references: Table that a foreign key refers to.
+        dependencies: Steps that must be done before this one.
+    """
+
+    def __init__(self, statement, kind=None, table=None, references=None):
+        self.statement = statement
+        self.kind = kind
+        self.table = table
+        self.references = references
+        self.dependencies = []
+        self.duration = None
+
+    def __repr__(self):
+        return "<Step %s>" % self.statement
+
+
+def split_script(script):
+    """Split an SQL script into statements, without comments and
+    transaction control statements.
+    """
+    script = re.sub(r"--[^\n]*", "", script)
+    statements = []
+    for statement in script.split(";"):
+        statement = " ".join(statement.split())
+        if statement and statement.upper() not in ("BEGIN", "COMMIT"):
+            statements.append(statement)
+    return statements
+
+
+def plan(statements):
+    """Create steps for statements and find their dependencies.
+
+    Statements that aren't recognized depend on all previous ones.
+    """
+    steps = []
+    for statement in statements:
+        match = _PRIMARY_KEY_RE.match(statement)
+        if match:
+            steps.append(Step(statement, "primary key", match.group(1)))
+            continue
+        match = _FOREIGN_KEY_RE.match(statement)
+        if match:
+            steps.append(Step(statement, "foreign key", match.group(1), match.group(3)))
+            continue
+        match = _INDEX_RE.match(statement)
+        if match:
+            steps.append(Step(statement, "index", match.group(2)))
+            continue
+        step = Step(statement)
+        step.dependencies = list(steps)
+        steps.append(step)
+
+    primary_keys = {}
+    for step in steps:
+        if step.kind == "primary key":
+            primary_keys.setdefault(step.table, []).append(step)
+    for step in steps:
+        if step.kind in ("index", "foreign key"):
+            step.dependencies.extend(primary_keys.get(step.table, []))
+        if step.kind == "foreign key" and step.references != step.table:
+            step.dependencies.extend(primary_keys.get(step.references, []))
+    return steps
+
+
+def run(steps, jobs, maintenance_work_mem=None, report=print):
+    """Run steps concurrently, each as soon as its dependencies are done,
+    and analyze all tables afterwards.
+
+    Args:
+        steps: List of steps created by `plan`.
+        jobs: Number of connections to use.
+        maintenance_work_mem: Value of `maintenance_work_mem` setting for
+            each connection (for example, "1GB"). Server default is used if
+            it's None.
+        report: Function that is called with progress messages.
+    """
+    start = time.time()
+    done = set()
+    running = set()
+    errors = []
+    condition = threading.Condition()
+
+    def next_step():
+        """Wait until a step can be started. Returns None if there are none left."""
+        with condition:
+            while True:
+                if errors:
+                    return None
+                pending = [s for s in steps if s not in done and s not in running]
+                if not pending:
+                    return None
+                for step in pending:
+                    if all(d in done for d in step.dependencies):
+                        running.add(step)
+                        return step
+                condition.wait()
+
+    def worker():
+        connection = db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            if maintenance_work_mem:
+                connection.execute("SET maintenance_work_mem = '%s'" % maintenance_work_mem)
+            while True:
+                step = next_step()
+                if step is None:
+                    return
+                step_start = time.time()
+                try:
+                    connection.execute(step.statement)
+                except Exception as e:
+                    with condition:
+                        errors.append((step, e))
+                        running.discard(step)
+                        condition.notify_all()
+                    return
+                step.duration = time.time() - step_start
+                report("%8.1f s  %s" % (step.duration, step.statement))
+                with condition:
+                    running.discard(step)
+                    done.add(step)
+                    condition.notify_all()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(jobs, len(steps))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        step, error = errors[0]
+        raise db.exceptions.DatabaseException("Failed to run %s: %s" % (step.statement, error))
+
+    analyze_start = time.time()
+    with db.engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute("ANALYZE")
+    report("%8.1f s  ANALYZE" % (time.time() - analyze_start))
+    report("Built %d keys and indexes in %.1f s (%.1f s of work on %d connections)." % (
+        len(steps), time.time() - start, sum(s.duration for s in steps), len(threads)))
@@ -0,0 +1,178 @@
+"""
+This module provides a simple key-value cache.
+
+Values are stored in memcached if MEMCACHED_SERVERS are configured. Otherwise
+they are kept in memory of the current process, which means that they are not
+shared between processes and invalidation in one process is not seen by
+others. Code that uses this cache must be ready for any value to disappear
+at any time.
+
+All keys are prefixed with a namespace, so that multiple applications can
+share the same memcached instance.
+"""
+import threading
+import time
+
+_client = None
+_namespace = ""
+
+
+class LocalClient(object):
+    """In-process replacement for memcached client.
+
+    Implements the subset of `memcache.Client` interface that is used in this
+    module. Number of stored items is limited; when the limit is reached,
+    expired items are removed, and if that's not enough, all items are.
+    """
+
+    def __init__(self, max_items=10000):
+        self.max_items = max_items
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires and expires <= time.time():
+            return None
+        return value
+
+    def get_multi(self, keys):
+        result = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def set(self, key, value, time=0):
+        with self._lock:
+            self._set(key, value, time)
+        return True
+
+    def add(self, key, value, time=0):
+        with self._lock:
+            if self.get(key) is not None:
+                return False
+            self._set(key, value, time)
+        return True
+
+    def incr(self, key, delta=1):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or self.get(key) is None:
+                return None
+            value = int(item[0]) + delta
+            self._items[key] = (value, item[1])
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+        return True
+
+    def disconnect_all(self):
+        pass
+
+    def _set(self, key, value, expire):
+        now = time.time()
+        if len(self._items) >= self.max_items:
+            self._items = {k: v for k, v in self._items.items() if not v[1] or v[1] > now}
+            if len(self._items) >= self.max_items:
+                self._items = {}
+        self._items[key] = (value, now + expire if expire else 0)
+
+
+def init(servers, namespace="AB"):
+    """Initialize the cache.
+
+    Args:
+        servers: List of memcached servers ("host:port" strings). If empty,
+            values are stored in memory of the current process.
+        namespace: Prefix for all keys.
+    """
+    global _client, _namespace
+    if servers:
+        import memcache
+        _client = memcache.Client(servers)
+    else:
+        _client = LocalClient()
+    _namespace = namespace
+
+
+def reset():
+    """Close connections to memcached servers.
+
+    Must be called in a child process after fork, so that it doesn't share
+    sockets with the parent. New connections are opened when needed.
+    """
+    if _client is not None:
+        _client.disconnect_all()
+
+
+def gen_key(key, *attributes):
+    """Generate a key from a base and a list of attributes."""
+    return ":".join([str(key)] + [str(a) for a in attributes])
+
+
+def get(key):
+    """Get value of a key. Returns None if it's not in cache."""
+    if _client is None:
+        return None
+    return _client.get(_prep_key(key))
+
+
+def get_multi(keys):
+    """Get values of multiple keys.
+
+    Returns:
+        Dictionary that maps keys to their values. Missing keys are omitted.
+    """
+    if _client is None:
+        return {}
+    prepped = {_prep_key(k): k for k in keys}
+    return {prepped[k]: v for k, v in _client.get_multi(list(prepped.keys())).items()}
+
+
+def set(key, value, time=0):
+    """Set value of a key.
+
+    Args:
+        key: Key of the item.
+        value: Value to store.
+        time: Expiration time in seconds, 0 means that item doesn't expire.
+    """
+    if _client is None:
+        return False
+    return _client.set(_prep_key(key), value, time=time)
+
+
+def add(key, value, time=0):
+    """Set value of a key only if it's not in cache yet."""
+    if _client is None:
+        return False
+    return _client.add(_prep_key(key), value, time=time)
+
+
+def incr(key, delta=1):
+    """Increment integer value of a key.
+
+    Returns:
+        New value, or None if key is not in cache.
+    """
+    if _client is None:
+        return None
+    return _client.incr(_prep_key(key), delta)
+
+
+def delete(key):
+    """Remove a key from cache."""
+    if _client is None:
+        return False
+    return _client.delete(_prep_key(key))
+
+
+def _prep_key(key):
+    return str("%s:%s" % (_namespace, key))
@@ -1,4 +1,7 @@
+from __future__ import division
 import db
+import db.cache
+import db.recording
 from utils import dataset_validator
 
 import json
@@ -7,6 +10,10 @@ from db import exceptions
 import re
 from sqlalchemy import text
 import unicodedata
+import time
+
+# Version of the list of datasets created by a user (see `get_user_version`)
+USER_VERSION_CACHE_KEY = "user_datasets_version"
 
 
 def _slugify(string):
@@ -19,82 +26,346 @@ def _slugify(string):
     return re.sub('[-\s]+', '-', string)
 
 
-def create_from_dict(dictionary, author_id):
+def create_from_dict(dictionary, author_id, progress=None):
     """Creates a new dataset from a dictionary.
 
+    Args:
+        progress: Optional function that is called with the fraction of
+            recordings that have been added so far.
+
     Returns:
         Tuple with two values: new dataset ID and error. If error occurs first
         will be None and second is an exception. If there are no errors, second
         value will be None.
     """
-    dataset_validator.validate(dictionary)
-
     with db.engine.begin() as connection:
-        if "description" not in dictionary:
-            dictionary["description"] = None
+        dataset_id = create(connection, dictionary, author_id, progress)
+
+    bump_user_version(author_id)
+    return dataset_id
 
-        result = connection.execute("""INSERT INTO dataset (id, name, description, public, author)
-                          VALUES (uuid_generate_v4(), %s, %s, %s, %s) RETURNING id""",
-                       (dictionary["name"], dictionary["description"], dictionary["public"], author_id))
-        dataset_id = result.fetchone()[0]
 
-        for cls in dictionary["classes"]:
-            if "description" not in cls:
-                cls["description"] = None
-            result = connection.execute("""INSERT INTO dataset_class (name, description, dataset)
-                              VALUES (%s, %s, %s) RETURNING id""",
-                           (cls["name"], cls["description"], dataset_id))
-            cls_id = result.fetchone()[0]
+def create(connection, dictionary, author_id, progress=None, recording_ids=None):
+    """Create a new dataset from a dictionary using an existing connection.
 
-            # Removing duplicate recordings
-            cls["recordings"] = list(set(cls["recordings"]))
+    Versions of datasets of the author must be bumped after the transaction
+    is committed.
 
-            for recording_mbid in cls["recordings"]:
-                connection.execute("INSERT INTO dataset_class_member (class, mbid) VALUES (%s, %s)",
-                               (cls_id, recording_mbid))
+    Args:
+        recording_ids: Dictionary that maps MBIDs of recordings in the
+            dataset to their IDs, if they have been looked up already.
 
+    Returns:
+        ID of the new dataset.
+    """
+    dataset_validator.validate(dictionary)
+    dataset_id = insert_dataset(connection, dictionary, author_id)
+    add_classes(connection, dataset_id, dictionary["classes"], progress, recording_ids)
     return dataset_id
 
 
-def update(dataset_id, dictionary, author_id):
+def insert_dataset(connection, dictionary, author_id):
+    """Insert a dataset without its classes.
+
+    Returns:
+        ID of the new dataset.
+    """
+    if "description" not in dictionary:
+        dictionary["description"] = None
+
+    result = connection.execute("""INSERT INTO dataset (id, name, description, public, author)
+                      VALUES (uuid_generate_v4(), %s, %s, %s, %s) RETURNING id""",
+                   (dictionary["name"], dictionary["description"], dictionary["public"], author_id))
+    dataset_id = result.fetchone()[0]
+    connection.execute("INSERT INTO dataset_stats (dataset) VALUES (%s)", (dataset_id,))
+    return dataset_id
+
+
+def update(dataset_id, dictionary, author_id, progress=None):
     # TODO(roman): Make author_id argument optional (keep old author if None).
+    with db.engine.begin() as connection:
+        previous_author_id = _update(connection, dataset_id, dictionary, author_id, progress)
+
+    bump_user_version(author_id)
+    if previous_author_id is not None and previous_author_id != author_id:
+        bump_user_version(previous_author_id)
+
+
+def _update(connection, dataset_id, dictionary, author_id, progress=None, recording_ids=None):
+    """Replace a dataset using an existing connection.
+
+    Versions of datasets of both authors must be bumped after the transaction
+    is committed.
+
+    Returns:
+        ID of the previous author, or None if the dataset doesn't exist.
+    """
     dataset_validator.validate(dictionary)
+    if "description" not in dictionary:
+        dictionary["description"] = None
+
+    result = connection.execute("SELECT author FROM dataset WHERE id = %s FOR UPDATE", (dataset_id,))
+    row = result.fetchone()
+    previous_author_id = row["author"] if row else None
+
+    connection.execute("""UPDATE dataset
+                      SET (name, description, public, author, last_edited) = (%s, %s, %s, %s, now())
+                      WHERE id = %s""",
+                   (dictionary["name"], dictionary["description"], dictionary["public"], author_id, dataset_id))
+
+    # Replacing old classes with new ones
+    _delete_classes(connection, dataset_id)
+
+    add_classes(connection, dataset_id, dictionary["classes"], progress, recording_ids)
+    return previous_author_id
+
+
+def add_classes(connection, dataset_id, classes, progress=None, recording_ids=None):
+    """Add classes with their recordings to a dataset.
 
+    MBIDs of recordings in all classes are converted to IDs with a single
+    query (unless `recording_ids` already maps them), and recordings of each
+    class are inserted with another one. If `progress` function is specified,
+    it's called with the fraction of recordings that have been added after
+    each class. Statistics of the dataset are updated with added classes.
+    """
+    if recording_ids is None:
+        recording_ids = db.recording.get_ids(connection, [mbid for cls in classes for mbid in cls["recordings"]])
+    total = sum(len(cls["recordings"]) for cls in classes)
+    added = 0
+    members = 0
+    for cls in classes:
+        if "description" not in cls:
+            cls["description"] = None
+        result = connection.execute("""INSERT INTO dataset_class (name, description, dataset)
+                          VALUES (%s, %s, %s) RETURNING id""",
+                       (cls["name"], cls["description"], dataset_id))
+        cls_id = result.fetchone()[0]
+
+        # Duplicate recordings are added only once
+        class_recording_ids = {recording_ids[mbid] for mbid in cls["recordings"]}
+        if class_recording_ids:
+            connection.execute(sqlalchemy.text("""
+                INSERT INTO dataset_class_member (class, recording)
+                     SELECT :class_id, unnest(CAST(:recording_ids AS INT[]))
+            """), {"class_id": cls_id, "recording_ids": list(class_recording_ids)})
+        connection.execute("INSERT INTO dataset_class_stats (class, recordings) VALUES (%s, %s)",
+                           (cls_id, len(class_recording_ids)))
+        members += len(class_recording_ids)
+        added += len(cls["recordings"])
+        if progress and total:
+            progress(added / total)
+    connection.execute("UPDATE dataset_stats SET (classes, recordings) = (classes + %s, recordings + %s) "
+                       "WHERE dataset = %s", (len(classes), members, dataset_id))
+
+
+def _delete_classes(connection, dataset_id):
+    """Delete all classes of a dataset with their recordings.
+
+    Members are deleted by class IDs before classes themselves, so that only
+    partitions that contain them are scanned if the table is partitioned.
+    Deletes that cascade from classes find nothing left to delete.
+    """
+    result = connection.execute("SELECT id FROM dataset_class WHERE dataset = %s", (dataset_id,))
+    class_ids = [row["id"] for row in result]
+    if class_ids:
+        connection.execute(sqlalchemy.text("""
+            DELETE FROM dataset_class_member
+                  WHERE class = ANY(:class_ids)
+        """), {"class_ids": class_ids})
+    connection.execute("DELETE FROM dataset_class WHERE dataset = %s", (dataset_id,))
+    connection.execute("UPDATE dataset_stats SET (classes, recordings) = (0, 0) WHERE dataset = %s", (dataset_id,))
+
+
+def add_recordings(dataset_id, class_name, mbids):
+    """Add recordings to a class of a dataset.
+
+    Recordings that are already in the class are ignored.
+    """
+    with db.engine.begin() as connection:
+        author_id = _add_recordings(connection, dataset_id, class_name, mbids)
+    bump_user_version(author_id)
+
+
+def remove_recordings(dataset_id, class_name, mbids):
+    """Remove recordings from a class of a dataset.
+
+    Recordings that aren't in the class are ignored.
+    """
     with db.engine.begin() as connection:
-        if "description" not in dictionary:
-            dictionary["description"] = None
+        author_id = _remove_recordings(connection, dataset_id, class_name, mbids)
+    bump_user_version(author_id)
+
 
-        connection.execute("""UPDATE dataset
-                          SET (name, description, public, author, last_edited) = (%s, %s, %s, %s, now())
-                          WHERE id = %s""",
-                       (dictionary["name"], dictionary["description"], dictionary["public"], author_id, dataset_id))
+def _add_recordings(connection, dataset_id, class_name, mbids, recording_ids=None):
+    """Add recordings to a class using an existing connection.
+
+    Returns:
+        ID of the author of the dataset, whose version of datasets must be
+        bumped after the transaction is committed.
+    """
+    dataset_validator.validate_recordings(mbids)
+    class_id = _get_class_id(connection, dataset_id, class_name)
+    # Dataset is locked before members and statistics, like in other changes
+    author_id = _touch(connection, dataset_id)
+    if recording_ids is None:
+        recording_ids = db.recording.get_ids(connection, mbids)
+    ids = list({recording_ids[mbid] for mbid in mbids})
+    if ids:
+        result = connection.execute(sqlalchemy.text("""
+            INSERT INTO dataset_class_member (class, recording)
+                 SELECT :class_id, unnest(CAST(:recording_ids AS INT[]))
+            ON CONFLICT DO NOTHING
+        """), {"class_id": class_id, "recording_ids": ids})
+        update_class_stats(connection, {class_id: result.rowcount})
+    return author_id
 
-        # Replacing old classes with new ones
-        connection.execute("""DELETE FROM dataset_class WHERE dataset = %s""", (dataset_id,))
 
-        for cls in dictionary["classes"]:
-            if "description" not in cls:
-                cls["description"] = None
-            result = connection.execute("""INSERT INTO dataset_class (name, description, dataset)
-                              VALUES (%s, %s, %s) RETURNING id""",
-                           (cls["name"], cls["description"], dataset_id))
-            cls_id = result.fetchone()[0]
+def _remove_recordings(connection, dataset_id, class_name, mbids):
+    """Remove recordings from a class using an existing connection.
+
+    Returns:
+        ID of the author of the dataset, whose version of datasets must be
+        bumped after the transaction is committed.
+    """
+    dataset_validator.validate_recordings(mbids)
+    class_id = _get_class_id(connection, dataset_id, class_name)
+    author_id = _touch(connection, dataset_id)
+    if mbids:
+        result = connection.execute(sqlalchemy.text("""
+            DELETE FROM dataset_class_member
+                  WHERE class = :class_id
+                    AND recording IN (
+                            SELECT id
+                              FROM recording
+                             WHERE mbid = ANY(CAST(:mbids AS UUID[]))
+                        )
+        """), {"class_id": class_id, "mbids": mbids})
+        update_class_stats(connection, {class_id: -result.rowcount})
+    return author_id
+
+
+def update_class_stats(connection, changes):
+    """Update statistics of datasets after recordings have been added to or
+    removed from their classes.
+
+    Args:
+        changes: Dictionary that maps IDs of classes to changes in their
+            numbers of recordings. Classes can be in different datasets.
+    """
+    changes = {class_id: change for class_id, change in changes.items() if change}
+    if not changes:
+        return
+    connection.execute(sqlalchemy.text("""
+        WITH change AS (
+            SELECT *
+              FROM unnest(CAST(:class_ids AS INT[]), CAST(:changes AS INT[])) AS change (class, recordings)
+        ), class_stats AS (
+            UPDATE dataset_class_stats
+               SET recordings = dataset_class_stats.recordings + change.recordings
+              FROM change
+             WHERE dataset_class_stats.class = change.class
+        )
+        UPDATE dataset_stats
+           SET recordings = dataset_stats.recordings + total.recordings
+          FROM (
+                   SELECT dataset_class.dataset, sum(change.recordings) AS recordings
+                     FROM change
+                     JOIN dataset_class
+                       ON dataset_class.id = change.class
+                 GROUP BY dataset_class.dataset
+               ) AS total
+         WHERE dataset_stats.dataset = total.dataset
+    """), {"class_ids": list(changes.keys()), "changes": list(changes.values())})
+
+
+def _get_class_id(connection, dataset_id, class_name):
+    class_ids = get_class_ids(connection, [(dataset_id, class_name)])
+    return check_class_ids(sum(class_ids.values(), []), class_name)
+
+
+def get_class_ids(connection, classes):
+    """Find IDs of classes in datasets with a single query.
+
+    Args:
+        classes: List of (dataset ID, class name) tuples.
+
+    Returns:
+        Dictionary that maps (dataset ID, class name) tuples of classes that
+        exist to lists of their IDs. Lists can contain multiple IDs, because
+        names of classes in old datasets aren't always unique.
+    """
+    result = connection.execute(sqlalchemy.text("""
+        SELECT DISTINCT dataset_class.dataset::text, dataset_class.name, dataset_class.id
+                   FROM dataset_class
+                   JOIN unnest(CAST(:dataset_ids AS UUID[]), CAST(:names AS VARCHAR[])) AS requested (dataset, name)
+                     ON dataset_class.dataset = requested.dataset
+                    AND dataset_class.name = requested.name
+    """), {
+        "dataset_ids": [str(dataset_id) for dataset_id, _ in classes],
+        "names": [class_name for _, class_name in classes],
+    })
+    class_ids = {}
+    for row in result:
+        class_ids.setdefault((row["dataset"], row["name"]), []).append(row["id"])
+    return class_ids
+
+
+def check_class_ids(class_ids, class_name):
+    """Get the ID of a class from IDs of classes with its name."""
+    if not class_ids:
+        raise exceptions.NoDataFoundException("Can't find class \"%s\" in the dataset." % class_name)
+    if len(class_ids) > 1:
+        raise exceptions.BadDataException("There are multiple classes named \"%s\" in the dataset." % class_name)
+    return class_ids[0]
+
+
+def _touch(connection, dataset_id):
+    """Update time of the last change of a dataset.
+
+    This locks the dataset until the end of the transaction. Changes lock the
+    dataset before its classes, members and statistics, so that they can't
+    deadlock each other.
 
-            for recording_mbid in cls["recordings"]:
-                connection.execute("INSERT INTO dataset_class_member (class, mbid) VALUES (%s, %s)",
-                               (cls_id, recording_mbid))
+    Returns:
+        ID of the author of the dataset.
+    """
+    result = connection.execute(sqlalchemy.text("""
+        UPDATE dataset
+           SET last_edited = now()
+         WHERE id = :dataset_id
+     RETURNING author
+    """), {"dataset_id": str(dataset_id)})
+    return result.fetchone()["author"]
 
 
-def get(id):
+def get(id, fields=None, class_fields=None):
     """Get dataset with a specified ID.
 
+    Only requested data is loaded: tables that aren't needed for the
+    requested fields aren't queried.
+
+    Args:
+        id: ID of the dataset.
+        fields: List of fields of the dataset to load (see `FIELDS`). All of
+            them are loaded by default.
+        class_fields: List of fields of classes to load (see `CLASS_FIELDS`).
+            By default classes are loaded with their recordings, but without
+            counts. If the list is empty, classes aren't loaded at all.
+
     Returns:
         Dictionary with dataset details if it has been found, None
         otherwise.
     """
+    fields = FIELDS if fields is None else fields
+    class_fields = DEFAULT_CLASS_FIELDS if class_fields is None else class_fields
+    _check_fields(fields, FIELDS)
+    _check_fields(class_fields, CLASS_FIELDS)
+
     with db.engine.connect() as connection:
+        columns = ["id::text"] + [field for field in fields if field != "id"]
         result = connection.execute(
-            "SELECT id::text, name, description, author, created, public, last_edited "
+            "SELECT " + ", ".join(columns) + " "
             "FROM dataset "
             "WHERE id = %s",
             (str(id),)
@@ -102,48 +373,122 @@ def get(id):
         if result.rowcount < 1:
             raise exceptions.NoDataFoundException("Can't find dataset with a specified ID.")
         row = dict(result.fetchone())
-        row["classes"] = _get_classes(row["id"])
+        if class_fields:
+            row["classes"] = _get_classes(connection, row["id"], class_fields)
+        if "id" not in fields:
+            del row["id"]
         return row
 
-def _get_classes(dataset_id):
-    with db.engine.connect() as connection:
-        result = connection.execute(
-            "SELECT id::text, name, description "
-            "FROM dataset_class "
-            "WHERE dataset = %s",
-            (dataset_id,)
-        )
-        rows = result.fetchall()
-        classes = []
-        for row in rows:
-            row = dict(row)
-            row["recordings"] = _get_recordings_in_class(row["id"])
-            classes.append(row)
+
+# Fields of datasets that can be requested from `get`
+FIELDS = ["id", "name", "description", "author", "created", "public", "last_edited"]
+
+# Fields of classes that can be requested from `get`. `count` is the number of
+# recordings in a class, which is read from statistics without loading them.
+CLASS_FIELDS = ["id", "name", "description", "count", "recordings"]
+DEFAULT_CLASS_FIELDS = ["id", "name", "description", "recordings"]
+
+
+def _check_fields(fields, allowed):
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise ValueError("Unknown fields: %s" % ", ".join(sorted(unknown)))
+
+
+def _get_classes(connection, dataset_id, fields=DEFAULT_CLASS_FIELDS):
+    columns = ["dataset_class.id"] + ["dataset_class." + field for field in fields
+                                      if field in ("name", "description")]
+    join = ""
+    if "count" in fields:
+        columns.append("coalesce(dataset_class_stats.recordings, 0) AS count")
+        join = "LEFT JOIN dataset_class_stats ON dataset_class_stats.class = dataset_class.id "
+    result = connection.execute(
+        "SELECT " + ", ".join(columns) + " "
+        "FROM dataset_class " + join +
+        "WHERE dataset_class.dataset = %s",
+        (dataset_id,)
+    )
+    classes = [dict(row) for row in result.fetchall()]
+    if not classes:
         return classes
 
+    if "recordings" in fields:
+        # Recordings of all classes are loaded and converted back to MBIDs at
+        # once. Members are selected by class IDs, so that only partitions
+        # that contain them are scanned if the table is partitioned.
+        by_id = {cls["id"]: cls for cls in classes}
+        for cls in classes:
+            cls["recordings"] = []
+        result = connection.execute(sqlalchemy.text("""
+            SELECT class, recording.mbid::text
+              FROM dataset_class_member
+              JOIN recording
+                ON recording.id = dataset_class_member.recording
+             WHERE class = ANY(:class_ids)
+        """), {"class_ids": list(by_id.keys())})
+        for row in result:
+            by_id[row["class"]]["recordings"].append(row["mbid"])
+
+    for cls in classes:
+        if "id" in fields:
+            cls["id"] = str(cls["id"])
+        else:
+            del cls["id"]
+    return classes
+
 
-def _get_recordings_in_class(class_id):
+def get_class_recordings(dataset_id, class_name, after=None, limit=1000):
+    """Get a page of recordings in a class of a dataset.
+
+    Recordings are ordered by their IDs, so pages are read from the primary
+    key of `dataset_class_member` and getting a page takes the same time
+    wherever it is in the class. Recordings that are added or removed
+    between requests don't move other recordings between pages.
+
+    Args:
+        dataset_id: ID of the dataset.
+        class_name: Name of the class.
+        after: ID of the last recording on the previous page, or None to get
+            the first page.
+        limit: Maximum number of recordings on the page.
+
+    Returns:
+        List of (ID, MBID) tuples of recordings.
+    """
     with db.engine.connect() as connection:
-        result = connection.execute("SELECT mbid::text FROM dataset_class_member WHERE class = %s",
-                       (class_id,))
-        recordings = []
-        for row in result:
-            recordings.append(row["mbid"])
-        return recordings
+        class_id = _get_class_id(connection, dataset_id, class_name)
+        result = connection.execute(sqlalchemy.text("""
+            SELECT member.recording, recording.mbid::text
+              FROM (
+                       SELECT recording
+                         FROM dataset_class_member
+                        WHERE class = :class_id
+                          AND recording > :after
+                     ORDER BY recording
+                        LIMIT :limit
+                   ) AS member
+              JOIN recording
+                ON recording.id = member.recording
+          ORDER BY member.recording
+        """), {"class_id": class_id, "after": after if after is not None else 0, "limit": limit})
+        return [(row["recording"], row["mbid"]) for row in result]
 
 
 def get_by_user_id(user_id, public_only=True):
     """Get datasets created by a specified user.
 
     Returns:
-        List of dictionaries with dataset details.
+        List of dictionaries with dataset details, including numbers of
+        classes and recordings (see `get_stats`).
     """
     with db.engine.connect() as connection:
         where = "WHERE author = %s"
         if public_only:
             where += " AND public = TRUE"
-        result = connection.execute("SELECT id, name, description, author, created "
-                       "FROM dataset " + where,
+        result = connection.execute("SELECT id, name, description, author, created, public, "
+                       "coalesce(classes, 0) AS classes, coalesce(recordings, 0) AS recordings "
+                       "FROM dataset "
+                       "LEFT JOIN dataset_stats ON dataset_stats.dataset = dataset.id " + where,
                        (user_id,))
         datasets = []
         for row in result:
@@ -151,10 +496,200 @@ def get_by_user_id(user_id, public_only=True):
         return datasets
 
 
+def get_stats(dataset_id):
+    """Get statistics of a dataset.
+
+    Statistics are kept up to date when recordings are added or removed, so
+    they are read without counting recordings.
+
+    Returns:
+        Dictionary with numbers of classes and recordings (sum of sizes of
+        all classes), list of classes with their names and numbers of
+        recordings, and balance of the dataset: size of the smallest class
+        divided by size of the largest one (None if all classes are empty).
+    """
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            SELECT classes, recordings
+              FROM dataset_stats
+             WHERE dataset = :dataset_id
+        """), {"dataset_id": str(dataset_id)})
+        row = result.fetchone()
+        if not row:
+            raise exceptions.NoDataFoundException("Can't find dataset with a specified ID.")
+        stats = dict(row)
+        result = connection.execute(sqlalchemy.text("""
+            SELECT dataset_class.name, coalesce(dataset_class_stats.recordings, 0) AS recordings
+              FROM dataset_class
+         LEFT JOIN dataset_class_stats
+                ON dataset_class_stats.class = dataset_class.id
+             WHERE dataset_class.dataset = :dataset_id
+          ORDER BY dataset_class.id
+        """), {"dataset_id": str(dataset_id)})
+        stats["class_sizes"] = [dict(row) for row in result]
+    sizes = [cls["recordings"] for cls in stats["class_sizes"]]
+    stats["balance"] = min(sizes) / max(sizes) if sizes and max(sizes) else None
+    return stats
+
+
+def check_stats(fix=False):
+    """Compare statistics of all datasets with actual numbers of classes and
+    recordings.
+
+    Everything is counted with two queries, without blocking changes. When
+    `fix` is True, each dataset with wrong statistics is then locked, checked
+    again and fixed in its own transaction.
+
+    Returns:
+        List of (dataset ID, class ID, stored value, actual value) tuples for
+        statistics that are wrong (or have been fixed). Class ID is None for
+        statistics of whole datasets, which are compared as (classes,
+        recordings) tuples. Stored value is None if statistics are missing.
+    """
+    with db.engine.connect() as connection:
+        wrong = _find_wrong_stats(connection)
+    if not fix:
+        return wrong
+
+    fixed = []
+    for dataset_id in sorted({row[0] for row in wrong}):
+        with db.engine.begin() as connection:
+            result = connection.execute("SELECT id FROM dataset WHERE id = %s FOR UPDATE", (dataset_id,))
+            if result.rowcount < 1:
+                continue
+            for row in _find_wrong_stats(connection, dataset_id):
+                _, class_id, _, actual = row
+                if class_id is None:
+                    connection.execute(sqlalchemy.text("""
+                        INSERT INTO dataset_stats (dataset, classes, recordings)
+                             VALUES (:dataset_id, :classes, :recordings)
+                        ON CONFLICT (dataset) DO UPDATE
+                                SET (classes, recordings) = (EXCLUDED.classes, EXCLUDED.recordings)
+                    """), {"dataset_id": dataset_id, "classes": actual[0], "recordings": actual[1]})
+                else:
+                    connection.execute(sqlalchemy.text("""
+                        INSERT INTO dataset_class_stats (class, recordings)
+                             VALUES (:class_id, :recordings)
+                        ON CONFLICT (class) DO UPDATE SET recordings = EXCLUDED.recordings
+                    """), {"class_id": class_id, "recordings": actual})
+                fixed.append(row)
+    return fixed
+
+
+def _find_wrong_stats(connection, dataset_id=None):
+    """Find statistics that don't match actual numbers of classes and
+    recordings, in all datasets or in one of them.
+
+    Returns:
+        List of tuples, see `check_stats`.
+    """
+    params = {"dataset_id": dataset_id}
+    where = "WHERE dataset_class.dataset = :dataset_id" if dataset_id else ""
+    result = connection.execute(sqlalchemy.text("""
+        WITH actual AS (
+               SELECT dataset_class.dataset, dataset_class.id AS class, count(member.recording) AS recordings
+                 FROM dataset_class
+            LEFT JOIN dataset_class_member AS member
+                   ON member.class = dataset_class.id
+                 %s
+             GROUP BY dataset_class.id
+        )
+           SELECT actual.dataset::text, actual.class, stats.recordings AS stored, actual.recordings AS actual
+             FROM actual
+        LEFT JOIN dataset_class_stats AS stats
+               ON stats.class = actual.class
+            WHERE stats.recordings IS DISTINCT FROM actual.recordings
+    """ % where), params)
+    wrong = [tuple(row) for row in result]
+
+    result = connection.execute(sqlalchemy.text("""
+        WITH actual AS (
+               SELECT dataset_class.dataset, count(DISTINCT dataset_class.id) AS classes,
+                      count(member.recording) AS recordings
+                 FROM dataset_class
+            LEFT JOIN dataset_class_member AS member
+                   ON member.class = dataset_class.id
+                 %s
+             GROUP BY dataset_class.dataset
+        )
+           SELECT dataset.id::text AS dataset, stats.classes AS stored_classes,
+                  stats.recordings AS stored_recordings,
+                  coalesce(actual.classes, 0) AS classes, coalesce(actual.recordings, 0) AS recordings
+             FROM dataset
+        LEFT JOIN actual
+               ON actual.dataset = dataset.id
+        LEFT JOIN dataset_stats AS stats
+               ON stats.dataset = dataset.id
+            WHERE (stats.classes, stats.recordings) IS DISTINCT FROM
+                  (coalesce(actual.classes, 0), coalesce(actual.recordings, 0))
+              %s
+    """ % (where, "AND dataset.id = :dataset_id" if dataset_id else "")), params)
+    for row in result:
+        stored = None
+        if row["stored_classes"] is not None:
+            stored = (row["stored_classes"], row["stored_recordings"])
+        wrong.append((row["dataset"], None, stored, (row["classes"], row["recordings"])))
+    return wrong
+
+
 def delete(id):
     """Delete dataset with a specified ID."""
     with db.engine.begin() as connection:
-        connection.execute("DELETE FROM dataset WHERE id = %s", (str(id),))
+        author_id = _delete(connection, id)
+    if author_id is not None:
+        bump_user_version(author_id)
+
+
+def _delete(connection, id):
+    """Delete a dataset using an existing connection.
+
+    Returns:
+        ID of the author of the dataset, or None if it doesn't exist.
+    """
+    # Dataset is locked before its classes and statistics are changed
+    result = connection.execute("SELECT author FROM dataset WHERE id = %s FOR UPDATE", (str(id),))
+    row = result.fetchone()
+    if not row:
+        return None
+    _delete_classes(connection, str(id))
+    connection.execute("DELETE FROM dataset WHERE id = %s", (str(id),))
+    return row["author"]
+
+
+def get_user_version(user_id):
+    """Get current version of the list of datasets created by a user.
+
+    Version changes every time one of user's datasets is created, updated or
+    deleted, so it can be used in keys of cached data that is derived from
+    user's datasets. Versions are kept only in the cache. When one is missing,
+    a new one is generated from the current time, so it doesn't match any
+    version that was used before.
+
+    Returns:
+        Version (integer).
+    """
+    key = db.cache.gen_key(USER_VERSION_CACHE_KEY, user_id)
+    version = db.cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not db.cache.add(key, version):
+            # Another process has just set it
+            version = db.cache.get(key) or version
+    return version
+
+
+def bump_user_version(user_id):
+    """Change version of the list of datasets created by a user.
+
+    Must be called after every committed change to user's datasets.
+    """
+    key = db.cache.gen_key(USER_VERSION_CACHE_KEY, user_id)
+    if db.cache.incr(key) is None:
+        db.cache.set(key, _new_version())
+
+
+def _new_version():
+    return int(time.time() * 1000)
 
 
 def create_snapshot(dataset_id):
@@ -9,3 +9,7 @@ class NoDataFoundException(DatabaseException):
 class BadDataException(DatabaseException):
     """Should be used when incorrect data is being submitted."""
     pass
+
+class ConflictException(DatabaseException):
+    """Should be used when data has been changed concurrently by someone else."""
+    pass
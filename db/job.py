@@ -0,0 +1,246 @@
+"""
+Queue of background jobs.
+
+Jobs are rows of the job table. Workers (see webserver/jobs.py) claim pending
+jobs with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of them can take
+jobs from the queue at the same time without getting the same one and
+without waiting for each other. Jobs with higher priority are claimed first.
+
+While a job runs, its worker updates the heartbeat of the job. Jobs whose
+heartbeat stops (for example, because the worker was killed) are claimed
+again by other workers. Failed jobs are retried with an increasing delay until
+they run out of attempts, so their handlers must be safe to run again.
+
+A worker whose job has been claimed again may still be running it. Updates
+of a job are therefore tied to the attempt that the worker got from `claim`,
+and are ignored once another attempt has started.
+"""
+import db
+import db.exceptions
+import json
+import sqlalchemy
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+# Running jobs whose heartbeat is older than this (in seconds) are considered
+# abandoned and can be claimed again.
+STALE_AFTER = 5 * 60
+# Delay (in seconds) before the first retry, doubled with every attempt.
+RETRY_DELAY = 30
+
+
+def create(type, payload, owner=None, priority=0, max_attempts=1):
+    """Add a job into the queue.
+
+    Args:
+        type: Type of the job (name of its handler).
+        payload: JSON serializable data for the handler.
+        owner: ID of the user who can see and cancel the job.
+        priority: Jobs with higher priority run first.
+        max_attempts: Number of times the job is tried before it fails.
+
+    Returns:
+        ID (UUID) of the new job.
+    """
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            INSERT INTO job (id, type, payload, owner, priority, max_attempts)
+                 VALUES (uuid_generate_v4(), :type, :payload, :owner, :priority, :max_attempts)
+              RETURNING id::text
+        """), {
+            "type": type,
+            "payload": json.dumps(payload),
+            "owner": owner,
+            "priority": priority,
+            "max_attempts": max_attempts,
+        })
+        return result.fetchone()["id"]
+
+
+def get(id):
+    """Get a job with a specified ID.
+
+    Returns:
+        Dictionary with details of the job, without its payload.
+    """
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            SELECT id::text, type, status::text, priority, owner, result, error, progress,
+                   attempts, max_attempts, cancel_requested, created, finished
+              FROM job
+             WHERE id = :id
+        """), {"id": str(id)})
+        row = result.fetchone()
+        if not row:
+            raise db.exceptions.NoDataFoundException("Can't find job with a specified ID.")
+        return dict(row)
+
+
+def claim(stale_after=STALE_AFTER):
+    """Take the next job from the queue and mark it as running.
+
+    Returns:
+        Dictionary with ID, type, owner, payload and attempt of the job, or
+        None if there are no jobs to run.
+    """
+    while True:
+        with db.engine.connect() as connection:
+            result = connection.execute(sqlalchemy.text("""
+                UPDATE job
+                   SET status = 'running'
+                     , attempts = attempts + 1
+                     , heartbeat = now()
+                 WHERE id = (
+                         SELECT id
+                           FROM job
+                          WHERE (status = 'pending' AND run_after <= now())
+                             OR (status = 'running' AND heartbeat < now() - make_interval(secs => :stale_after))
+                       ORDER BY priority DESC, run_after
+                          LIMIT 1
+                            FOR UPDATE SKIP LOCKED
+                       )
+             RETURNING id::text, type, owner, payload, attempts, max_attempts
+            """), {"stale_after": stale_after})
+            row = result.fetchone()
+        if row is None:
+            return None
+        if row["attempts"] > row["max_attempts"]:
+            # Abandoned by a worker on its last attempt
+            fail(row["id"], row["attempts"], "Worker stopped while running the job.", retry=False)
+            continue
+        return {
+            "id": row["id"],
+            "type": row["type"],
+            "owner": row["owner"],
+            "payload": row["payload"],
+            "attempt": row["attempts"],
+        }
+
+
+def heartbeat(id, attempt, progress=None):
+    """Record that a job is still running.
+
+    Args:
+        id: ID of the job.
+        attempt: Attempt of the job that is running.
+        progress: Fraction of the job that is done (0 to 1), if it's known.
+
+    Returns:
+        True if the job should stop because it was cancelled or claimed by
+        another worker.
+    """
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            UPDATE job
+               SET heartbeat = now()
+                 , progress = COALESCE(:progress, progress)
+             WHERE id = :id
+               AND attempts = :attempt
+               AND status = 'running'
+         RETURNING cancel_requested
+        """), {"id": id, "attempt": attempt, "progress": progress})
+        row = result.fetchone()
+        return row is None or row["cancel_requested"]
+
+
+def finish(id, attempt, result=None):
+    """Mark a job as done and store its result."""
+    with db.engine.connect() as connection:
+        connection.execute(sqlalchemy.text("""
+            UPDATE job
+               SET status = 'done'
+                 , result = :result
+                 , progress = 1
+                 , payload = NULL
+                 , finished = now()
+             WHERE id = :id
+               AND attempts = :attempt
+        """), {"id": id, "attempt": attempt, "result": json.dumps(result)})
+
+
+def fail(id, attempt, error, retry=True):
+    """Record an error of a job.
+
+    The job is scheduled to run again if it has attempts left and `retry` is
+    True, otherwise it's marked as failed.
+    """
+    with db.engine.connect() as connection:
+        connection.execute(sqlalchemy.text("""
+            UPDATE job
+               SET status = CAST(CASE WHEN :retry AND attempts < max_attempts
+                                      THEN 'pending' ELSE 'failed' END AS job_status)
+                 , error = :error
+                 , run_after = now() + make_interval(secs => :delay * 2 ^ (attempts - 1))
+                 , payload = CASE WHEN :retry AND attempts < max_attempts THEN payload END
+                 , finished = CASE WHEN :retry AND attempts < max_attempts THEN NULL ELSE now() END
+             WHERE id = :id
+               AND attempts = :attempt
+        """), {"id": id, "attempt": attempt, "error": error, "retry": retry, "delay": RETRY_DELAY})
+
+
+def get_result(connection, id):
+    """Get the result that has been saved for a job, or None."""
+    result = connection.execute(sqlalchemy.text("SELECT result FROM job WHERE id = :id"), {"id": str(id)})
+    row = result.fetchone()
+    return row["result"] if row else None
+
+
+def save_result(connection, id, result):
+    """Save the result of a job before it's finished.
+
+    Handlers that change data can save their result in the same transaction
+    as the changes. If the job is run again after that transaction has been
+    committed, the handler finds the result with `get_result` and returns it
+    instead of repeating the changes.
+
+    Raises:
+        ConflictException: Another attempt of the job has already saved its
+            result. The transaction should be rolled back.
+    """
+    result = connection.execute(sqlalchemy.text("""
+        UPDATE job
+           SET result = :result
+         WHERE id = :id
+           AND result IS NULL
+    """), {"id": str(id), "result": json.dumps(result)})
+    if result.rowcount == 0:
+        raise db.exceptions.ConflictException("Result of the job has already been saved.")
+
+
+def cancel(id):
+    """Cancel a job.
+
+    Pending jobs are cancelled immediately. Running jobs are asked to stop,
+    which they do the next time they report progress.
+
+    Returns:
+        New status of the job.
+    """
+    with db.engine.connect() as connection:
+        connection.execute(sqlalchemy.text("""
+            UPDATE job
+               SET status = CAST(CASE WHEN status = 'pending' THEN 'cancelled' ELSE status::text END AS job_status)
+                 , cancel_requested = (status = 'running')
+                 , payload = CASE WHEN status = 'pending' THEN NULL ELSE payload END
+                 , finished = CASE WHEN status = 'pending' THEN now() ELSE finished END
+             WHERE id = :id
+               AND status IN ('pending', 'running')
+        """), {"id": str(id)})
+    return get(id)["status"]
+
+
+def mark_cancelled(id, attempt):
+    """Mark a running job as cancelled after it has stopped."""
+    with db.engine.connect() as connection:
+        connection.execute(sqlalchemy.text("""
+            UPDATE job
+               SET status = 'cancelled'
+                 , payload = NULL
+                 , finished = now()
+             WHERE id = :id
+               AND attempts = :attempt
+        """), {"id": id, "attempt": attempt})
@@ -0,0 +1,336 @@
+"""
+Schema migrations.
+
+Migrations are files in admin/migrations named "<version>_<name>.sql" or
+"<version>_<name>.py". Each one upgrades the schema from the previous version
+to its own; the last one must match `db.SCHEMA_VERSION`. Applied versions are
+recorded in the schema_version table.
+
+SQL migrations are run as they are, so they should contain their own
+transaction (BEGIN/COMMIT). Python migrations define `upgrade(op)`, where `op`
+is an `Operations` object that provides operations that don't block the site
+while they run:
+* indexes are created concurrently,
+* constraints are added as NOT VALID and validated separately,
+* data is updated in small batches, with pauses in between.
+
+Every statement waits for locks at most `lock_timeout` seconds and is retried
+a few times if it can't get them, so a migration never queues behind a long
+query and blocks everything else. Migrations should be safe to run again if
+they fail in the middle; operations provided by `Operations` are.
+"""
+from __future__ import print_function, division
+from contextlib import contextmanager
+import db
+import db.exceptions
+import sqlalchemy
+import sqlalchemy.exc
+import time
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "admin", "migrations")
+VERSION_TABLE = "schema_version"
+
+# Number of attempts of statements that time out while waiting for a lock
+LOCK_ATTEMPTS = 5
+# PostgreSQL error code of lock timeouts
+LOCK_NOT_AVAILABLE = "55P03"
+
+_FILENAME_RE = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+
+class Migration(object):
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    @property
+    def is_sql(self):
+        return self.path.endswith(".sql")
+
+    def __repr__(self):
+        return "<Migration %04d %s>" % (self.version, self.name)
+
+
+def find_migrations(directory=MIGRATIONS_DIR):
+    """Get all migrations ordered by version."""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise db.exceptions.DatabaseException(
+                "There are multiple migrations to version %d." % version)
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def get_version():
+    """Get current version of the schema.
+
+    Returns:
+        Version (integer), or None if it has never been recorded.
+    """
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("SELECT to_regclass(:table)"), {"table": VERSION_TABLE})
+        if result.fetchone()[0] is None:
+            return None
+        return connection.execute("SELECT max(version) FROM %s" % VERSION_TABLE).fetchone()[0]
+
+
+def stamp(version, name="stamp"):
+    """Record that the schema is at a specified version, without running any
+    migrations.
+    """
+    with db.engine.begin() as connection:
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS %s (
+              version INTEGER NOT NULL PRIMARY KEY,
+              name    TEXT    NOT NULL,
+              applied TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+            )
+        """ % VERSION_TABLE)
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO %s (version, name)
+                 VALUES (:version, :name)
+            ON CONFLICT (version) DO NOTHING
+        """ % VERSION_TABLE), {"version": version, "name": name})
+
+
+def get_pending(target=None, migrations=None):
+    """Get migrations that haven't been applied yet.
+
+    Args:
+        target: Version to migrate to. Defaults to `db.SCHEMA_VERSION`.
+        migrations: List of all migrations, found in MIGRATIONS_DIR by default.
+    """
+    if target is None:
+        target = db.SCHEMA_VERSION
+    if migrations is None:
+        migrations = find_migrations()
+    current = get_version()
+    if current is None:
+        raise db.exceptions.DatabaseException(
+            "Schema version is unknown. Use `manage.py migrate --stamp <version>` "
+            "to record the current version first.")
+    return [m for m in migrations if current < m.version <= target]
+
+
+def migrate(target=None, dry_run=False, lock_timeout=5, report=print, migrations=None):
+    """Apply pending migrations.
+
+    Args:
+        target: Version to migrate to. Defaults to `db.SCHEMA_VERSION`.
+        dry_run: Only report statements, without running them.
+        lock_timeout: Maximum time (in seconds) that a statement waits for
+            locks before it's retried.
+        report: Function that is called with progress messages.
+        migrations: List of all migrations, found in MIGRATIONS_DIR by default.
+
+    Returns:
+        List of applied migrations.
+    """
+    pending = get_pending(target, migrations)
+    for migration in pending:
+        report("Migrating to %04d %s..." % (migration.version, migration.name))
+        start = time.time()
+        op = Operations(dry_run, lock_timeout, report)
+        try:
+            if migration.is_sql:
+                op.run_script(migration.path)
+            else:
+                namespace = {"__file__": migration.path}
+                with open(migration.path) as f:
+                    exec(compile(f.read(), migration.path, "exec"), namespace)
+                namespace["upgrade"](op)
+        finally:
+            op.close()
+        if not dry_run:
+            stamp(migration.version, migration.name)
+        report("Done in %.1f s." % (time.time() - start))
+    return pending
+
+
+class Operations(object):
+    """Operations available to migrations.
+
+    Statements are run outside of transactions, unless they are run within
+    `transaction`.
+    """
+
+    def __init__(self, dry_run=False, lock_timeout=5, report=print):
+        self.dry_run = dry_run
+        self.lock_timeout = lock_timeout
+        self.report = report
+        self._connection = None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+            self._connection.execute("SET lock_timeout = %d" % (self.lock_timeout * 1000))
+            # Index builds and validation can take a long time
+            self._connection.execute("SET statement_timeout = 0")
+        return self._connection
+
+    def execute(self, statement, params=None):
+        """Run a statement, retrying it if it can't get locks in time."""
+        self.report("  " + _format_statement(statement))
+        if self.dry_run:
+            return None
+        for attempt in range(LOCK_ATTEMPTS):
+            try:
+                return self.connection.execute(sqlalchemy.text(statement), params or {})
+            except sqlalchemy.exc.OperationalError as e:
+                if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE or attempt == LOCK_ATTEMPTS - 1:
+                    raise
+                self.report("  Couldn't get a lock, retrying...")
+                time.sleep(2 ** attempt)
+
+    def run_script(self, path):
+        """Run an SQL script."""
+        self.report("  Running %s" % os.path.basename(path))
+        if self.dry_run:
+            return
+        with open(path) as f:
+            self.connection.execute(f.read())
+
+    def query(self, statement, params=None):
+        """Run a query that doesn't change anything, also in a dry run.
+
+        Returns:
+            List of rows.
+        """
+        return self.connection.execute(sqlalchemy.text(statement), params or {}).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Run statements in a transaction.
+
+        Yields:
+            Function that runs a statement in the transaction.
+        """
+        if self.dry_run:
+            self.report("  BEGIN")
+            yield lambda statement, params=None: self.report("  " + _format_statement(statement))
+            self.report("  COMMIT")
+            return
+        with db.engine.begin() as connection:
+            connection.execute("SET LOCAL lock_timeout = %d" % (self.lock_timeout * 1000))
+
+            def execute(statement, params=None):
+                self.report("  " + _format_statement(statement))
+                return connection.execute(sqlalchemy.text(statement), params or {})
+            yield execute
+
+    def create_index(self, name, table, columns, unique=False, where=None):
+        """Create an index without blocking writes to the table.
+
+        An invalid index left by a failed attempt is dropped first.
+        """
+        if self._is_invalid_index(name):
+            self.drop_index(name)
+        self.execute("CREATE %sINDEX CONCURRENTLY IF NOT EXISTS %s ON %s (%s)%s" % (
+            "UNIQUE " if unique else "", name, table, columns,
+            " WHERE %s" % where if where else ""))
+
+    def drop_index(self, name):
+        """Drop an index without blocking the table."""
+        self.execute("DROP INDEX CONCURRENTLY IF EXISTS %s" % name)
+
+    def add_constraint(self, table, name, definition, validate=True):
+        """Add a constraint without blocking the table while rows are checked.
+
+        Constraint is added as NOT VALID, so only new rows are checked, and
+        then existing rows are validated, which doesn't block writes.
+        Definition must be a CHECK or a FOREIGN KEY constraint.
+
+        Args:
+            validate: Set to False to leave validation for a later migration.
+        """
+        if self._constraint_exists(table, name) is None:
+            self.execute("ALTER TABLE %s ADD CONSTRAINT %s %s NOT VALID" % (table, name, definition))
+        if validate:
+            self.validate_constraint(table, name)
+
+    def validate_constraint(self, table, name):
+        if self._constraint_exists(table, name) is not True:
+            self.execute("ALTER TABLE %s VALIDATE CONSTRAINT %s" % (table, name))
+
+    def backfill(self, table, column, statements, batch_size=1000, pause=0.1):
+        """Update rows of a table in batches.
+
+        Each batch covers a range of values of `column`, which must be an
+        indexed integer column, and is committed separately.
+
+        Args:
+            table: Name of the table.
+            column: Name of the column that batches are selected by.
+            statements: Statement or list of statements that are run for each
+                batch. They get the range of the batch in :start (inclusive)
+                and :end (exclusive) parameters.
+            batch_size: Size of the range of each batch.
+            pause: Time (in seconds) to wait between batches, so that other
+                queries can keep up.
+        """
+        if not isinstance(statements, (list, tuple)):
+            statements = [statements]
+        self.report("  Backfilling %s in batches of %d by %s:" % (table, batch_size, column))
+        for statement in statements:
+            self.report("    " + _format_statement(statement))
+        if self.dry_run:
+            return
+        first, last = self.query("SELECT min(%s), max(%s) FROM %s" % (column, column, table))[0]
+        if first is None:
+            return
+        batches = (last - first) // batch_size + 1
+        rows = 0
+        for i, start in enumerate(range(first, last + 1, batch_size)):
+            with db.engine.begin() as connection:
+                connection.execute("SET LOCAL lock_timeout = %d" % (self.lock_timeout * 1000))
+                for statement in statements:
+                    result = connection.execute(sqlalchemy.text(statement), {
+                        "start": start,
+                        "end": start + batch_size,
+                    })
+                rows += max(result.rowcount, 0)
+            if (i + 1) % 100 == 0 or i + 1 == batches:
+                self.report("    %d%% (%d rows updated)" % ((i + 1) * 100 // batches, rows))
+            time.sleep(pause)
+
+    def _is_invalid_index(self, name):
+        rows = self.query("""
+            SELECT indisvalid
+              FROM pg_index
+             WHERE indexrelid = to_regclass(:name)
+        """, {"name": name})
+        return bool(rows) and not rows[0][0]
+
+    def _constraint_exists(self, table, name):
+        """Check if a constraint exists.
+
+        Returns:
+            None if it doesn't exist, otherwise True if it's valid and
+            False if it hasn't been validated yet.
+        """
+        rows = self.query("""
+            SELECT convalidated
+              FROM pg_constraint
+             WHERE conrelid = to_regclass(:table)
+               AND conname = :name
+        """, {"table": table, "name": name})
+        return rows[0][0] if rows else None
+
+
+def _format_statement(statement):
+    return " ".join(statement.split())
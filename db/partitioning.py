@@ -0,0 +1,175 @@
+"""
+Hash partitioning of dataset_class_member.
+
+Very large deployments can split members of dataset classes into a number of
+partitions by class (see DATASET_CLASS_MEMBER_PARTITIONS). Each partition is
+vacuumed and indexed separately, and queries that filter members by class
+only touch partitions that can contain them, as long as class IDs are known
+when the query is planned. Requires PostgreSQL 11 or newer.
+
+Primary key, foreign keys and indexes are created on the partitioned table by
+the usual scripts in admin/sql.
+"""
+import db
+import db.exceptions
+import sqlalchemy
+
+TABLE = "dataset_class_member"
+# Name of the partitioned table while data is copied into it
+MIGRATION_TABLE = "dataset_class_member_partitioned"
+# Lowest server version that supports hash partitioning
+MIN_SERVER_VERSION = 110000
+
+
+def is_partitioned(connection, table=TABLE):
+    result = connection.execute(sqlalchemy.text("""
+        SELECT count(*)
+          FROM pg_partitioned_table
+          JOIN pg_class
+            ON pg_class.oid = pg_partitioned_table.partrelid
+         WHERE pg_class.relname = :table
+           AND pg_table_is_visible(pg_class.oid)
+    """), {"table": table})
+    return result.fetchone()[0] > 0
+
+
+def create_table(connection, partitions, table=TABLE):
+    """Create a hash partitioned table for members of dataset classes.
+
+    Args:
+        connection: an SQLAlchemy connection.
+        partitions: Number of partitions.
+        table: Name of the table.
+    """
+    version = connection.execute("SHOW server_version_num").fetchone()[0]
+    if int(version) < MIN_SERVER_VERSION:
+        raise db.exceptions.DatabaseException(
+            "Partitioning of %s requires PostgreSQL 11 or newer." % TABLE)
+    connection.execute("""
+        CREATE TABLE %s (
+          class     INT, -- FK to class
+          recording INT  -- FK to recording
+        ) PARTITION BY HASH (class)
+    """ % table)
+    for remainder in range(partitions):
+        connection.execute("""
+            CREATE TABLE %s_p%d
+              PARTITION OF %s
+              FOR VALUES WITH (MODULUS %d, REMAINDER %d)
+        """ % (table, remainder, table, partitions, remainder))
+
+
+def replace_table(partitions):
+    """Replace empty dataset_class_member table with a partitioned one.
+
+    Must be called after tables are created, but before their keys and
+    indexes are.
+    """
+    with db.engine.begin() as connection:
+        connection.execute("DROP TABLE %s" % TABLE)
+        create_table(connection, partitions)
+
+
+def migrate(partitions, batch_size=1000):
+    """Move existing members of dataset classes into a partitioned table.
+
+    Members are copied into a new partitioned table in batches of classes,
+    each in its own transaction, while a trigger applies concurrent changes
+    of the old table to the new one. Copied rows are locked until their batch
+    is committed, so a row can't be deleted from the old table after it has
+    been read but before it is copied. When everything has been copied, the
+    tables are swapped; the old one is renamed to dataset_class_member_old
+    and can be dropped after checking the result.
+
+    The process can be interrupted and started again, the new table is
+    reused if it exists.
+
+    Args:
+        partitions: Number of partitions. Ignored if the new table exists.
+        batch_size: Number of classes copied in each transaction.
+
+    Yields:
+        Number of rows copied in each batch.
+    """
+    with db.engine.begin() as connection:
+        if is_partitioned(connection):
+            raise db.exceptions.DatabaseException("%s is already partitioned." % TABLE)
+        if not is_partitioned(connection, MIGRATION_TABLE):
+            _prepare_migration(connection, partitions)
+        row = connection.execute("SELECT min(class), max(class) FROM %s" % TABLE).fetchone()
+
+    first, last = row
+    if first is not None:
+        for start in range(first, last + 1, batch_size):
+            with db.engine.begin() as connection:
+                result = connection.execute(sqlalchemy.text("""
+                    INSERT INTO %s (class, recording)
+                         SELECT class, recording
+                           FROM %s
+                          WHERE class >= :start AND class < :end
+                            FOR KEY SHARE
+                    ON CONFLICT DO NOTHING
+                """ % (MIGRATION_TABLE, TABLE)), {"start": start, "end": start + batch_size})
+                yield result.rowcount
+
+    with db.engine.begin() as connection:
+        connection.execute("LOCK TABLE %s IN ACCESS EXCLUSIVE MODE" % TABLE)
+        partition_count = _count_partitions(connection)
+        connection.execute("DROP TRIGGER %s_copy ON %s" % (TABLE, TABLE))
+        connection.execute("DROP FUNCTION %s_copy()" % TABLE)
+        connection.execute("ALTER TABLE %s RENAME TO %s_old" % (TABLE, TABLE))
+        for name in ["dataset_class_member_pkey", "recording_ndx_dataset_class_member"]:
+            connection.execute("ALTER INDEX %s RENAME TO %s_old" % (name, name))
+            connection.execute("ALTER INDEX %s RENAME TO %s" % (name.replace(TABLE, MIGRATION_TABLE), name))
+        connection.execute("ALTER TABLE %s RENAME TO %s" % (MIGRATION_TABLE, TABLE))
+        for remainder in range(partition_count):
+            connection.execute("ALTER TABLE %s_p%d RENAME TO %s_p%d" % (
+                MIGRATION_TABLE, remainder, TABLE, remainder))
+
+
+def _prepare_migration(connection, partitions):
+    create_table(connection, partitions, MIGRATION_TABLE)
+    connection.execute("""
+        ALTER TABLE %(new)s
+          ADD CONSTRAINT %(new)s_pkey PRIMARY KEY (class, recording);
+        CREATE INDEX recording_ndx_%(new)s ON %(new)s (recording);
+        ALTER TABLE %(new)s
+          ADD CONSTRAINT class_member_fk_class
+          FOREIGN KEY (class)
+          REFERENCES dataset_class (id)
+          ON UPDATE CASCADE
+          ON DELETE CASCADE;
+        ALTER TABLE %(new)s
+          ADD CONSTRAINT class_member_fk_recording
+          FOREIGN KEY (recording)
+          REFERENCES recording (id);
+
+        CREATE OR REPLACE FUNCTION %(old)s_copy() RETURNS TRIGGER AS $$
+        BEGIN
+          IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM %(new)s
+             WHERE class = OLD.class
+               AND recording = OLD.recording;
+          END IF;
+          IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO %(new)s (class, recording)
+                 VALUES (NEW.class, NEW.recording)
+            ON CONFLICT DO NOTHING;
+          END IF;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER %(old)s_copy
+          AFTER INSERT OR UPDATE OR DELETE ON %(old)s
+          FOR EACH ROW EXECUTE PROCEDURE %(old)s_copy();
+    """ % {"new": MIGRATION_TABLE, "old": TABLE})
+
+
+def _count_partitions(connection):
+    result = connection.execute(sqlalchemy.text("""
+        SELECT count(*)
+          FROM pg_inherits
+         WHERE inhparent = CAST(:table AS regclass)
+    """), {"table": MIGRATION_TABLE})
+    return result.fetchone()[0]
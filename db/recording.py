@@ -0,0 +1,48 @@
+"""
+Recordings referenced by datasets.
+
+Each recording MBID is stored once in the recording table, and other tables
+refer to it by an integer ID. The same recordings appear in many datasets, so
+this keeps rows and indexes of these tables small.
+"""
+import sqlalchemy
+import uuid
+
+
+def get_ids(connection, mbids):
+    """Get IDs of recordings, adding the ones that don't exist yet.
+
+    All recordings are looked up and added with a single query.
+
+    Args:
+        connection: an SQLAlchemy connection.
+        mbids: Iterable with recording MBIDs (strings or UUIDs).
+
+    Returns:
+        Dictionary that maps given MBIDs to IDs.
+    """
+    canonical = {mbid: str(uuid.UUID(str(mbid))) for mbid in mbids}
+    missing = set(canonical.values())
+    ids = {}
+    while missing:
+        result = connection.execute(sqlalchemy.text("""
+            WITH input AS (
+                SELECT unnest(CAST(:mbids AS UUID[])) AS mbid
+            ), new_recording AS (
+                INSERT INTO recording (mbid)
+                     SELECT mbid FROM input
+                ON CONFLICT (mbid) DO NOTHING
+                  RETURNING id, mbid
+            )
+            SELECT id, mbid::text FROM new_recording
+             UNION ALL
+            SELECT id, mbid::text
+              FROM recording
+              JOIN input USING (mbid)
+        """), {"mbids": list(missing)})
+        ids.update((row["mbid"], row["id"]) for row in result)
+        # Recordings added by concurrent transactions after this statement
+        # started are neither inserted nor visible to it, so they are looked
+        # up again.
+        missing -= set(ids.keys())
+    return {mbid: ids[canonical_mbid] for mbid, canonical_mbid in canonical.items()}
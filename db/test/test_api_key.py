@@ -3,6 +3,8 @@ import db.exceptions
 import db.api_key
 import db.user
 import six
+import pytz
+from datetime import datetime
 
 
 class APIKeyTestCase(DatabaseTestCase):
@@ -54,3 +56,34 @@ class APIKeyTestCase(DatabaseTestCase):
 
         with self.assertRaises(db.exceptions.NoDataFoundException):
             db.api_key.is_active("fakeKey42")
+
+    def test_record_usage(self):
+        key_1 = db.api_key.generate(self.user_id)
+        key_2 = db.api_key.generate(self.user_id)
+        usage = {row["value"]: row for row in db.api_key.get_usage(self.user_id)}
+        self.assertEqual(usage[key_1]["request_count"], 0)
+        self.assertIsNone(usage[key_1]["last_used"])
+
+        first = datetime(2016, 1, 1, tzinfo=pytz.utc)
+        second = datetime(2016, 1, 2, tzinfo=pytz.utc)
+        db.api_key.record_usage({key_1: (3, second), key_2: (1, first)})
+        db.api_key.record_usage({key_1: (2, first)})
+
+        usage = {row["value"]: row for row in db.api_key.get_usage(self.user_id)}
+        self.assertEqual(usage[key_1]["request_count"], 5)
+        self.assertEqual(usage[key_1]["last_used"], second)
+        self.assertEqual(usage[key_2]["request_count"], 1)
+
+    def test_get_top_by_usage(self):
+        key_1 = db.api_key.generate(self.user_id)
+        key_2 = db.api_key.generate(self.user_id)
+        now = datetime.now(pytz.utc)
+        db.api_key.record_usage({key_1: (1, now), key_2: (10, now)})
+
+        top = db.api_key.get_top_by_usage()
+        self.assertEqual([k["value"] for k in top], [key_2, key_1])
+        self.assertEqual(top[0]["musicbrainz_id"], "fuzzy_dunlop")
+
+        db.api_key.revoke(key_2)
+        top = db.api_key.get_top_by_usage(active_only=True)
+        self.assertEqual([k["value"] for k in top], [key_1])
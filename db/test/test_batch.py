@@ -0,0 +1,114 @@
+from db.testing import DatabaseTestCase
+from db import cache
+import db.batch
+import db.dataset
+import db.user
+
+RECORDING_1 = "0dad432b-16cc-4bf0-8961-fd31d124b01b"
+RECORDING_2 = "19e698e7-71df-48a9-930e-d4b1a2026c82"
+
+
+class BatchTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super(BatchTestCase, self).setUp()
+        cache.init([])
+        self.user_id = db.user.create("fuzzy_dunlop")
+        self.dataset = {
+            "name": "Test",
+            "description": "",
+            "public": True,
+            "classes": [
+                {"name": "Class A", "description": "", "recordings": [RECORDING_1]},
+                {"name": "Class B", "description": "", "recordings": []},
+            ],
+        }
+        self.dataset_id = db.dataset.create_from_dict(self.dataset, self.user_id)
+
+    def test_run(self):
+        version = db.dataset.get_user_version(self.user_id)
+        committed, results = db.batch.run([
+            {"op": "create", "dataset": {"name": "New", "classes": [{"name": "C", "recordings": [RECORDING_2]}]}},
+            {"op": "add_recordings", "dataset_id": self.dataset_id, "class_name": "Class B",
+             "recordings": [RECORDING_1, RECORDING_2]},
+            {"op": "remove_recordings", "dataset_id": self.dataset_id, "class_name": "Class A",
+             "recordings": [RECORDING_1]},
+        ], self.user_id)
+        self.assertTrue(committed)
+        self.assertEqual([r["success"] for r in results], [True, True, True])
+
+        new = db.dataset.get(results[0]["dataset_id"])
+        self.assertEqual(new["author"], self.user_id)
+        self.assertEqual(new["classes"][0]["recordings"], [RECORDING_2])
+        classes = {cls["name"]: cls for cls in db.dataset.get(self.dataset_id)["classes"]}
+        self.assertEqual(classes["Class A"]["recordings"], [])
+        self.assertEqual(sorted(classes["Class B"]["recordings"]), [RECORDING_1, RECORDING_2])
+        self.assertNotEqual(db.dataset.get_user_version(self.user_id), version)
+
+    def test_run_invalid(self):
+        committed, results = db.batch.run([
+            {"op": "delete", "dataset_id": self.dataset_id},
+            {"op": "rename"},
+        ], self.user_id)
+        self.assertFalse(committed)
+        self.assertEqual([r["success"] for r in results], [False, False])
+        self.assertIsNotNone(db.dataset.get(self.dataset_id))
+
+    def test_run_atomic_rollback(self):
+        committed, results = db.batch.run([
+            {"op": "delete", "dataset_id": self.dataset_id},
+            {"op": "add_recordings", "dataset_id": self.dataset_id, "class_name": "Class A",
+             "recordings": [RECORDING_2]},
+        ], self.user_id)
+        self.assertFalse(committed)
+        self.assertFalse(results[1]["success"])
+        self.assertIsNotNone(db.dataset.get(self.dataset_id))
+
+    def test_run_not_atomic(self):
+        committed, results = db.batch.run([
+            {"op": "add_recordings", "dataset_id": self.dataset_id, "class_name": "Class C",
+             "recordings": [RECORDING_2]},
+            {"op": "update", "dataset_id": self.dataset_id, "dataset": dict(self.dataset, name="Renamed")},
+        ], self.user_id, atomic=False)
+        self.assertTrue(committed)
+        self.assertEqual([r["success"] for r in results], [False, True])
+        self.assertEqual(db.dataset.get(self.dataset_id)["name"], "Renamed")
+
+    def test_run_other_user(self):
+        other_id = db.user.create("other")
+        committed, results = db.batch.run([{"op": "delete", "dataset_id": self.dataset_id}], other_id)
+        self.assertFalse(committed)
+        self.assertFalse(results[0]["success"])
+        self.assertIsNotNone(db.dataset.get(self.dataset_id))
+
+    def test_run_grouped(self):
+        other_id = db.dataset.create_from_dict(self.dataset, self.user_id)
+        committed, results = db.batch.run([
+            {"op": "add_recordings", "dataset_id": self.dataset_id, "class_name": "Class B",
+             "recordings": [RECORDING_1, RECORDING_2]},
+            {"op": "add_recordings", "dataset_id": other_id, "class_name": "Class A",
+             "recordings": [RECORDING_1, RECORDING_2]},
+            {"op": "remove_recordings", "dataset_id": self.dataset_id, "class_name": "Class A",
+             "recordings": [RECORDING_1, RECORDING_2]},
+            {"op": "remove_recordings", "dataset_id": other_id, "class_name": "Class A",
+             "recordings": [RECORDING_1]},
+        ], self.user_id)
+        self.assertTrue(committed)
+        self.assertEqual([r["success"] for r in results], [True] * 4)
+        classes = {cls["name"]: cls for cls in db.dataset.get(self.dataset_id)["classes"]}
+        self.assertEqual(classes["Class A"]["recordings"], [])
+        self.assertEqual(sorted(classes["Class B"]["recordings"]), [RECORDING_1, RECORDING_2])
+        self.assertEqual(db.dataset.get(other_id)["classes"][0]["recordings"], [RECORDING_2])
+        self.assertEqual(db.dataset.get_stats(self.dataset_id)["recordings"], 2)
+        self.assertEqual(db.dataset.get_stats(other_id)["recordings"], 1)
+
+    def test_run_grouped_error(self):
+        committed, results = db.batch.run([
+            {"op": "add_recordings", "dataset_id": self.dataset_id, "class_name": "Class B",
+             "recordings": [RECORDING_2]},
+            {"op": "add_recordings", "dataset_id": self.dataset_id, "class_name": "Class C",
+             "recordings": [RECORDING_2]},
+        ], self.user_id)
+        self.assertFalse(committed)
+        self.assertIn("Rolled back", results[0]["error"])
+        self.assertIn("Class C", results[1]["error"])
@@ -0,0 +1,53 @@
+from db import build
+import unittest
+import os
+
+ADMIN_SQL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "admin", "sql")
+
+
+class BuildTestCase(unittest.TestCase):
+
+    def test_split_script(self):
+        statements = build.split_script("""
+            BEGIN;
+            -- Comment; with a semicolon
+            ALTER TABLE a
+              ADD CONSTRAINT a_pkey PRIMARY KEY (id);
+            CREATE INDEX b_ndx ON b (a);
+            COMMIT;
+        """)
+        self.assertEqual(statements, [
+            "ALTER TABLE a ADD CONSTRAINT a_pkey PRIMARY KEY (id)",
+            "CREATE INDEX b_ndx ON b (a)",
+        ])
+
+    def test_plan(self):
+        pkey_a, pkey_b, fkey, index, other = build.plan([
+            'ALTER TABLE "a" ADD CONSTRAINT a_pkey PRIMARY KEY (id)',
+            "ALTER TABLE b ADD CONSTRAINT b_pkey PRIMARY KEY (id)",
+            'ALTER TABLE b ADD CONSTRAINT b_fk_a FOREIGN KEY (a) REFERENCES "a" (id) ON DELETE CASCADE',
+            "CREATE UNIQUE INDEX b_ndx ON b (a)",
+            "CLUSTER b USING b_ndx",
+        ])
+        self.assertEqual((pkey_a.kind, pkey_a.table), ("primary key", '"a"'))
+        self.assertEqual(pkey_a.dependencies, [])
+        self.assertEqual(pkey_b.dependencies, [])
+        self.assertEqual((fkey.kind, fkey.table, fkey.references), ("foreign key", "b", '"a"'))
+        self.assertEqual(fkey.dependencies, [pkey_b, pkey_a])
+        self.assertEqual((index.kind, index.table), ("index", "b"))
+        self.assertEqual(index.dependencies, [pkey_b])
+        self.assertIsNone(other.kind)
+        self.assertEqual(other.dependencies, [pkey_a, pkey_b, fkey, index])
+
+    def test_plan_admin_scripts(self):
+        statements = []
+        for script in ["create_primary_keys.sql", "create_foreign_keys.sql", "create_indexes.sql"]:
+            with open(os.path.join(ADMIN_SQL_DIR, script)) as f:
+                statements.extend(build.split_script(f.read()))
+        steps = build.plan(statements)
+        self.assertTrue(all(step.kind for step in steps))
+        primary_keys = {step.table: step for step in steps if step.kind == "primary key"}
+        self.assertTrue(all(not step.dependencies for step in primary_keys.values()))
+        for step in steps:
+            if step.kind == "foreign key" and step.references in primary_keys:
+                self.assertIn(primary_keys[step.references], step.dependencies)
@@ -1,7 +1,7 @@
 import db
 import db.exceptions
 from db.testing import DatabaseTestCase
-from db import dataset, user
+from db import dataset, user, cache
 from utils import dataset_validator
 from sqlalchemy import text
 import uuid
@@ -127,6 +127,22 @@ class DatasetTestCase(DatabaseTestCase):
         with self.assertRaises(db.exceptions.NoDataFoundException):
             dataset.get(id)
 
+    def test_user_version(self):
+        cache.init([])
+        version = dataset.get_user_version(self.test_user_id)
+        self.assertEqual(dataset.get_user_version(self.test_user_id), version)
+
+        id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
+        self.assertNotEqual(dataset.get_user_version(self.test_user_id), version)
+
+        version = dataset.get_user_version(self.test_user_id)
+        dataset.update(id, copy.deepcopy(self.test_data), author_id=self.test_user_id)
+        self.assertNotEqual(dataset.get_user_version(self.test_user_id), version)
+
+        version = dataset.get_user_version(self.test_user_id)
+        dataset.delete(id)
+        self.assertNotEqual(dataset.get_user_version(self.test_user_id), version)
+
     def test_last_edited(self):
         id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
         ds = dataset.get(id)
@@ -139,3 +155,112 @@ class DatasetTestCase(DatabaseTestCase):
         dataset.update(id, self.test_data, author_id=self.test_user_id)
         ds_updated = dataset.get(id)
         self.assertTrue(ds_updated['last_edited'] > ds['last_edited'])
+
+    def test_add_recordings(self):
+        id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
+        dataset.add_recordings(id, "Class #1", [
+            "19e698e7-71df-48a9-930e-d4b1a2026c82",
+            "fd528ddb-411c-47bc-a383-1f8a222ed213",
+        ])
+        ds = dataset.get(id)
+        self.assertEqual(sorted(ds["classes"][0]["recordings"]), [
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+            "19e698e7-71df-48a9-930e-d4b1a2026c82",
+            "fd528ddb-411c-47bc-a383-1f8a222ed213",
+        ])
+
+        with self.assertRaises(db.exceptions.NoDataFoundException):
+            dataset.add_recordings(id, "Class #3", ["fd528ddb-411c-47bc-a383-1f8a222ed213"])
+        with self.assertRaises(dataset_validator.ValidationException):
+            dataset.add_recordings(id, "Class #1", ["not-an-mbid"])
+
+    def test_remove_recordings(self):
+        id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
+        dataset.remove_recordings(id, "Class #2", [
+            "fd528ddb-411c-47bc-a383-1f8a222ed213",
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+        ])
+        ds = dataset.get(id)
+        self.assertEqual(sorted(ds["classes"][1]["recordings"]), [
+            "96888f9e-c268-4db2-bc13-e29f8b317c20",
+            "ed94c67d-bea8-4741-a3a6-593f20a22eb6",
+        ])
+        self.assertEqual(len(ds["classes"][0]["recordings"]), 2)
+
+    def test_get_fields(self):
+        id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
+
+        ds = dataset.get(id, fields=["name", "public"], class_fields=[])
+        self.assertEqual(ds, {"name": "Test", "public": True})
+
+        ds = dataset.get(id, fields=["id"], class_fields=["name", "count"])
+        self.assertEqual(ds["id"], str(id))
+        self.assertEqual(sorted(ds["classes"], key=lambda cls: cls["name"]), [
+            {"name": "Class #1", "count": 2},
+            {"name": "Class #2", "count": 3},
+        ])
+
+        with self.assertRaises(ValueError):
+            dataset.get(id, class_fields=["size"])
+
+    def test_get_class_recordings(self):
+        id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
+        page = dataset.get_class_recordings(id, "Class #2", limit=2)
+        self.assertEqual(len(page), 2)
+        rest = dataset.get_class_recordings(id, "Class #2", after=page[-1][0], limit=2)
+        self.assertEqual(len(rest), 1)
+        self.assertTrue(page[-1][0] < rest[0][0])
+        self.assertEqual(sorted(mbid for _, mbid in page + rest),
+                         sorted(self.test_data["classes"][1]["recordings"]))
+
+        with self.assertRaises(db.exceptions.NoDataFoundException):
+            dataset.get_class_recordings(id, "Class #3")
+
+    def test_stats(self):
+        id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
+        stats = dataset.get_stats(id)
+        self.assertEqual(stats["classes"], 2)
+        self.assertEqual(stats["recordings"], 5)
+        self.assertEqual(stats["class_sizes"], [
+            {"name": "Class #1", "recordings": 2},
+            {"name": "Class #2", "recordings": 3},
+        ])
+        self.assertAlmostEqual(stats["balance"], 2.0 / 3)
+
+        # Recordings that are already in the class aren't counted again
+        dataset.add_recordings(id, "Class #1", [
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+            "96888f9e-c268-4db2-bc13-e29f8b317c20",
+        ])
+        dataset.remove_recordings(id, "Class #2", [
+            "fd528ddb-411c-47bc-a383-1f8a222ed213",
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+        ])
+        stats = dataset.get_stats(id)
+        self.assertEqual(stats["recordings"], 5)
+        self.assertEqual([cls["recordings"] for cls in stats["class_sizes"]], [3, 2])
+
+        dataset.update(id, dict(self.test_data, classes=[{"name": "Empty", "recordings": []}]),
+                       author_id=self.test_user_id)
+        stats = dataset.get_stats(id)
+        self.assertEqual((stats["classes"], stats["recordings"]), (1, 0))
+        self.assertIsNone(stats["balance"])
+
+        datasets = dataset.get_by_user_id(self.test_user_id)
+        self.assertEqual((datasets[0]["classes"], datasets[0]["recordings"]), (1, 0))
+        self.assertEqual(dataset.check_stats(), [])
+
+    def test_check_stats(self):
+        id = dataset.create_from_dict(self.test_data, author_id=self.test_user_id)
+        with db.engine.begin() as connection:
+            connection.execute("UPDATE dataset_stats SET recordings = 10")
+            connection.execute("DELETE FROM dataset_class_stats WHERE class = "
+                               "(SELECT id FROM dataset_class WHERE name = 'Class #1')")
+
+        wrong = dataset.check_stats()
+        self.assertEqual(len(wrong), 2)
+        self.assertIn((str(id), None, (2, 10), (2, 5)), wrong)
+
+        self.assertEqual(len(dataset.check_stats(fix=True)), 2)
+        self.assertEqual(dataset.check_stats(), [])
+        self.assertEqual(dataset.get_stats(id)["class_sizes"][0]["recordings"], 2)
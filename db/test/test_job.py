@@ -0,0 +1,127 @@
+from db.testing import DatabaseTestCase
+import db.exceptions
+import db.job
+import db.user
+
+
+class JobTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super(JobTestCase, self).setUp()
+        self.user_id = db.user.create("fuzzy_dunlop")
+
+    def test_create(self):
+        job_id = db.job.create("test", {"a": 1}, owner=self.user_id)
+        job = db.job.get(job_id)
+        self.assertEqual(job["id"], job_id)
+        self.assertEqual(job["type"], "test")
+        self.assertEqual(job["status"], db.job.STATUS_PENDING)
+        self.assertEqual(job["owner"], self.user_id)
+        self.assertEqual(job["attempts"], 0)
+
+    def test_get_missing(self):
+        with self.assertRaises(db.exceptions.NoDataFoundException):
+            db.job.get("6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0")
+
+    def test_claim(self):
+        self.assertIsNone(db.job.claim())
+        low = db.job.create("test", {"n": 1})
+        high = db.job.create("test", {"n": 2}, priority=10)
+
+        job = db.job.claim()
+        self.assertEqual(job["id"], high)
+        self.assertEqual(job["payload"], {"n": 2})
+        self.assertEqual(job["attempt"], 1)
+        self.assertEqual(db.job.get(high)["status"], db.job.STATUS_RUNNING)
+        self.assertEqual(db.job.claim()["id"], low)
+        self.assertIsNone(db.job.claim())
+
+    def test_claim_stale(self):
+        job_id = db.job.create("test", {}, max_attempts=2)
+        db.job.claim()
+        self.assertIsNone(db.job.claim())
+        # Worker that runs the job stopped responding
+        job = db.job.claim(stale_after=-1)
+        self.assertEqual(job["id"], job_id)
+        self.assertEqual(job["attempt"], 2)
+        # No attempts left
+        self.assertIsNone(db.job.claim(stale_after=-1))
+        self.assertEqual(db.job.get(job_id)["status"], db.job.STATUS_FAILED)
+
+    def test_finish(self):
+        job_id = db.job.create("test", {})
+        db.job.claim()
+        self.assertFalse(db.job.heartbeat(job_id, 1, 0.5))
+        self.assertEqual(db.job.get(job_id)["progress"], 0.5)
+        db.job.finish(job_id, 1, {"dataset_id": "x"})
+        job = db.job.get(job_id)
+        self.assertEqual(job["status"], db.job.STATUS_DONE)
+        self.assertEqual(job["result"], {"dataset_id": "x"})
+        self.assertEqual(job["progress"], 1)
+        self.assertIsNotNone(job["finished"])
+
+    def test_fail(self):
+        job_id = db.job.create("test", {}, max_attempts=2)
+        db.job.claim()
+        db.job.fail(job_id, 1, "error")
+        job = db.job.get(job_id)
+        self.assertEqual(job["status"], db.job.STATUS_PENDING)
+        self.assertEqual(job["error"], "error")
+        # Retry is delayed
+        self.assertIsNone(db.job.claim())
+
+        with db.engine.connect() as connection:
+            connection.execute("UPDATE job SET run_after = now()")
+        db.job.claim()
+        db.job.fail(job_id, 2, "error")
+        self.assertEqual(db.job.get(job_id)["status"], db.job.STATUS_FAILED)
+
+    def test_fail_permanent(self):
+        job_id = db.job.create("test", {}, max_attempts=3)
+        db.job.claim()
+        db.job.fail(job_id, 1, "invalid", retry=False)
+        self.assertEqual(db.job.get(job_id)["status"], db.job.STATUS_FAILED)
+
+    def test_claimed_again(self):
+        job_id = db.job.create("test", {}, max_attempts=2)
+        db.job.claim()
+        db.job.claim(stale_after=-1)
+        # First worker is still running the job, but its updates are ignored
+        self.assertTrue(db.job.heartbeat(job_id, 1))
+        db.job.finish(job_id, 1, {"attempt": 1})
+        db.job.fail(job_id, 1, "error", retry=False)
+        db.job.mark_cancelled(job_id, 1)
+        self.assertEqual(db.job.get(job_id)["status"], db.job.STATUS_RUNNING)
+        self.assertFalse(db.job.heartbeat(job_id, 2))
+        db.job.finish(job_id, 2, {"attempt": 2})
+        job = db.job.get(job_id)
+        self.assertEqual(job["status"], db.job.STATUS_DONE)
+        self.assertEqual(job["result"], {"attempt": 2})
+
+    def test_save_result(self):
+        job_id = db.job.create("test", {})
+        with db.engine.begin() as connection:
+            self.assertIsNone(db.job.get_result(connection, job_id))
+            db.job.save_result(connection, job_id, {"dataset_id": "x"})
+            self.assertEqual(db.job.get_result(connection, job_id), {"dataset_id": "x"})
+            with self.assertRaises(db.exceptions.ConflictException):
+                db.job.save_result(connection, job_id, {"dataset_id": "y"})
+
+    def test_cancel_pending(self):
+        job_id = db.job.create("test", {})
+        self.assertEqual(db.job.cancel(job_id), db.job.STATUS_CANCELLED)
+        self.assertIsNone(db.job.claim())
+
+    def test_cancel_running(self):
+        job_id = db.job.create("test", {})
+        db.job.claim()
+        self.assertEqual(db.job.cancel(job_id), db.job.STATUS_RUNNING)
+        self.assertTrue(db.job.heartbeat(job_id, 1))
+        db.job.mark_cancelled(job_id, 1)
+        self.assertEqual(db.job.get(job_id)["status"], db.job.STATUS_CANCELLED)
+
+    def test_cancel_finished(self):
+        job_id = db.job.create("test", {})
+        db.job.claim()
+        db.job.finish(job_id, 1)
+        self.assertEqual(db.job.cancel(job_id), db.job.STATUS_DONE)
@@ -0,0 +1,142 @@
+from db.testing import DatabaseTestCase
+from db import migrations
+import db
+import db.dataset
+import db.exceptions
+import db.user
+import mock
+import tempfile
+import shutil
+import os
+
+
+class MigrationsTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super(MigrationsTestCase, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        with db.engine.connect() as connection:
+            connection.execute("DROP TABLE IF EXISTS migration_test")
+        self.addCleanup(self.drop_test_table)
+        self.messages = []
+
+    def drop_test_table(self):
+        with db.engine.connect() as connection:
+            connection.execute("DROP TABLE IF EXISTS migration_test")
+
+    def write_migration(self, filename, content):
+        with open(os.path.join(self.dir, filename), "w") as f:
+            f.write(content)
+
+    def write_migrations(self):
+        self.write_migration("0101_create.sql", """
+            BEGIN;
+            CREATE TABLE migration_test (id INT PRIMARY KEY, value INT, parent INT);
+            INSERT INTO migration_test (id, value) SELECT i, NULL FROM generate_series(1, 250) AS i;
+            COMMIT;
+        """)
+        self.write_migration("0102_backfill.py", '''
+def upgrade(op):
+    op.backfill("migration_test", "id", "UPDATE migration_test SET value = id * 2 "
+                "WHERE id >= :start AND id < :end", batch_size=100, pause=0)
+    op.create_index("value_ndx_migration_test", "migration_test", "value", unique=True)
+    op.add_constraint("migration_test", "migration_test_fk_parent",
+                      "FOREIGN KEY (parent) REFERENCES migration_test (id)")
+''')
+        self.write_migration("README", "Not a migration")
+
+    def migrate(self, **kwargs):
+        return migrations.migrate(report=self.messages.append,
+                                  migrations=migrations.find_migrations(self.dir), **kwargs)
+
+    def test_find_migrations(self):
+        self.write_migrations()
+        found = migrations.find_migrations(self.dir)
+        self.assertEqual([(m.version, m.name) for m in found], [(101, "create"), (102, "backfill")])
+
+        self.write_migration("0102_duplicate.sql", "")
+        with self.assertRaises(db.exceptions.DatabaseException):
+            migrations.find_migrations(self.dir)
+
+    def test_migrate(self):
+        self.write_migrations()
+        with self.assertRaises(db.exceptions.DatabaseException):
+            self.migrate(target=102)
+
+        migrations.stamp(100)
+        self.migrate(target=101)
+        self.assertEqual(migrations.get_version(), 101)
+
+        applied = self.migrate(target=102)
+        self.assertEqual([m.version for m in applied], [102])
+        self.assertEqual(migrations.get_version(), 102)
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(
+                "SELECT count(*) FROM migration_test WHERE value = id * 2").fetchone()[0], 250)
+            self.assertEqual(connection.execute(
+                "SELECT count(*) FROM pg_indexes WHERE indexname = 'value_ndx_migration_test'").fetchone()[0], 1)
+            self.assertEqual(connection.execute(
+                "SELECT convalidated FROM pg_constraint "
+                "WHERE conname = 'migration_test_fk_parent'").fetchone()[0], True)
+
+        self.assertEqual(self.migrate(target=102), [])
+
+    def test_dry_run(self):
+        self.write_migrations()
+        migrations.stamp(100)
+        self.migrate(target=101)
+        self.migrate(target=102, dry_run=True)
+        self.assertEqual(migrations.get_version(), 101)
+        self.assertTrue(any("CREATE UNIQUE INDEX CONCURRENTLY" in m for m in self.messages))
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(
+                "SELECT count(*) FROM migration_test WHERE value IS NOT NULL").fetchone()[0], 0)
+
+    def test_recording_migration_again(self):
+        user_id = db.user.create("tester")
+        dataset_id = db.dataset.create_from_dict({
+            "name": "Test",
+            "description": "",
+            "classes": [{
+                "name": "Class",
+                "description": "",
+                "recordings": [
+                    "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+                    "19e698e7-71df-48a9-930e-d4b1a2026c82",
+                ],
+            }],
+            "public": True,
+        }, user_id)
+        # Go back to the schema before 0006
+        with db.engine.begin() as connection:
+            connection.execute("ALTER TABLE dataset_class_member ADD COLUMN mbid UUID")
+            connection.execute("""
+                UPDATE dataset_class_member
+                   SET mbid = recording.mbid
+                  FROM recording
+                 WHERE recording.id = dataset_class_member.recording
+            """)
+            connection.execute("ALTER TABLE dataset_class_member DROP COLUMN recording CASCADE")
+            connection.execute("ALTER TABLE dataset_class_member ADD PRIMARY KEY (class, mbid)")
+        migrations.stamp(5)
+        recording = [m for m in migrations.find_migrations() if m.version == 6]
+
+        # Fail at the last step, after mbid has been dropped
+        with mock.patch.object(migrations.Operations, "add_constraint",
+                               side_effect=db.exceptions.DatabaseException):
+            with self.assertRaises(db.exceptions.DatabaseException):
+                migrations.migrate(target=6, report=self.messages.append, migrations=recording)
+        self.assertEqual(migrations.get_version(), 5)
+
+        applied = migrations.migrate(target=6, report=self.messages.append, migrations=recording)
+        self.assertEqual([m.version for m in applied], [6])
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(
+                "SELECT convalidated FROM pg_constraint "
+                "WHERE conname = 'class_member_fk_recording'").fetchone()[0], True)
+            self.assertEqual(connection.execute(
+                "SELECT count(*) FROM pg_trigger "
+                "WHERE tgname = 'dataset_class_member_sync_recording'").fetchone()[0], 0)
+        db.dataset.add_recordings(dataset_id, "Class", ["fd528ddb-411c-47bc-a383-1f8a222ed213"])
+        self.assertEqual(len(db.dataset.get(dataset_id)["classes"][0]["recordings"]), 3)
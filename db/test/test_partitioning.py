@@ -0,0 +1,57 @@
+from db.testing import DatabaseTestCase
+from db import dataset, user, partitioning
+import db
+import unittest
+
+
+class PartitioningTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super(PartitioningTestCase, self).setUp()
+        with db.engine.connect() as connection:
+            version = connection.execute("SHOW server_version_num").fetchone()[0]
+            if int(version) < partitioning.MIN_SERVER_VERSION:
+                raise unittest.SkipTest("Partitioning requires PostgreSQL 11")
+            if partitioning.is_partitioned(connection):
+                raise unittest.SkipTest("Test database is already partitioned")
+        self.user_id = user.create("tester")
+
+    def create_dataset(self, recordings):
+        return dataset.create_from_dict({
+            "name": "Test",
+            "classes": [
+                {"name": "Class #1", "recordings": recordings[:1]},
+                {"name": "Class #2", "recordings": recordings[1:]},
+            ],
+            "public": True,
+        }, author_id=self.user_id)
+
+    def test_migrate(self):
+        first_id = self.create_dataset([
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+            "19e698e7-71df-48a9-930e-d4b1a2026c82",
+        ])
+        second_id = self.create_dataset([
+            "fd528ddb-411c-47bc-a383-1f8a222ed213",
+            "96888f9e-c268-4db2-bc13-e29f8b317c20",
+            "ed94c67d-bea8-4741-a3a6-593f20a22eb6",
+        ])
+
+        counts = list(partitioning.migrate(partitions=4, batch_size=1))
+        self.assertEqual(sum(counts), 5)
+        with db.engine.connect() as connection:
+            self.assertTrue(partitioning.is_partitioned(connection))
+
+        ds = dataset.get(second_id)
+        self.assertEqual(sorted(len(c["recordings"]) for c in ds["classes"]), [1, 2])
+
+        # Changes are made in the partitioned table
+        dataset.delete(first_id)
+        third_id = self.create_dataset([
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+            "19e698e7-71df-48a9-930e-d4b1a2026c82",
+        ])
+        self.assertEqual(len(dataset.get(third_id)["classes"]), 2)
+        with db.engine.connect() as connection:
+            count = connection.execute("SELECT count(*) FROM dataset_class_member").fetchone()[0]
+        self.assertEqual(count, 5)
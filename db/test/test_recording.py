@@ -0,0 +1,22 @@
+from db.testing import DatabaseTestCase
+import db
+import db.recording
+
+
+class RecordingTestCase(DatabaseTestCase):
+
+    def test_get_ids(self):
+        mbid_1 = "0dad432b-16cc-4bf0-8961-fd31d124b01b"
+        mbid_2 = "19e698e7-71df-48a9-930e-d4b1a2026c82"
+        with db.engine.begin() as connection:
+            ids = db.recording.get_ids(connection, [mbid_1])
+            self.assertEqual(list(ids.keys()), [mbid_1])
+
+            # Existing recordings are reused
+            more_ids = db.recording.get_ids(connection, [mbid_1, mbid_2.upper()])
+            self.assertEqual(more_ids[mbid_1], ids[mbid_1])
+            self.assertNotEqual(more_ids[mbid_2.upper()], ids[mbid_1])
+
+            self.assertEqual(db.recording.get_ids(connection, []), {})
+            count = connection.execute("SELECT count(*) FROM recording").fetchone()[0]
+            self.assertEqual(count, 2)
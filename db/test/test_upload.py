@@ -0,0 +1,94 @@
+from db.testing import DatabaseTestCase
+from utils import dataset_validator
+from db import cache
+import db.dataset
+import db.exceptions
+import db.upload
+import db.user
+
+RECORDING_1 = "0dad432b-16cc-4bf0-8961-fd31d124b01b"
+RECORDING_2 = "19e698e7-71df-48a9-930e-d4b1a2026c82"
+RECORDING_3 = "1d6e4d70-1ed4-4c4f-9e5d-f0f1b1a3e4a1"
+
+
+class UploadTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super(UploadTestCase, self).setUp()
+        cache.init([])
+        self.user_id = db.user.create("fuzzy_dunlop")
+        self.dataset = {
+            "name": "Test",
+            "description": "Uploaded in chunks",
+            "public": True,
+            "classes": [
+                {"name": "Class A", "description": "First"},
+                {"name": "Class B", "recordings": [RECORDING_3]},
+            ],
+        }
+
+    def test_create(self):
+        session_id = db.upload.create(self.user_id, self.dataset)
+        session = db.upload.get(session_id)
+        self.assertEqual(session["owner"], self.user_id)
+        self.assertEqual(session["dataset"]["name"], "Test")
+        self.assertEqual(session["chunks"], [])
+        self.assertEqual(session["recordings"], 0)
+        self.assertIsNone(session["dataset_id"])
+
+    def test_create_duplicate_classes(self):
+        self.dataset["classes"][1]["name"] = "Class A"
+        with self.assertRaises(dataset_validator.ValidationException):
+            db.upload.create(self.user_id, self.dataset)
+
+    def test_add_chunk(self):
+        session_id = db.upload.create(self.user_id, self.dataset)
+        chunk = {"classes": [{"name": "Class A", "recordings": [RECORDING_1, RECORDING_2]}]}
+        self.assertTrue(db.upload.add_chunk(session_id, 1, chunk))
+        # Retried chunk is ignored
+        self.assertFalse(db.upload.add_chunk(session_id, 1, chunk))
+        self.assertTrue(db.upload.add_chunk(session_id, 0, {"classes": [{"name": "Class B", "recordings": []}]}))
+        session = db.upload.get(session_id)
+        self.assertEqual(session["chunks"], [0, 1])
+        self.assertEqual(session["recordings"], 2)
+
+    def test_add_chunk_unknown_class(self):
+        session_id = db.upload.create(self.user_id, self.dataset)
+        with self.assertRaises(dataset_validator.ValidationException):
+            db.upload.add_chunk(session_id, 0, {"classes": [{"name": "Class C", "recordings": [RECORDING_1]}]})
+
+    def test_commit(self):
+        session_id = db.upload.create(self.user_id, self.dataset)
+        db.upload.add_chunk(session_id, 0, {"classes": [
+            {"name": "Class A", "recordings": [RECORDING_1, RECORDING_2]},
+            {"name": "Class B", "recordings": [RECORDING_2, RECORDING_3]},
+        ]})
+        db.upload.add_chunk(session_id, 1, {"classes": [{"name": "Class A", "recordings": [RECORDING_1]}]})
+        dataset_id = db.upload.commit(session_id)
+
+        dataset = db.dataset.get(dataset_id)
+        self.assertEqual(dataset["name"], "Test")
+        self.assertEqual(dataset["author"], self.user_id)
+        classes = {cls["name"]: cls for cls in dataset["classes"]}
+        self.assertEqual(classes["Class A"]["description"], "First")
+        self.assertEqual(sorted(classes["Class A"]["recordings"]), [RECORDING_1, RECORDING_2])
+        self.assertEqual(sorted(classes["Class B"]["recordings"]), [RECORDING_2, RECORDING_3])
+        stats = db.dataset.get_stats(dataset_id)
+        self.assertEqual(stats["recordings"], 4)
+        self.assertEqual([cls["recordings"] for cls in stats["class_sizes"]], [2, 2])
+
+        # Commit can be retried
+        self.assertEqual(db.upload.commit(session_id), dataset_id)
+        with self.assertRaises(db.exceptions.BadDataException):
+            db.upload.add_chunk(session_id, 2, {"classes": []})
+
+    def test_delete_abandoned(self):
+        session_id = db.upload.create(self.user_id, self.dataset)
+        db.upload.add_chunk(session_id, 0, {"classes": [{"name": "Class A", "recordings": [RECORDING_1]}]})
+        self.assertEqual(db.upload.delete_abandoned(60), 0)
+        self.assertEqual(db.upload.delete_abandoned(-1), 1)
+        with self.assertRaises(db.exceptions.NoDataFoundException):
+            db.upload.get(session_id)
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute("SELECT count(*) FROM upload_staging").fetchone()[0], 0)
+            self.assertEqual(connection.execute("SELECT count(*) FROM upload_chunk").fetchone()[0], 0)
@@ -110,3 +110,20 @@ class UserTestCase(DatabaseTestCase):
         self.assertFalse(user["admin"])
         db.user.set_admin(user["musicbrainz_id"], admin=True, force=True)
         self.assertTrue(db.user.get(user["id"])["admin"])
+
+    def test_get_version(self):
+        user_id = db.user.create("fuzzy_dunlop")
+        self.assertEqual(db.user.get_version(user_id), 1)
+        self.assertEqual(db.user.get(user_id)["version"], 1)
+
+        db.user.set_admin("fuzzy_dunlop", admin=True)
+        self.assertEqual(db.user.get_version(user_id), 2)
+        self.assertEqual(db.user.get(user_id)["version"], 2)
+
+        self.assertIsNone(db.user.get_version(user_id + 1))
+
+    def test_get_or_create_case_insensitive(self):
+        user_id = db.user.create("Fuzzy_Dunlop")
+        user = db.user.get_or_create("fuzzy_dunlop")
+        self.assertEqual(user["id"], user_id)
+        self.assertEqual(user["musicbrainz_id"], "Fuzzy_Dunlop")
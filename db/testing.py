@@ -1,4 +1,5 @@
 import db
+import db.partitioning
 import unittest
 import json
 import os
@@ -30,6 +31,9 @@ class DatabaseTestCase(unittest.TestCase):
     def init_db(self):
         db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_types.sql'))
         db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_tables.sql'))
+        partitions = getattr(config, 'DATASET_CLASS_MEMBER_PARTITIONS', 0)
+        if partitions:
+            db.partitioning.replace_table(partitions)
         db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_primary_keys.sql'))
         db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_foreign_keys.sql'))
         db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_indexes.sql'))
@@ -38,14 +42,26 @@ class DatabaseTestCase(unittest.TestCase):
         with db.engine.connect() as connection:
             # TODO(roman): See if there's a better way to drop all tables.
             connection.execute('DROP TABLE IF EXISTS dataset_class_member CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS dataset_class_member_old CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS dataset_class_member_partitioned CASCADE;')
             connection.execute('DROP TABLE IF EXISTS dataset_class        CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS recording            CASCADE;')
             connection.execute('DROP TABLE IF EXISTS dataset              CASCADE;')
             connection.execute('DROP TABLE IF EXISTS "user"               CASCADE;')
             connection.execute('DROP TABLE IF EXISTS api_key              CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS api_key_usage        CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS schema_version       CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS job                  CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS upload_session       CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS upload_chunk         CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS upload_staging       CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS dataset_stats        CASCADE;')
+            connection.execute('DROP TABLE IF EXISTS dataset_class_stats  CASCADE;')
 
     def drop_types(self):
         with db.engine.connect() as connection:
             connection.execute('DROP TYPE IF EXISTS gid_type CASCADE;')
+            connection.execute('DROP TYPE IF EXISTS job_status CASCADE;')
 
     def data_filename(self, mbid):
         """ Get the expected filename of a test datafile given its mbid """
@@ -0,0 +1,220 @@
+"""
+Resumable uploads of datasets.
+
+Large datasets can be uploaded in parts, so that a failed request only needs
+to send one part again. A client opens an upload session with the dataset
+without recordings, sends recordings of its classes in numbered chunks and
+commits the session, which creates the dataset.
+
+Chunks are identified by their sequence numbers and can be sent in any order.
+A chunk that has already been received is ignored, so retries are safe.
+Recordings of chunks are staged in an unlogged table with a single statement
+per chunk, and are merged into the dataset with a few set-based statements
+on commit. Sessions that haven't been used for a while are removed by
+`delete_abandoned`.
+"""
+import db
+import db.dataset
+import db.exceptions
+import json
+import sqlalchemy
+from utils import dataset_validator
+
+
+def create(owner, dataset):
+    """Open an upload session for a new dataset.
+
+    Args:
+        owner: ID of the user who uploads the dataset.
+        dataset: Dataset in the format accepted by `db.dataset.create_from_dict`.
+            Recordings of classes are optional, the rest is sent in chunks.
+            Names of classes must be unique.
+
+    Returns:
+        ID (UUID) of the new session.
+    """
+    if isinstance(dataset, dict) and isinstance(dataset.get("classes"), list):
+        for cls in dataset["classes"]:
+            if isinstance(cls, dict):
+                cls.setdefault("recordings", [])
+    dataset_validator.validate(dataset)
+    names = [cls["name"] for cls in dataset["classes"]]
+    if len(set(names)) != len(names):
+        raise dataset_validator.ValidationException("Names of classes must be unique.")
+
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            INSERT INTO upload_session (id, owner, dataset)
+                 VALUES (uuid_generate_v4(), :owner, :dataset)
+              RETURNING id::text
+        """), {"owner": owner, "dataset": json.dumps(dataset)})
+        return result.fetchone()["id"]
+
+
+def get(session_id):
+    """Get an upload session.
+
+    Returns:
+        Dictionary with details of the session, including sequence numbers of
+        received chunks ("chunks") and the number of received recordings
+        ("recordings").
+    """
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            SELECT id::text, owner, dataset, dataset_id::text, created, last_activity
+              FROM upload_session
+             WHERE id = :session_id
+        """), {"session_id": str(session_id)})
+        row = result.fetchone()
+        if not row:
+            raise db.exceptions.NoDataFoundException("Can't find upload session with a specified ID.")
+        session = dict(row)
+        result = connection.execute(sqlalchemy.text("""
+            SELECT seq, size
+              FROM upload_chunk
+             WHERE session = :session_id
+          ORDER BY seq
+        """), {"session_id": str(session_id)})
+        chunks = result.fetchall()
+        session["chunks"] = [chunk["seq"] for chunk in chunks]
+        session["recordings"] = sum(chunk["size"] for chunk in chunks)
+        return session
+
+
+def add_chunk(session_id, seq, chunk):
+    """Add a chunk of recordings to an upload session.
+
+    Args:
+        session_id: ID of the session.
+        seq: Sequence number of the chunk.
+        chunk: Dictionary with recordings of classes (see
+            `dataset_validator.validate_chunk`).
+
+    Returns:
+        True if the chunk has been added, False if it had been received
+        before.
+    """
+    with db.engine.begin() as connection:
+        # Also locks the session until the chunk is stored, so that it can't
+        # be committed in the meantime
+        result = connection.execute(sqlalchemy.text("""
+            UPDATE upload_session
+               SET last_activity = now()
+             WHERE id = :session_id
+         RETURNING dataset, dataset_id
+        """), {"session_id": str(session_id)})
+        session = result.fetchone()
+        if not session:
+            raise db.exceptions.NoDataFoundException("Can't find upload session with a specified ID.")
+        if session["dataset_id"] is not None:
+            raise db.exceptions.BadDataException("Upload session has already been committed.")
+        dataset_validator.validate_chunk(chunk, [cls["name"] for cls in session["dataset"]["classes"]])
+
+        class_names, recordings = [], []
+        for cls in chunk["classes"]:
+            class_names.extend([cls["name"]] * len(cls["recordings"]))
+            recordings.extend(cls["recordings"])
+        result = connection.execute(sqlalchemy.text("""
+            INSERT INTO upload_chunk (session, seq, size)
+                 VALUES (:session_id, :seq, :size)
+            ON CONFLICT DO NOTHING
+              RETURNING seq
+        """), {"session_id": str(session_id), "seq": seq, "size": len(recordings)})
+        if result.fetchone() is None:
+            return False
+        if recordings:
+            connection.execute(sqlalchemy.text("""
+                INSERT INTO upload_staging (session, class_name, recording)
+                     SELECT :session_id, unnest(CAST(:class_names AS VARCHAR[])), unnest(CAST(:recordings AS UUID[]))
+            """), {"session_id": str(session_id), "class_names": class_names, "recordings": recordings})
+        return True
+
+
+def commit(session_id):
+    """Create the dataset from an upload session.
+
+    Committing a session again returns the same dataset.
+
+    Returns:
+        ID of the dataset.
+    """
+    with db.engine.begin() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            SELECT owner, dataset, dataset_id::text
+              FROM upload_session
+             WHERE id = :session_id
+               FOR UPDATE
+        """), {"session_id": str(session_id)})
+        session = result.fetchone()
+        if not session:
+            raise db.exceptions.NoDataFoundException("Can't find upload session with a specified ID.")
+        if session["dataset_id"] is not None:
+            return session["dataset_id"]
+
+        dataset_id = db.dataset.insert_dataset(connection, session["dataset"], session["owner"])
+        db.dataset.add_classes(connection, dataset_id, session["dataset"]["classes"])
+        params = {"session_id": str(session_id), "dataset_id": dataset_id}
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO recording (mbid)
+                 SELECT DISTINCT recording
+                   FROM upload_staging
+                  WHERE session = :session_id
+            ON CONFLICT (mbid) DO NOTHING
+        """), params)
+        result = connection.execute(sqlalchemy.text("""
+            WITH member AS (
+                INSERT INTO dataset_class_member (class, recording)
+                     SELECT DISTINCT dataset_class.id, recording.id
+                       FROM upload_staging
+                       JOIN dataset_class
+                         ON dataset_class.dataset = :dataset_id
+                        AND dataset_class.name = upload_staging.class_name
+                       JOIN recording
+                         ON recording.mbid = upload_staging.recording
+                      WHERE upload_staging.session = :session_id
+                ON CONFLICT DO NOTHING
+                  RETURNING class
+            )
+              SELECT class, count(*)
+                FROM member
+            GROUP BY class
+        """), params)
+        db.dataset.update_class_stats(connection, {row["class"]: row["count"] for row in result})
+        connection.execute(sqlalchemy.text("DELETE FROM upload_staging WHERE session = :session_id"), params)
+        connection.execute(sqlalchemy.text("DELETE FROM upload_chunk WHERE session = :session_id"), params)
+        connection.execute(sqlalchemy.text("""
+            UPDATE upload_session
+               SET dataset_id = :dataset_id
+                 , last_activity = now()
+             WHERE id = :session_id
+        """), params)
+
+    db.dataset.bump_user_version(session["owner"])
+    return str(dataset_id)
+
+
+def delete_abandoned(max_age):
+    """Delete upload sessions that haven't been used for a while, with their
+    chunks.
+
+    Args:
+        max_age: Time (in seconds) since the last activity in a session after
+            which it's deleted. Committed sessions are kept for the same time,
+            so that commits can be retried.
+
+    Returns:
+        Number of deleted sessions.
+    """
+    with db.engine.begin() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            DELETE FROM upload_session
+                  WHERE last_activity < now() - make_interval(secs => :max_age)
+        """), {"max_age": max_age})
+        deleted = result.rowcount
+        # Also removes chunks of sessions that were deleted with their owners
+        for table in ["upload_staging", "upload_chunk"]:
+            connection.execute("""
+                DELETE FROM %s
+                      WHERE NOT EXISTS (SELECT 1 FROM upload_session WHERE id = %s.session)
+            """ % (table, table))
+    return deleted
@@ -1,10 +1,14 @@
 import db
+import db.cache
 import db.exceptions
 import sqlalchemy
 
-USER_COLUMNS = ["id", "created", "musicbrainz_id", "admin"]
+USER_COLUMNS = ["id", "created", "musicbrainz_id", "admin", "version"]
 ALL_USER_COLUMNS = ", ".join(['"user".%s' % c for c in USER_COLUMNS])
 
+VERSION_CACHE_KEY = "user_version"
+VERSION_CACHE_TIME = 24 * 60 * 60  # seconds
+
 
 def create(musicbrainz_id):
     with db.engine.connect() as connection:
@@ -28,6 +32,33 @@ def get(id):
         return dict(row) if row else None
 
 
+def get_version(id):
+    """Get current version of user's data.
+
+    Version is incremented every time user's data changes, so it can be used
+    to check if a copy of user's data is up to date without loading all of it.
+    Versions are cached; database is queried only on cache misses.
+
+    Returns:
+        Version (integer), or None if user doesn't exist.
+    """
+    key = db.cache.gen_key(VERSION_CACHE_KEY, id)
+    version = db.cache.get(key)
+    if version is not None:
+        return version
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            SELECT version
+              FROM "user"
+             WHERE id = :id
+        """), {"id": id})
+        row = result.fetchone()
+    if not row:
+        return None
+    _cache_version(id, row["version"])
+    return row["version"]
+
+
 def get_by_api_key(apikey):
     """Get the user with the specified active API key.
        If the API key doesn't exist, or if it is inactive,
@@ -62,12 +93,30 @@ def get_by_mb_id(musicbrainz_id):
 def get_or_create(musicbrainz_id):
     """Return a user row for the given username, creating it
     if it does not exist.
+
+    Existing and new users are returned by the same statement, so in most
+    cases this takes a single query.
     """
-    user = get_by_mb_id(musicbrainz_id)
-    if not user:
-        create(musicbrainz_id)
-        user = get_by_mb_id(musicbrainz_id)
-    return user
+    with db.engine.connect() as connection:
+        result = connection.execute(sqlalchemy.text("""
+            WITH new_user AS (
+                INSERT INTO "user" (musicbrainz_id)
+                     VALUES (:musicbrainz_id)
+                ON CONFLICT (LOWER(musicbrainz_id)) DO NOTHING
+                  RETURNING %s
+            )
+            SELECT * FROM new_user
+             UNION ALL
+            SELECT %s
+              FROM "user"
+             WHERE LOWER(musicbrainz_id) = LOWER(:musicbrainz_id)
+        """ % (ALL_USER_COLUMNS, ALL_USER_COLUMNS)), {"musicbrainz_id": musicbrainz_id})
+        row = result.fetchone()
+    if row:
+        return dict(row)
+    # User has been created by a concurrent transaction after this statement
+    # started, so it wasn't visible to it.
+    return get_by_mb_id(musicbrainz_id)
 
 
 def get_admins():
@@ -98,11 +147,23 @@ def set_admin(musicbrainz_id, admin, force=False):
                 "doesn't exist." % musicbrainz_id
             )
     with db.engine.connect() as connection:
-        connection.execute(sqlalchemy.text("""
+        result = connection.execute(sqlalchemy.text("""
             UPDATE "user"
                SET admin = :admin
+                 , version = version + 1
              WHERE LOWER(musicbrainz_id) = LOWER(:musicbrainz_id)
+         RETURNING id, version
         """), {
             "musicbrainz_id": musicbrainz_id,
             "admin": admin,
         })
+        row = result.fetchone()
+    _cache_version(row["id"], row["version"])
+
+
+def _cache_version(id, version):
+    """Store new version of user's data in cache.
+
+    Must be called after every change to user's data.
+    """
+    db.cache.set(db.cache.gen_key(VERSION_CACHE_KEY, id), version, time=VERSION_CACHE_TIME)
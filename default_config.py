@@ -19,6 +19,12 @@ PG_SUPER_USER = "postgres"
 # The port that postgres is running on
 PG_PORT = "5432"
 
+# Number of hash partitions of the table with members of dataset classes, or 0
+# to keep it in a single table. Only worth it with hundreds of millions of
+# members. Used when the database is created; existing databases can be
+# migrated with `manage.py partition_class_members`. Requires PostgreSQL 11.
+DATASET_CLASS_MEMBER_PARTITIONS = 0
+
 # MUSICBRAINZ
 
 MUSICBRAINZ_USERAGENT = "acousticbrainz-server"
@@ -27,20 +33,177 @@ MUSICBRAINZ_HOSTNAME = None
 # OAuth
 MUSICBRAINZ_CLIENT_ID = "CHANGE_ME"
 MUSICBRAINZ_CLIENT_SECRET = "CHANGE_ME"
+MUSICBRAINZ_OAUTH_URL = "https://musicbrainz.org/"
+# Timeout (in seconds) for requests to the OAuth provider
+MUSICBRAINZ_OAUTH_TIMEOUT = 10
+# Maximum number of connections to the OAuth provider kept open in each process
+MUSICBRAINZ_OAUTH_POOL_SIZE = 10
+
+# Maximum age (in seconds) of a snapshot of user's data stored in the session.
+# Snapshots are also refreshed whenever user's data changes.
+USER_SNAPSHOT_TTL = 5 * 60
 
 # CACHE
 
 MEMCACHED_SERVERS = ["127.0.0.1:11211"]
 MEMCACHED_NAMESPACE = "AB"
+# Expiration time of cached template fragments (seconds). Fragments are
+# replaced whenever their content changes, so this only limits how long
+# unused ones are kept.
+FRAGMENT_CACHE_TIME = 24 * 60 * 60
+
+# API KEYS
+
+# Usage of API keys is accumulated in memory and written into the database
+# after this many seconds or after this many requests, whichever comes first.
+API_KEY_USAGE_FLUSH_INTERVAL = 60
+API_KEY_USAGE_FLUSH_THRESHOLD = 1000
+
+# RATE LIMITING
+
+RATELIMIT_ENABLED = True
+# "local" keeps limits in memory of each process, "memcached" shares them
+# between all processes using servers from MEMCACHED_SERVERS.
+RATELIMIT_BACKEND = "local"
+# Limits are (rate, per) tuples that allow `rate` requests per `per` seconds.
+RATELIMIT_DEFAULT = (100, 60)
+# Overrides for specific endpoints, for example:
+# {"api_v1_datasets.create_dataset": (10, 60)}
+RATELIMIT_ENDPOINTS = {}
+# Overrides for specific API keys. These take precedence over all other limits.
+RATELIMIT_KEYS = {}
+
+# API
+
+# Encoder used to serialize API responses: "auto" picks the fastest one that
+# is installed, see webserver/serialization.py for other options.
+JSON_ENCODER = "auto"
+# Maximum number of operations in one request to /api/v1/batch.
+BATCH_MAX_OPERATIONS = 100
+# Default and maximum number of recordings on a page of a class.
+DATASET_RECORDINGS_PAGE_SIZE = 1000
+DATASET_RECORDINGS_PAGE_MAX = 10000
+
+# JOBS
+
+# Datasets with at least this many recordings are created in the background by
+# `manage.py worker`. The API responds with 202 Accepted and ID of the job,
+# which can be followed at /api/v1/jobs/<id>.
+JOB_ASYNC_RECORDINGS = 100000
+# Number of times a background job is tried before it fails.
+JOB_MAX_ATTEMPTS = 3
+
+# UPLOADS
+
+# Maximum number of recordings in one chunk of a dataset upload.
+UPLOAD_CHUNK_MAX_RECORDINGS = 100000
+# Upload sessions are deleted by `manage.py delete_abandoned_uploads` after
+# this many seconds without activity.
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+
+# METRICS
+
+METRICS_ENABLED = True
+# Directory where worker processes share their metrics, so that /metrics
+# reports totals for the whole server. `manage.py serve` uses a temporary
+# directory if this is not set.
+METRICS_DIR = None
+# How often (in seconds) each worker writes its metrics into METRICS_DIR.
+METRICS_FLUSH_INTERVAL = 5
+# Token that clients must send in the `Authorization: Bearer <token>` header to
+# read /metrics. If it's not set, /metrics is available to everyone and should
+# be protected on the reverse proxy.
+METRICS_TOKEN = None
+
+# PROFILING
+
+# Allows profiling of individual requests, see webserver/profiling.py.
+PROFILING_ENABLED = True
+# Fraction of all requests that are profiled with the sampling profiler
+# (for example 0.001). 0 disables random profiling.
+PROFILING_SAMPLE_RATE = 0
+# Number of seconds between stack samples taken by the sampling profiler.
+PROFILING_SAMPLING_INTERVAL = 0.005
+# Number of seconds for which tokens generated with `manage.py profile_token`
+# are valid.
+PROFILING_TOKEN_MAX_AGE = 24 * 60 * 60
+# Number of newest profiles kept in FILE_STORAGE_DIR.
+PROFILING_MAX_PROFILES = 1000
+
+# MEMORY TRACKING
+
+# Fraction of requests for which memory allocations are tracked with
+# tracemalloc (Python 3.4+), see webserver/memory.py. 0 disables tracking.
+MEMORY_TRACKING_SAMPLE_RATE = 0
+# Number of frames stored for each allocation. More frames make tracing slower.
+MEMORY_TRACKING_FRAMES = 1
+# Requests that allocate more than this many bytes at peak are logged together
+# with MEMORY_TRACKING_TOP_SITES lines that allocated the most.
+MEMORY_TRACKING_LOG_THRESHOLD = 50 * 1024 * 1024
+MEMORY_TRACKING_TOP_SITES = 10
+# Number of snapshots kept in memory of each process.
+MEMORY_TRACKING_MAX_SNAPSHOTS = 20
+
+# SLOW QUERIES
+
+# Queries that take longer than this many seconds are logged, see
+# webserver/slow_queries.py. None disables the log.
+SLOW_QUERY_THRESHOLD = 0.5
+# Number of latest slow queries kept in memory of each process.
+SLOW_QUERY_BUFFER_SIZE = 100
+# Fraction of slow SELECT queries that are run again with EXPLAIN ANALYZE to
+# capture their plan. 0 disables this.
+SLOW_QUERY_EXPLAIN_RATE = 0
+# Maximum time (in seconds) for EXPLAIN ANALYZE of one query.
+SLOW_QUERY_EXPLAIN_TIMEOUT = 30
+
+# COMPRESSION
+
+COMPRESSION_ENABLED = True
+# Encodings in order of preference. "br" and "zstd" are used only if `brotli`
+# and `zstandard` packages are installed.
+COMPRESSION_ENCODINGS = ["br", "zstd", "gzip"]
+# Compression levels. Higher levels produce smaller responses, but take more
+# CPU time.
+COMPRESSION_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+COMPRESSION_MIMETYPES = [
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/css",
+    "text/html",
+    "text/plain",
+]
+# Responses smaller than this (in bytes) are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+# Compressed responses larger than this (in bytes) are not stored in the cache
+COMPRESSION_CACHE_MAX_SIZE = 1024 * 1024
+
+# STATIC FILES
+
+# Let the front-end web server send static files (X-Sendfile header). It must
+# be configured to support it.
+USE_X_SENDFILE = False
+# Encodings of precompressed copies created by `manage.py compress_static`.
+# "br" requires the `brotli` package.
+STATIC_PRECOMPRESSED_ENCODINGS = ["gzip", "br"]
 
 # LOGGING
 
+# Log records are handled in background threads. This is the maximum number
+# of records waiting to be handled, new ones are dropped when it's reached.
+LOG_QUEUE_SIZE = 10000
+
+# Records are written as JSON objects, one per line.
 LOG_FILE_ENABLED = False
 LOG_FILE = "./acousticbrainz.log"
 
 LOG_EMAIL_ENABLED = False
 LOG_EMAIL_TOPIC = "AcousticBrainz Webserver Failure"
 LOG_EMAIL_RECIPIENTS = []  # List of email addresses (strings)
+# The same message is sent at most once in this many seconds.
+LOG_EMAIL_DEDUPLICATION_INTERVAL = 60 * 60
+LOG_EMAIL_MAX_PER_HOUR = 10
 
 LOG_SENTRY_ENABLED = False
 SENTRY_DSN = ""
@@ -1,12 +1,14 @@
 from __future__ import print_function
 import db
 import db.user
+import db.api_key
 import db.exceptions
-from webserver import create_app
 import subprocess
+import multiprocessing
 import os
 import click
 import config
+import default_config
 
 ADMIN_SQL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'admin', 'sql')
 
@@ -20,27 +22,67 @@ cli = click.Group()
               help="Turns debugging mode on or off. If specified, overrides "
                    "'DEBUG' value in the config file.")
 def runserver(host, port, debug):
-    create_app().run(host=host, port=port, debug=debug,
-                     extra_files=config.RELOAD_ON_FILES)
+    from webserver import create_app
+    app = create_app()
+    _check_schema_version()
+    app.run(host=host, port=port, debug=debug, extra_files=config.RELOAD_ON_FILES)
+
+
+@cli.command()
+@click.option("--host", "-h", default="0.0.0.0", show_default=True)
+@click.option("--port", "-p", default=8080, show_default=True)
+@click.option("--workers", "-w", default=multiprocessing.cpu_count(), show_default=True,
+              help="Number of worker processes.")
+@click.option("--threads", "-t", default=1, show_default=True,
+              help="Number of threads in each worker process.")
+@click.option("--max-requests", default=1000, show_default=True,
+              help="Restart each worker after it handles this many requests (0 to disable).")
+@click.option("--max-requests-jitter", default=100, show_default=True,
+              help="Random number of requests (up to this value) added to --max-requests "
+                   "so that workers don't restart at the same time.")
+@click.option("--timeout", default=30, show_default=True,
+              help="Restart workers that don't respond for this many seconds.")
+@click.option("--graceful-timeout", default=30, show_default=True,
+              help="Time given to workers to finish their requests on restart or shutdown.")
+def serve(host, port, workers, threads, max_requests, max_requests_jitter, timeout, graceful_timeout):
+    """Runs the production server with a pool of worker processes.
+
+    Application is loaded once in the master process before workers are
+    forked. Workers are restarted gracefully after handling --max-requests
+    requests. Send SIGTERM or SIGINT to shut the server down; SIGHUP reloads
+    all workers.
+    """
+    from webserver import create_app
+    from webserver.server import run
+    app = create_app()
+    _check_schema_version()
+    run(app, host, port, workers, threads, max_requests,
+        max_requests_jitter, timeout, graceful_timeout)
 
 
 @cli.command()
 @click.option("--force", "-f", is_flag=True, help="Drop existing database and user.")
+@click.option("--jobs", "-j", default=multiprocessing.cpu_count(), show_default=True,
+              help="Number of connections used to build keys and indexes.")
+@click.option("--maintenance-work-mem", default="512MB", show_default=True,
+              help="Memory available to each connection for building keys and indexes.")
 @click.argument("archive", type=click.Path(exists=True), required=False)
-def init_db(archive, force):
+def init_db(archive, force, jobs, maintenance_work_mem):
     """Initializes database and imports data if needed.
 
     This process involves several steps:
     1. Table structure is created.
     2. Data is imported from the archive if it is specified.
-    3. Primary keys and foreign keys are created.
-    4. Indexes are created.
+    3. Primary keys, foreign keys and indexes are created. Independent ones
+       are built concurrently on --jobs connections.
 
     Data dump needs to be a .tar.xz archive produced by export command.
 
     More information about populating a PostgreSQL database efficiently can be
     found at http://www.postgresql.org/docs/current/static/populate.html.
     """
+    import db.build
+    import db.migrations
     if force:
         exit_code = _run_psql('drop_db.sql')
         if exit_code != 0:
@@ -63,6 +105,7 @@ def init_db(archive, force):
 
     print('Creating tables...')
     db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_tables.sql'))
+    _partition_tables()
 
     if archive:
         print('Importing data...')
@@ -70,12 +113,13 @@ def init_db(archive, force):
     else:
         print('Skipping data importing.')
 
-    print('Creating primary and foreign keys...')
-    db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_primary_keys.sql'))
-    db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_foreign_keys.sql'))
-
-    print('Creating indexes...')
-    db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_indexes.sql'))
+    print('Creating primary keys, foreign keys and indexes...')
+    statements = []
+    for script in ['create_primary_keys.sql', 'create_foreign_keys.sql', 'create_indexes.sql']:
+        with open(os.path.join(ADMIN_SQL_DIR, script)) as f:
+            statements.extend(db.build.split_script(f.read()))
+    db.build.run(db.build.plan(statements), jobs, maintenance_work_mem)
+    db.migrations.stamp(db.SCHEMA_VERSION, "init_db")
 
     print("Done!")
 
@@ -88,6 +132,7 @@ def init_test_db(force=False):
 
     `SQLALCHEMY_TEST_URI` must be defined in the config file.
     """
+    import db.migrations
     if force:
         exit_code = _run_psql('drop_test_db.sql')
         if exit_code != 0:
@@ -106,12 +151,183 @@ def init_test_db(force=False):
 
     db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_types.sql'))
     db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_tables.sql'))
+    _partition_tables()
     db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_primary_keys.sql'))
     db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_foreign_keys.sql'))
     db.run_sql_script(os.path.join(ADMIN_SQL_DIR, 'create_indexes.sql'))
+    db.migrations.stamp(db.SCHEMA_VERSION, "init_db")
 
     print("Done!")
 
+@cli.command()
+@click.option("--limit", "-l", default=20, show_default=True, help="Number of keys to show.")
+@click.option("--active-only", "-a", is_flag=True, help="Don't show revoked keys.")
+def api_key_usage(limit, active_only):
+    """Lists API keys that received the most requests."""
+    db.init_db_engine(config.SQLALCHEMY_DATABASE_URI)
+    for key in db.api_key.get_top_by_usage(limit, active_only):
+        print("%s  %-20s %12d  %s%s" % (
+            key["value"], key["musicbrainz_id"], key["request_count"], key["last_used"],
+            "" if key["is_active"] else "  (revoked)",
+        ))
+
+
+@cli.command()
+@click.option("--dry-run", "-n", is_flag=True, help="Only print what would be done.")
+@click.option("--target", "-t", type=int,
+              help="Version to migrate to. Defaults to the version expected by the code.")
+@click.option("--lock-timeout", default=5, show_default=True,
+              help="Seconds that each statement waits for locks before it's retried.")
+@click.option("--stamp", type=int,
+              help="Record that the database is at this version, without changing it. "
+                   "Use it once on databases created before migrations were recorded.")
+def migrate(dry_run, target, lock_timeout, stamp):
+    """Migrates the database schema to the current version.
+
+    Migrations are in admin/migrations. They are designed to run while the
+    site is up: indexes are built concurrently, constraints are validated
+    separately from adding them, and data is updated in small batches.
+    """
+    import db.migrations
+    db.init_db_engine(config.SQLALCHEMY_DATABASE_URI)
+    if stamp is not None:
+        db.migrations.stamp(stamp)
+        print("Recorded version %d." % stamp)
+        return
+    try:
+        applied = db.migrations.migrate(target, dry_run=dry_run, lock_timeout=lock_timeout)
+    except db.exceptions.DatabaseException as e:
+        raise click.ClickException(str(e))
+    if not applied:
+        print("Schema is up to date.")
+
+
+@cli.command()
+@click.option("--partitions", "-p", type=int,
+              help="Number of partitions. Defaults to DATASET_CLASS_MEMBER_PARTITIONS "
+                   "from the config file.")
+@click.option("--batch-size", "-b", default=1000, show_default=True,
+              help="Number of dataset classes copied in each transaction.")
+def partition_class_members(partitions, batch_size):
+    """Moves members of dataset classes into a hash partitioned table.
+
+    Can be run while the site is up, and started again if it's interrupted.
+    The old table is kept as dataset_class_member_old.
+    """
+    import db.partitioning
+    if partitions is None:
+        partitions = _class_member_partitions()
+    if partitions < 1:
+        raise click.BadParameter("Number of partitions must be positive.", param_hint="--partitions")
+    db.init_db_engine(config.SQLALCHEMY_DATABASE_URI)
+    total = 0
+    for count in db.partitioning.migrate(partitions, batch_size):
+        total += count
+        print("Copied %d rows." % total)
+    print("Done! Drop dataset_class_member_old when you've checked the result.")
+
+
+@cli.command()
+@click.option("--processes", "-p", default=multiprocessing.cpu_count(), show_default=True,
+              help="Number of worker processes.")
+@click.option("--poll-interval", default=1.0, show_default=True,
+              help="Time (in seconds) that idle workers wait before checking the queue again.")
+def worker(processes, poll_interval):
+    """Runs background jobs from the job queue.
+
+    Send SIGTERM or SIGINT to stop; workers finish their current jobs first.
+    Any number of these can run on different machines.
+    """
+    from webserver import create_app
+    from webserver import jobs
+    app = create_app()
+    _check_schema_version()
+    jobs.run_pool(app, processes, poll_interval)
+
+
+@cli.command()
+def delete_abandoned_uploads():
+    """Deletes dataset upload sessions that haven't been used for a while.
+
+    Should be run regularly, for example from cron.
+    """
+    import db.upload
+    db.init_db_engine(config.SQLALCHEMY_DATABASE_URI)
+    max_age = getattr(config, "UPLOAD_SESSION_TTL", default_config.UPLOAD_SESSION_TTL)
+    print("Deleted %d upload sessions." % db.upload.delete_abandoned(max_age))
+
+
+@cli.command()
+@click.option("--fix", "-f", is_flag=True, help="Replace wrong statistics with recomputed ones.")
+def check_dataset_stats(fix):
+    """Recomputes statistics of all datasets and compares them with stored ones.
+
+    Exits with status 1 if wrong statistics are found and not fixed.
+    """
+    import db.dataset
+    db.init_db_engine(config.SQLALCHEMY_DATABASE_URI)
+    wrong = db.dataset.check_stats(fix=fix)
+    for dataset_id, class_id, stored, actual in wrong:
+        name = "Dataset %s" % dataset_id if class_id is None else "Class %d of dataset %s" % (class_id, dataset_id)
+        print("%s: stored %s, actual %s" % (name, stored, actual))
+    if not wrong:
+        print("All statistics are correct.")
+    elif fix:
+        print("Fixed %d statistics." % len(wrong))
+    else:
+        raise click.ClickException("Found %d wrong statistics. Run with --fix to fix them." % len(wrong))
+
+
+@cli.command()
+def profile_token():
+    """Generates a token that allows to profile requests.
+
+    Pass it in the X-Profile header or the _profile query parameter.
+    """
+    from webserver import create_app, profiling
+    with create_app().app_context():
+        print(profiling.generate_token())
+
+
+@cli.command()
+def compress_static():
+    """Creates precompressed copies of built static files.
+
+    Should be run after static files are built with gulp. Copies are sent to
+    clients that support their encoding instead of the original files.
+    """
+    from webserver import static_manager, compression
+    encodings = getattr(config, "STATIC_PRECOMPRESSED_ENCODINGS",
+                        default_config.STATIC_PRECOMPRESSED_ENCODINGS)
+    encodings = [e for e in encodings if e in compression.available_encodings()]
+    created = static_manager.compress_build(compression.compress, encodings)
+    print("Created %d files." % len(created))
+
+
+def _check_schema_version():
+    """Warn if the database schema is older than the code expects."""
+    import db.migrations
+    version = db.migrations.get_version()
+    if version is None:
+        print("Warning: schema version of the database is unknown, see `manage.py migrate --stamp`.")
+    elif version < db.SCHEMA_VERSION:
+        print("Warning: database schema is at version %d, but %d is expected. "
+              "Run `manage.py migrate`." % (version, db.SCHEMA_VERSION))
+
+
+def _class_member_partitions():
+    return getattr(config, "DATASET_CLASS_MEMBER_PARTITIONS",
+                   default_config.DATASET_CLASS_MEMBER_PARTITIONS)
+
+
+def _partition_tables():
+    import db.partitioning
+    partitions = _class_member_partitions()
+    if partitions:
+        print("Partitioning members of dataset classes...")
+        db.partitioning.replace_table(partitions)
+
+
 def _run_psql(script, database=None):
     script = os.path.join(ADMIN_SQL_DIR, script)
     command = ['psql', '-p', config.PG_PORT, '-U', config.PG_SUPER_USER, '-f', script]
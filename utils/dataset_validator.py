@@ -67,6 +67,55 @@ def validate(dataset):
         raise ValidationException('Value of `public` must be a boolean.')
 
 
+def validate_chunk(chunk, class_names):
+    """Validator for chunks of recordings that are uploaded into a dataset
+    upload session.
+
+    Chunk must have the following structure:
+    {
+        - classes (list of dicts)
+            {
+                - name (string, name of one of the classes of the dataset)
+                - recordings (list of UUIDs)
+            }
+    }
+
+    Args:
+        chunk: Chunk stored in a dictionary.
+        class_names: Names of classes of the dataset.
+
+    Raises:
+        ValidationException: A general exception for validation errors.
+    """
+    if not isinstance(chunk, dict):
+        raise ValidationException("Chunk must be a dictionary.")
+    _check_dict_structure(chunk, [("classes", True)], "chunk dictionary")
+    if not isinstance(chunk["classes"], list):
+        raise ValidationException("Field `classes` must be a list.")
+    for idx, cls in enumerate(chunk["classes"]):
+        if not isinstance(cls, dict):
+            raise ValidationException("Class number %s is not stored in a dictionary. All classes "
+                                      "must be dictionaries." % idx)
+        _check_dict_structure(cls, [("name", True), ("recordings", True)], "class number %s" % idx)
+        if cls["name"] not in class_names:
+            raise ValidationException('Class number %s ("%s") is not one of the classes of the dataset.'
+                                      % (idx, cls["name"]))
+        _validate_recordings(cls["recordings"], cls["name"], idx)
+
+
+def validate_recordings(recordings):
+    """Validator for lists of recording MBIDs.
+
+    Raises:
+        ValidationException: A general exception for validation errors.
+    """
+    if not isinstance(recordings, list):
+        raise ValidationException("Recordings must be a list.")
+    for recording in recordings:
+        if not isinstance(recording, string_types) or not UUID_RE.match(recording):
+            raise ValidationException('"%s" is not a valid recording MBID.' % recording)
+
+
 def _validate_classes(classes):
     if not isinstance(classes, list):
         raise ValidationException("Field `classes` must be a list of strings.")
@@ -203,3 +203,19 @@ class DatasetValidatorTestCase(unittest.TestCase):
                 ],
                 "public": False,
             })
+
+    def test_validate_chunk(self):
+        dataset_validator.validate_chunk({
+            "classes": [
+                {
+                    "name": "Rock",
+                    "recordings": ["0dad432b-16cc-4bf0-8961-fd31d124b01b"],
+                },
+            ],
+        }, ["Rock", "Not Rock"])
+        with self.assertRaises(dataset_validator.ValidationException):
+            dataset_validator.validate_chunk({"classes": [{"name": "Pop", "recordings": []}]}, ["Rock"])
+        with self.assertRaises(dataset_validator.ValidationException):
+            dataset_validator.validate_chunk({"classes": [{"name": "Rock", "recordings": ["nope"]}]}, ["Rock"])
+        with self.assertRaises(dataset_validator.ValidationException):
+            dataset_validator.validate_chunk({"classes": [{"name": "Rock"}]}, ["Rock"])
@@ -21,36 +21,68 @@ def create_app():
     from db import init_db_engine
     init_db_engine(app.config['SQLALCHEMY_DATABASE_URI'])
 
+    # Cache
+    from db import cache
+    cache.init(app.config['MEMCACHED_SERVERS'], app.config['MEMCACHED_NAMESPACE'])
+
+    # API key usage tracking
+    from webserver import api_key_usage
+    api_key_usage.init(app.config['API_KEY_USAGE_FLUSH_INTERVAL'],
+                       app.config['API_KEY_USAGE_FLUSH_THRESHOLD'])
+
     # Extensions
     from flask_uuid import FlaskUUID
     FlaskUUID(app)
 
     # MusicBrainz
-    import musicbrainzngs
+    from webserver import musicbrainz
     from db import SCHEMA_VERSION
-    musicbrainzngs.set_useragent(app.config['MUSICBRAINZ_USERAGENT'], SCHEMA_VERSION)
-    if app.config['MUSICBRAINZ_HOSTNAME']:
-        musicbrainzngs.set_hostname(app.config['MUSICBRAINZ_HOSTNAME'])
+    musicbrainz.init(app.config['MUSICBRAINZ_USERAGENT'], SCHEMA_VERSION,
+                     app.config['MUSICBRAINZ_HOSTNAME'])
 
     # OAuth
     from webserver.login import login_manager, provider
     login_manager.init_app(app)
     provider.init(app.config['MUSICBRAINZ_CLIENT_ID'],
-                  app.config['MUSICBRAINZ_CLIENT_SECRET'])
+                  app.config['MUSICBRAINZ_CLIENT_SECRET'],
+                  base_url=app.config['MUSICBRAINZ_OAUTH_URL'],
+                  timeout=app.config['MUSICBRAINZ_OAUTH_TIMEOUT'],
+                  pool_size=app.config['MUSICBRAINZ_OAUTH_POOL_SIZE'])
+
+    # Metrics
+    from webserver import metrics
+    metrics.init_app(app)
+
+    # Profiling
+    from webserver import profiling
+    profiling.init_app(app)
+
+    # Memory tracking
+    from webserver import memory
+    memory.init_app(app)
+
+    # Slow query log
+    from webserver import slow_queries
+    slow_queries.init_app(app)
+
+    # Rate limiting
+    from webserver import ratelimit
+    ratelimit.init(app)
+
+    # Compression
+    from webserver import compression
+    compression.init_app(app)
 
     # Error handling
     from webserver.errors import init_error_handlers
     init_error_handlers(app)
 
-    # Static files
-    import static_manager
-    static_manager.read_manifest()
-
     # Template utilities
     app.jinja_env.add_extension('jinja2.ext.do')
     from webserver import utils
     app.jinja_env.filters['date'] = utils.reformat_date
     app.jinja_env.filters['datetime'] = utils.reformat_datetime
+    from webserver import static_manager
     app.context_processor(lambda: dict(get_static_path=static_manager.get_static_path))
 
     _register_blueprints(app)
@@ -58,6 +90,24 @@ def create_app():
     return app
 
 
+def after_fork():
+    """Resets state that can't be shared between processes.
+
+    Must be called in every child process that is forked after the
+    application has been created.
+    """
+    import db
+    from db import cache
+    from webserver import ratelimit
+    from webserver.login import provider
+    if db.engine is not None:
+        db.engine.dispose()
+    cache.reset()
+    ratelimit.reset()
+    if provider.get_provider() is not None:
+        provider.get_provider().reset()
+
+
 def create_app_sphinx():
     """Creates application for generating the documentation using Sphinx.
 
@@ -76,15 +126,27 @@ def _register_blueprints(app):
         from webserver.views.index import index_bp
         from webserver.views.login import login_bp
         from webserver.views.user import user_bp
+        from webserver.views.monitoring import monitoring_bp
+        from webserver.views.admin import admin_bp
+        from webserver.views.static_files import static_files_bp
         app.register_blueprint(index_bp)
         app.register_blueprint(login_bp, url_prefix='/login')
         app.register_blueprint(user_bp)
+        app.register_blueprint(monitoring_bp)
+        app.register_blueprint(admin_bp, url_prefix='/admin')
+        app.register_blueprint(static_files_bp)
 
 
     def register_api(app):
         v1_prefix = '/api/v1'
         from webserver.views.api.v1.datasets import bp_datasets
         app.register_blueprint(bp_datasets, url_prefix=v1_prefix + '/datasets')
+        from webserver.views.api.v1.jobs import bp_jobs
+        app.register_blueprint(bp_jobs, url_prefix=v1_prefix + '/jobs')
+        from webserver.views.api.v1.uploads import bp_uploads
+        app.register_blueprint(bp_uploads, url_prefix=v1_prefix + '/datasets/uploads')
+        from webserver.views.api.v1.batch import bp_batch
+        app.register_blueprint(bp_batch, url_prefix=v1_prefix + '/batch')
 
 
     register_ui(app)
@@ -0,0 +1,123 @@
+"""
+This module keeps track of API key usage.
+
+Writing to the database on every request that uses an API key would add an
+extra write to each of them. Instead, request counts and last use times are
+accumulated in memory of each worker process and flushed to the database in
+batches from a background thread. Flush happens either when flush interval
+passes or when the number of pending requests reaches a threshold, whichever
+comes first. If a process crashes, at most one interval worth of usage data is
+lost.
+"""
+from datetime import datetime
+import atexit
+import logging
+import os
+import threading
+import time
+import pytz
+import db.api_key
+
+logger = logging.getLogger(__name__)
+
+_tracker = None
+
+
+class UsageTracker(object):
+
+    def __init__(self, flush_interval=60, flush_threshold=1000):
+        """Create new tracker.
+
+        Args:
+            flush_interval: Maximum number of seconds between flushes.
+            flush_threshold: Number of recorded requests that triggers
+                a flush before the interval passes.
+        """
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._usage = {}
+        self._pending = 0
+        self._pid = None
+
+    def record(self, key):
+        """Record one request made with a specified key."""
+        if self._pid != os.getpid():
+            self._start()
+        now = time.time()
+        with self._lock:
+            count, _ = self._usage.get(key, (0, None))
+            self._usage[key] = (count + 1, now)
+            self._pending += 1
+            if self._pending >= self.flush_threshold:
+                self._wakeup.set()
+
+    def flush(self):
+        """Write accumulated usage data into the database.
+
+        If writing fails, data is kept in memory until the next flush.
+        """
+        with self._lock:
+            usage, self._usage = self._usage, {}
+            self._pending = 0
+        if not usage:
+            return
+        try:
+            db.api_key.record_usage({
+                key: (count, datetime.fromtimestamp(last_used, pytz.utc))
+                for key, (count, last_used) in usage.items()
+            })
+        except Exception as e:
+            logger.error("Failed to save API key usage: %s", e)
+            with self._lock:
+                for key, (count, last_used) in usage.items():
+                    new_count, new_last_used = self._usage.get(key, (0, last_used))
+                    self._usage[key] = (count + new_count, max(last_used, new_last_used))
+                    self._pending += count
+
+    def _start(self):
+        """Start the flushing thread.
+
+        This needs to happen in every process that records usage. When process
+        is forked, data accumulated in the parent is dropped in the child, so
+        that it's not counted twice.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._usage = {}
+            self._pending = 0
+            self._wakeup = threading.Event()
+            thread = threading.Thread(target=self._run, name="api-key-usage")
+            thread.daemon = True
+            thread.start()
+
+    def _run(self):
+        wakeup = self._wakeup
+        while True:
+            wakeup.wait(self.flush_interval)
+            wakeup.clear()
+            self.flush()
+
+
+def init(flush_interval, flush_threshold):
+    global _tracker
+    _tracker = UsageTracker(flush_interval, flush_threshold)
+    atexit.register(_tracker.flush)
+
+
+def flush():
+    """Write accumulated usage data into the database."""
+    if _tracker is not None:
+        _tracker.flush()
+
+
+def record(key):
+    """Record one request made with a specified API key.
+
+    Does nothing if tracking hasn't been initialized.
+    """
+    if _tracker is not None:
+        _tracker.record(key)
@@ -0,0 +1,180 @@
+"""
+Compression of responses.
+
+Responses are compressed if the client supports one of the available
+encodings (see Accept-Encoding header), their type is in COMPRESSION_MIMETYPES,
+and they are larger than COMPRESSION_MIN_SIZE. gzip is always available;
+brotli (br) and Zstandard (zstd) are used if `brotli` and `zstandard` packages
+are installed. When client accepts multiple encodings with the same quality,
+the first one from COMPRESSION_ENCODINGS is used.
+
+Streamed responses are compressed chunk by chunk as they are sent.
+
+Views can mark responses with `set_cache_key`. Compressed versions of such
+responses are stored in the cache, so the same content is never compressed
+twice. Key must change whenever the content does.
+"""
+from flask import request
+from db import cache
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CACHE_KEY = "compressed"
+
+
+class _GzipCompressor(object):
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliCompressor(object):
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdCompressor(object):
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+_compressors = {"gzip": _GzipCompressor}
+if brotli is not None:
+    _compressors["br"] = _BrotliCompressor
+if zstandard is not None:
+    _compressors["zstd"] = _ZstdCompressor
+
+
+def available_encodings():
+    """Get names of encodings that can be used on this system."""
+    return list(_compressors)
+
+
+def compress(data, encoding, level):
+    """Compress data with a specified encoding ("gzip", "br" or "zstd")."""
+    compressor = _compressors[encoding](level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def set_cache_key(response, key):
+    """Allow compressed versions of a response to be cached.
+
+    Args:
+        response: Response object.
+        key: Key that identifies content of the response. It must change
+            whenever the content changes.
+    """
+    response.compression_cache_key = key
+    return response
+
+
+def init_app(app):
+    if not app.config["COMPRESSION_ENABLED"]:
+        return
+    config = {
+        "encodings": [e for e in app.config["COMPRESSION_ENCODINGS"] if e in _compressors],
+        "levels": app.config["COMPRESSION_LEVELS"],
+        "mimetypes": frozenset(app.config["COMPRESSION_MIMETYPES"]),
+        "min_size": app.config["COMPRESSION_MIN_SIZE"],
+        "cache_max_size": app.config["COMPRESSION_CACHE_MAX_SIZE"],
+    }
+
+    @app.after_request
+    def compress_response(response):
+        return _compress_response(response, config)
+
+
+def _choose_encoding(encodings):
+    """Choose encoding with the highest quality in the Accept-Encoding header.
+
+    Returns:
+        Name of the encoding, or None if client doesn't accept any of them.
+    """
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compress_response(response, config):
+    if response.mimetype not in config["mimetypes"]:
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code < 200 or response.status_code in (204, 206, 304) or \
+            response.direct_passthrough or "Content-Encoding" in response.headers or \
+            "no-transform" in response.headers.get("Cache-Control", ""):
+        return response
+
+    encoding = _choose_encoding(config["encodings"])
+    if encoding is None:
+        return response
+    level = config["levels"][encoding]
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, level)
+        response.headers.pop("Content-Length", None)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    data = response.get_data()
+    if len(data) < config["min_size"]:
+        return response
+    cache_key = getattr(response, "compression_cache_key", None)
+    compressed = None
+    if cache_key is not None:
+        cache_key = cache.gen_key(CACHE_KEY, cache_key, encoding, level)
+        compressed = cache.get(cache_key)
+    if compressed is None:
+        compressed = compress(data, encoding, level)
+        if cache_key is not None and len(compressed) <= config["cache_max_size"]:
+            cache.set(cache_key, compressed)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def _compress_stream(chunks, encoding, level):
+    compressor = _compressors[encoding](level)
+    try:
+        for chunk in chunks:
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode("utf-8")
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
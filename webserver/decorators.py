@@ -1,9 +1,10 @@
-from functools import update_wrapper, wraps
+from functools import update_wrapper, wraps, partial
 from datetime import timedelta
 from flask import request, current_app, make_response
 from flask_login import current_user
-from werkzeug.exceptions import Unauthorized
+from werkzeug.exceptions import Unauthorized, Forbidden
 from six import string_types
+from webserver import ratelimit
 
 
 def auth_required(f):
@@ -16,6 +17,44 @@ def auth_required(f):
     return decorated
 
 
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not current_user.is_authenticated:
+            raise Unauthorized
+        if not current_user.admin:
+            raise Forbidden
+        return f(*args, **kwargs)
+    return decorated
+
+
+def rate_limited(f=None, rate=None, per=None):
+    """Limits the rate of requests that each client can make to an endpoint.
+
+    Can be used either as `@rate_limited` to apply the default limit, or as
+    `@rate_limited(rate=10, per=60)` to allow 10 requests per 60 seconds.
+    Limits that are set in the RATELIMIT_ENDPOINTS and RATELIMIT_KEYS config
+    values take precedence over the ones defined here.
+
+    Responses include X-RateLimit-Limit, X-RateLimit-Remaining and
+    X-RateLimit-Reset headers. Requests that exceed the limit get a 429 error
+    with a Retry-After header.
+    """
+    if f is None:
+        return partial(rate_limited, rate=rate, per=per)
+    limit = (rate, per) if rate is not None else None
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        result = ratelimit.check(limit)
+        if result is None:
+            return f(*args, **kwargs)
+        response = make_response(f(*args, **kwargs))
+        response.headers.extend(result.headers)
+        return response
+    return decorated
+
+
 def crossdomain(origin='*', methods=None, headers=None,
                 max_age=21600, attach_to_all=True,
                 automatic_options=True):
@@ -1,12 +1,13 @@
-from flask import render_template, jsonify
+from flask import render_template
 from webserver.views.api import exceptions as api_exceptions
+from webserver.serialization import json_response
 
 
 def init_error_handlers(app):
 
     @app.errorhandler(api_exceptions.APIError)
     def api_error(error):
-        return jsonify(error.to_dict()), error.status_code
+        return json_response(error.to_dict(), error.status_code, error.headers)
 
     @app.errorhandler(400)
     def bad_request(error):
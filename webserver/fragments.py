@@ -0,0 +1,41 @@
+"""
+Cache of rendered template fragments.
+
+Parts of pages that are the same for every visitor can be rendered once and
+stored in the cache (see `db.cache`), which is memcached if it's configured
+or memory of the current process otherwise. Each fragment is stored under its
+name, a key that identifies the content (for example, ID of the user whose
+profile is shown) and a version of that content. Versions must change
+whenever the content does; fragments are never invalidated explicitly, old
+versions just stop being used and eventually expire.
+
+Fragments must not include anything that depends on the current user, like
+API keys or CSRF tokens.
+"""
+from flask import current_app, render_template
+from jinja2 import Markup
+from db import cache
+
+CACHE_KEY = "fragment"
+
+
+def render(template_name, key, version, get_context):
+    """Render a template or get its output from the cache.
+
+    Args:
+        template_name: Name of the template with the fragment.
+        key: Value that identifies content of the fragment.
+        version: Current version of the content.
+        get_context: Function that returns a dictionary with context for the
+            template. It's called only when the fragment needs to be
+            rendered, so it's a good place for database queries.
+
+    Returns:
+        Rendered fragment, marked as safe to include in other templates.
+    """
+    cache_key = cache.gen_key(CACHE_KEY, template_name, key, version)
+    html = cache.get(cache_key)
+    if html is None:
+        html = render_template(template_name, **get_context())
+        cache.set(cache_key, html, time=current_app.config["FRAGMENT_CACHE_TIME"])
+    return Markup(html)
@@ -0,0 +1,202 @@
+"""
+Background jobs.
+
+Operations that take too long for an HTTP request are added into the job
+queue (see db/job.py) and run by a pool of worker processes started with
+`manage.py worker`. Each job type has a handler, registered with `handler`,
+that gets a `Job` and returns a JSON serializable result.
+
+Long running handlers should call `Job.progress` regularly. It records how
+much of the job is done and raises `JobCancelled` when the job has been
+cancelled; if that happens inside a transaction, everything the job has done
+is rolled back.
+"""
+from __future__ import division
+from utils import dataset_validator
+import db
+import db.dataset
+import db.exceptions
+import db.job
+import db.upload
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+# Interval (in seconds) between heartbeats of running jobs
+HEARTBEAT_INTERVAL = 10
+
+# Errors that won't go away if a job is tried again
+PERMANENT_ERRORS = (dataset_validator.ValidationException, db.exceptions.NoDataFoundException)
+
+_handlers = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def handler(type):
+    """Register a handler of jobs of a specified type."""
+    def decorator(f):
+        _handlers[type] = f
+        return f
+    return decorator
+
+
+class Job(object):
+    """Job that is being run by a worker.
+
+    Attributes:
+        id: ID of the job.
+        type: Type of the job.
+        owner: ID of the user who created the job.
+        payload: Data for the handler.
+        attempt: Number of the current attempt, starting at 1.
+    """
+
+    def __init__(self, id, type, owner, payload, attempt):
+        self.id = id
+        self.type = type
+        self.owner = owner
+        self.payload = payload
+        self.attempt = attempt
+        self.cancel_requested = False
+        self._progress = None
+        self._stopped = threading.Event()
+        self._heartbeat_thread = None
+
+    def progress(self, fraction):
+        """Report how much of the job is done.
+
+        Args:
+            fraction: Number between 0 and 1.
+
+        Raises:
+            JobCancelled: The job has been cancelled.
+        """
+        self._progress = fraction
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        """Start updating heartbeat and progress of the job in the background."""
+        def beat():
+            while not self._stopped.wait(interval):
+                try:
+                    self.cancel_requested = db.job.heartbeat(self.id, self.attempt, self._progress)
+                except Exception:
+                    logging.exception("Failed to update heartbeat of job %s", self.id)
+        self._heartbeat_thread = threading.Thread(target=beat)
+        self._heartbeat_thread.daemon = True
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        self._stopped.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome."""
+    job.start_heartbeat()
+    try:
+        result = _handlers[job.type](job)
+    except JobCancelled:
+        db.job.mark_cancelled(job.id, job.attempt)
+    except PERMANENT_ERRORS as e:
+        db.job.fail(job.id, job.attempt, str(e), retry=False)
+    except Exception:
+        # Details of unexpected errors are only logged, because errors of jobs
+        # are shown to their owners.
+        logging.exception("Job %s (%s) failed", job.id, job.type)
+        db.job.fail(job.id, job.attempt, "Internal error.")
+    else:
+        db.job.finish(job.id, job.attempt, result)
+    finally:
+        job.stop_heartbeat()
+
+
+def work(stop, poll_interval=1):
+    """Run jobs from the queue until `stop` event is set.
+
+    Args:
+        stop: `threading.Event` or `multiprocessing.Event`. The current job
+            is finished before stopping.
+        poll_interval: Time (in seconds) to wait before checking the queue
+            again when it's empty.
+    """
+    while not stop.is_set():
+        row = db.job.claim()
+        if row is None:
+            stop.wait(poll_interval)
+            continue
+        if row["type"] not in _handlers:
+            db.job.fail(row["id"], row["attempt"], "Unknown job type: %s" % row["type"], retry=False)
+            continue
+        run_job(Job(**row))
+
+
+def run_pool(app, processes, poll_interval=1):
+    """Run jobs in a pool of worker processes until SIGTERM or SIGINT.
+
+    Workers finish their current jobs before exiting. Workers that exit
+    unexpectedly are replaced.
+    """
+    from webserver import after_fork
+    stop = multiprocessing.Event()
+
+    def start_worker():
+        def target():
+            # Only the master process handles signals, workers are stopped
+            # with the event.
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            after_fork()
+            with app.app_context():
+                work(stop, poll_interval)
+        process = multiprocessing.Process(target=target)
+        process.start()
+        return process
+
+    def shutdown(signum, frame):
+        stop.set()
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    workers = [start_worker() for _ in range(processes)]
+    while not stop.is_set():
+        time.sleep(1)
+        for i, process in enumerate(workers):
+            if not process.is_alive() and not stop.is_set():
+                logging.error("Job worker %d exited with code %s, restarting", process.pid, process.exitcode)
+                workers[i] = start_worker()
+    for process in workers:
+        process.join()
+
+
+@handler("create_dataset")
+def create_dataset(job):
+    # ID of the dataset is saved in the same transaction that creates it, so
+    # the job can be run again without creating another one.
+    try:
+        with db.engine.begin() as connection:
+            result = db.job.get_result(connection, job.id)
+            if result is not None:
+                return result
+            dataset_id = db.dataset.create(connection, job.payload["dataset"], job.owner, progress=job.progress)
+            result = {"dataset_id": str(dataset_id)}
+            db.job.save_result(connection, job.id, result)
+    except db.exceptions.ConflictException:
+        # Another attempt that was running at the same time created the
+        # dataset first, this one has been rolled back.
+        with db.engine.connect() as connection:
+            return db.job.get_result(connection, job.id)
+    db.dataset.bump_user_version(job.owner)
+    return result
+
+
+@handler("commit_upload")
+def commit_upload(job):
+    return {"dataset_id": db.upload.commit(job.payload["session_id"])}
@@ -1,50 +1,328 @@
-import logging
+"""
+Logging.
+
+Handlers that do I/O never run in the thread that logs a message. Records are
+put into a queue and handled by a background listener thread, so a slow disk
+or an unavailable mail server doesn't delay requests. Each handler has its own
+queue and thread, so a hanging SMTP conversation doesn't hold back the file
+log either. If a queue fills up, new records for that handler are dropped.
+
+Log file contains one JSON object per line. Records that are logged during a
+request include its ID (see `init_request_ids`). Writes to the file are
+flushed once per batch of records instead of after every record.
+
+Emails are rate limited: the same message (logged from the same line) is
+sent at most once per LOG_EMAIL_DEDUPLICATION_INTERVAL seconds, and no more
+than LOG_EMAIL_MAX_PER_HOUR emails are sent in total.
+"""
+from datetime import datetime
+from flask import g, request, has_request_context
 from logging.handlers import RotatingFileHandler, SMTPHandler
-from raven.contrib.flask import Sentry
+import atexit
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+REQUEST_ID_HEADER = "X-Request-Id"
+# Request IDs passed by clients or proxies are used only if they look sane
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Maximum number of records handled before the handler is flushed
+BATCH_SIZE = 100
+
+_listeners = []
 
 
 def init_loggers(app):
+    init_request_ids(app)
+    queue_size = app.config["LOG_QUEUE_SIZE"]
     if "LOG_FILE_ENABLED" in app.config and app.config["LOG_FILE_ENABLED"]:
-        _add_file_handler(app, app.config["LOG_FILE"], level=logging.INFO)
+        _add_file_handler(app, app.config["LOG_FILE"], level=logging.INFO, queue_size=queue_size)
+        app.logger.setLevel(logging.INFO)
     if "LOG_EMAIL_ENABLED" in app.config and app.config["LOG_EMAIL_ENABLED"]:
-        _add_email_handler(app, logging.ERROR)
+        _add_email_handler(app, logging.ERROR, queue_size=queue_size)
     if "LOG_SENTRY_ENABLED" in app.config and app.config["LOG_SENTRY_ENABLED"]:
         _add_sentry(app, logging.INFO)
 
 
+def init_request_ids(app):
+    """Assigns an ID to every request.
+
+    ID is taken from the X-Request-Id header if a proxy has set it, otherwise
+    a new one is generated. It's returned in the X-Request-Id header of the
+    response and included in all log records.
+    """
+
+    @app.before_request
+    def set_request_id():
+        request_id = request.headers.get(REQUEST_ID_HEADER)
+        if request_id is None or not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+
+    @app.after_request
+    def add_request_id_header(response):
+        request_id = getattr(g, "request_id", None)
+        if request_id is not None:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds information about the current request to log records."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = getattr(g, "request_id", None)
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+        else:
+            record.request_id = record.method = record.path = record.endpoint = None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as JSON objects."""
+
+    def format(self, record):
+        data = {
+            "time": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": "%s:%d" % (record.pathname, record.lineno),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for attr in ("request_id", "method", "path", "endpoint"):
+            value = getattr(record, attr, None)
+            if value is not None:
+                data[attr] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data)
+
+
+class QueueListener(object):
+    """Passes records from a queue to a handler in a background thread.
+
+    The thread is started in the process that logs the first record, so a
+    listener that is created before workers are forked works in each of them.
+    """
+
+    _SENTINEL = None
+
+    def __init__(self, handler, queue_size=10000):
+        self.handler = handler
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(self.queue_size)
+            self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                            name="log-listener")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Handle all queued records and stop the thread."""
+        if self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(self._SENTINEL, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._pid = None
+
+    def _run(self, records):
+        while True:
+            batch = [records.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._SENTINEL:
+                    self._flush()
+                    return
+                self.handler.handle(record)
+            self._flush()
+
+    def _flush(self):
+        flush = getattr(self.handler, "flush_batch", self.handler.flush)
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+class QueueHandler(logging.Handler):
+    """Passes records to a `QueueListener`.
+
+    Records are prepared in the logging thread: the message is formatted and
+    information about the request is attached, because none of it is
+    available in the listener thread.
+    """
+
+    def __init__(self, listener):
+        super(QueueHandler, self).__init__()
+        self.listener = listener
+        self.addFilter(RequestContextFilter())
+
+    def emit(self, record):
+        try:
+            # Other handlers get the same record, so it can't be modified
+            record = copy.copy(record)
+            record.template = str(record.msg)
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.listener.put(record)
+        except Exception:
+            self.handleError(record)
+
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that flushes the file only after a batch of records."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super(BatchedRotatingFileHandler, self).flush()
+
+    def close(self):
+        self.flush_batch()
+        super(BatchedRotatingFileHandler, self).close()
+
+
+class RateLimitedSMTPHandler(SMTPHandler):
+    """SMTPHandler that doesn't send the same message repeatedly.
+
+    Messages are considered the same if they are logged from the same line
+    with the same format string. When a message is sent again after being
+    suppressed, it includes the number of suppressed copies.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.deduplication_interval = kwargs.pop("deduplication_interval", 3600)
+        self.max_per_hour = kwargs.pop("max_per_hour", 10)
+        super(RateLimitedSMTPHandler, self).__init__(*args, **kwargs)
+        self._last_sent = {}  # key -> time
+        self._suppressed = {}  # key -> count
+        self._sent_times = []
+
+    def emit(self, record):
+        now = time.time()
+        key = (record.levelno, record.pathname, record.lineno, getattr(record, "template", record.msg))
+        self._sent_times = [t for t in self._sent_times if t > now - 3600]
+        if now - self._last_sent.get(key, 0) < self.deduplication_interval or \
+                len(self._sent_times) >= self.max_per_hour:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = "%s\n\n(%d similar messages were not sent)" % (record.msg, suppressed)
+        self._last_sent[key] = now
+        self._sent_times.append(now)
+        for k, t in list(self._last_sent.items()):
+            if now - t > self.deduplication_interval and k not in self._suppressed:
+                del self._last_sent[k]
+        super(RateLimitedSMTPHandler, self).emit(record)
+
+
+def _add_queued_handler(app, handler, level, queue_size):
+    listener = QueueListener(handler, queue_size)
+    _listeners.append(listener)
+    queue_handler = QueueHandler(listener)
+    queue_handler.setLevel(level)
+    app.logger.addHandler(queue_handler)
+
+
 def _add_file_handler(app, filename, max_bytes=512 * 1024, backup_count=100,
-                      level=logging.NOTSET):
+                      level=logging.NOTSET, queue_size=10000):
     """Adds file logging."""
-    file_handler = RotatingFileHandler(filename, maxBytes=max_bytes,
-                                       backupCount=backup_count)
-    file_handler.setLevel(level)
-    app.logger.addHandler(file_handler)
+    file_handler = BatchedRotatingFileHandler(filename, maxBytes=max_bytes,
+                                              backupCount=backup_count)
+    file_handler.setFormatter(JSONFormatter())
+    _add_queued_handler(app, file_handler, level, queue_size)
 
 
-def _add_email_handler(app, level=logging.NOTSET):
+def _add_email_handler(app, level=logging.NOTSET, queue_size=10000):
     """Adds email notifications about captured logs."""
-    mail_handler = SMTPHandler(
+    mail_handler = RateLimitedSMTPHandler(
         (app.config["SMTP_SERVER"], app.config["SMTP_PORT"]),
         "logs@" + app.config["MAIL_FROM_DOMAIN"],
         app.config["LOG_EMAIL_RECIPIENTS"],
-        app.config["LOG_EMAIL_TOPIC"]
+        app.config["LOG_EMAIL_TOPIC"],
+        deduplication_interval=app.config["LOG_EMAIL_DEDUPLICATION_INTERVAL"],
+        max_per_hour=app.config["LOG_EMAIL_MAX_PER_HOUR"],
     )
-    mail_handler.setLevel(level)
     mail_handler.setFormatter(logging.Formatter("""
     Message type: %(levelname)s
     Location: %(pathname)s:%(lineno)d
     Module: %(module)s
     Function: %(funcName)s
     Time: %(asctime)s
+    Request: %(request_id)s %(method)s %(path)s
     Message:
     %(message)s
     """))
-    app.logger.addHandler(mail_handler)
+    _add_queued_handler(app, mail_handler, level, queue_size)
 
 
 def _add_sentry(app, level=logging.NOTSET):
     """Adds support for error logging and aggregation using Sentry platform.
-    
+
+    Client is created before the first request, so that importing Raven
+    doesn't slow down startup, and every worker process gets its own client.
+    Raven sends events from its own background thread.
     See https://docs.getsentry.com for more information about it.
     """
-    Sentry(app, logging=True, level=level)
+
+    @app.before_first_request
+    def init_sentry():
+        from raven.contrib.flask import Sentry
+        Sentry(app, logging=True, level=level)
+
+
+def stop_listeners():
+    """Handle all queued records. Called when the process exits."""
+    for listener in _listeners:
+        listener.stop()
+
+
+atexit.register(stop_listeners)
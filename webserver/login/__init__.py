@@ -1,12 +1,20 @@
-from flask import redirect, url_for
+from flask import redirect, url_for, session, current_app
 from flask_login import LoginManager, UserMixin, current_user
 from functools import wraps
+from datetime import datetime
 from werkzeug.exceptions import Unauthorized
+from webserver import api_key_usage
 import db.user
+import calendar
+import pytz
+import time
 
 login_manager = LoginManager()
 login_manager.login_view = 'login.index'
 
+# Key in the session that holds a snapshot of user's data.
+SNAPSHOT_SESSION_KEY = 'user_snapshot'
+
 
 class User(UserMixin):
 
@@ -25,15 +33,52 @@ class User(UserMixin):
             admin=user['admin'],
         )
 
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return User(
+            id=snapshot['id'],
+            created=datetime.fromtimestamp(snapshot['created'], pytz.utc),
+            musicbrainz_id=snapshot['musicbrainz_id'],
+            admin=snapshot['admin'],
+        )
+
 
 @login_manager.user_loader
 def load_user(user_id):
+    """Load user that is authenticated with a session.
+
+    To avoid querying the database on every request, the session carries a
+    snapshot of user's data. Session cookie is signed, so clients can't
+    modify the snapshot. It is used as long as its version matches current
+    version of user's data (see `db.user.get_version`) and it's not older
+    than USER_SNAPSHOT_TTL seconds. Otherwise user is loaded from the
+    database and the snapshot is replaced.
+    """
+    snapshot = session.get(SNAPSHOT_SESSION_KEY)
+    if snapshot and str(snapshot['id']) == str(user_id) and \
+            time.time() - snapshot['loaded'] < current_app.config['USER_SNAPSHOT_TTL'] and \
+            snapshot['version'] == db.user.get_version(snapshot['id']):
+        return User.from_snapshot(snapshot)
     user = db.user.get(user_id)
     if user:
+        session[SNAPSHOT_SESSION_KEY] = _make_snapshot(user)
         return User.from_dbrow(user)
     else:
+        session.pop(SNAPSHOT_SESSION_KEY, None)
         return None
 
+
+def _make_snapshot(user):
+    return {
+        'id': user['id'],
+        'created': calendar.timegm(user['created'].utctimetuple()) + user['created'].microsecond / 1e6,
+        'musicbrainz_id': user['musicbrainz_id'],
+        'admin': user['admin'],
+        'version': user['version'],
+        'loaded': time.time(),
+    }
+
+
 @login_manager.request_loader
 def load_user(request):
     key = request.headers.get("Authorization")
@@ -42,6 +87,8 @@ def load_user(request):
         parts = key.split(" ")
         if len(parts) == 2 and parts[0] == "Token":
             user = db.user.get_by_api_key(parts[1])
+            if user:
+                api_key_usage.record(parts[1])
         else:
             raise Unauthorized
     if user:
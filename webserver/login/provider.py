@@ -1,36 +1,155 @@
-from rauth import OAuth2Service
 from flask import request, session, url_for
+from six.moves.urllib.parse import urlencode, urljoin
 from webserver.login import User
 from webserver.utils import generate_string
 import db.user
-import json
 
-_musicbrainz = None
+_provider = None
 _session_key = None
 
 
-def init(client_id, client_secret, session_key='musicbrainz'):
-    global _musicbrainz, _session_key
-    _musicbrainz = OAuth2Service(
-        name='musicbrainz',
-        base_url="https://musicbrainz.org/",
-        authorize_url="https://musicbrainz.org/oauth2/authorize",
-        access_token_url="https://musicbrainz.org/oauth2/token",
-        client_id=client_id,
-        client_secret=client_secret,
-    )
+class ProviderError(Exception):
+    """Raised when communication with an OAuth provider fails."""
+    pass
+
+
+class OAuthProvider(object):
+    """Interface of an OAuth 2.0 provider."""
+
+    def get_authorize_url(self, redirect_uri, state):
+        """Get URL of the login form that user needs to be redirected to."""
+        raise NotImplementedError
+
+    def get_username(self, code, redirect_uri):
+        """Exchange authorization code for an access token and use it to get
+        username of the user that logged in.
+
+        Raises:
+            ProviderError: Request to the provider failed.
+        """
+        raise NotImplementedError
+
+
+class MusicBrainzProvider(OAuthProvider):
+    """OAuth provider that uses MusicBrainz accounts.
+
+    All requests go through a single HTTP session, so connections to the
+    provider are kept alive and reused between logins.
+    """
+
+    def __init__(self, client_id, client_secret, base_url="https://musicbrainz.org/",
+                 timeout=10, pool_size=10):
+        """Create new provider.
+
+        Args:
+            client_id: OAuth client ID.
+            client_secret: OAuth client secret.
+            base_url: URL of the server that implements OAuth endpoints.
+            timeout: Timeout (in seconds) for connecting to the server and
+                for receiving a response.
+            pool_size: Maximum number of connections to keep open.
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            # Imported on first use, so that it doesn't slow down startup
+            import requests
+            from requests.adapters import HTTPAdapter
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def reset(self):
+        """Close all open connections.
+
+        Must be called in a child process after fork, so that it doesn't share
+        connections with the parent.
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def get_authorize_url(self, redirect_uri, state):
+        return urljoin(self.base_url, "oauth2/authorize") + "?" + urlencode({
+            'client_id': self.client_id,
+            'response_type': 'code',
+            'redirect_uri': redirect_uri,
+            'scope': 'profile',
+            'state': state,
+        })
+
+    def get_username(self, code, redirect_uri):
+        token = self._request("POST", "oauth2/token", data={
+            'code': code,
+            'grant_type': 'authorization_code',
+            'redirect_uri': redirect_uri,
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+        })
+        if 'access_token' not in token:
+            raise ProviderError("Access token is missing from the response.")
+        info = self._request("GET", "oauth2/userinfo", headers={
+            'Authorization': 'Bearer %s' % token['access_token'],
+        })
+        return info.get('sub')
+
+    def _request(self, method, path, **kwargs):
+        from requests.exceptions import RequestException
+        try:
+            response = self.session.request(method, urljoin(self.base_url, path),
+                                            timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except (RequestException, ValueError) as e:
+            raise ProviderError("Request to %s failed: %s" % (path, e))
+
+
+def init(client_id, client_secret, session_key='musicbrainz', **kwargs):
+    """Set up MusicBrainz as the OAuth provider.
+
+    Additional keyword arguments are passed to `MusicBrainzProvider`.
+    """
+    set_provider(MusicBrainzProvider(client_id, client_secret, **kwargs), session_key)
+
+
+def set_provider(provider, session_key='musicbrainz'):
+    """Set OAuth provider that is used for logging in.
+
+    Args:
+        provider: Instance of `OAuthProvider`.
+        session_key: Key in the session used to store login state.
+    """
+    global _provider, _session_key
+    _provider = provider
     _session_key = session_key
 
 
+def get_provider():
+    return _provider
+
+
 def get_user():
-    """Function should fetch user data from database, or, if necessary, create it, and return it."""
-    s = _musicbrainz.get_auth_session(data={
-        'code': _fetch_data('code'),
-        'grant_type': 'authorization_code',
-        'redirect_uri': url_for('login.musicbrainz_post', _external=True)
-    }, decoder=lambda b: json.loads(b.decode("utf-8")))
-    data = s.get('oauth2/userinfo').json()
-    user = db.user.get_or_create(data.get('sub'))
+    """Function should fetch user data from database, or, if necessary, create it, and return it.
+
+    Raises:
+        ProviderError: Request to the provider failed.
+    """
+    musicbrainz_id = _provider.get_username(
+        _fetch_data('code'),
+        url_for('login.musicbrainz_post', _external=True),
+    )
+    if not musicbrainz_id:
+        raise ProviderError("Username is missing from the response.")
+    user = db.user.get_or_create(musicbrainz_id)
     if user:
         return User.from_dbrow(user)
     else:
@@ -41,13 +160,10 @@ def get_authentication_uri():
     """Prepare and return URL to authentication service login form."""
     csrf = generate_string(20)
     _persist_data(csrf=csrf)
-    params = {
-        'response_type': 'code',
-        'redirect_uri': url_for('login.musicbrainz_post', _external=True),
-        'scope': 'profile',
-        'state': csrf,
-    }
-    return _musicbrainz.get_authorize_url(**params)
+    return _provider.get_authorize_url(
+        url_for('login.musicbrainz_post', _external=True),
+        csrf,
+    )
 
 
 def validate_post_login():
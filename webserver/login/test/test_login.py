@@ -0,0 +1,45 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+from webserver.login import SNAPSHOT_SESSION_KEY
+import db.user
+import mock
+
+
+class LoadUserTestCase(ServerTestCase):
+
+    def setUp(self):
+        super(LoadUserTestCase, self).setUp()
+        self.test_user_id = db.user.create("tester")
+
+    def test_snapshot(self):
+        self.temporary_login(self.test_user_id)
+        resp = self.client.get("/user-info")
+        self.assert200(resp)
+        with self.client.session_transaction() as session:
+            self.assertEqual(session[SNAPSHOT_SESSION_KEY]["id"], self.test_user_id)
+
+        # Snapshot is used instead of the database
+        with mock.patch("db.user.get", wraps=db.user.get) as get:
+            resp = self.client.get("/user-info")
+            self.assertEqual(resp.json["user"]["musicbrainz_id"], "tester")
+            self.assertFalse(get.called)
+
+    def test_snapshot_outdated(self):
+        self.temporary_login(self.test_user_id)
+        self.client.get("/user-info")
+
+        db.user.set_admin("tester", admin=True)
+        with mock.patch("db.user.get", wraps=db.user.get) as get:
+            self.client.get("/user-info")
+            self.assertTrue(get.called)
+        with self.client.session_transaction() as session:
+            self.assertTrue(session[SNAPSHOT_SESSION_KEY]["admin"])
+
+    def test_snapshot_expired(self):
+        self.temporary_login(self.test_user_id)
+        self.client.get("/user-info")
+
+        self.app.config["USER_SNAPSHOT_TTL"] = 0
+        with mock.patch("db.user.get", wraps=db.user.get) as get:
+            self.client.get("/user-info")
+            self.assertTrue(get.called)
@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+from webserver.login import provider
+from webserver.login.testing import FakeOAuthServer
+from flask import url_for
+from six.moves.urllib.parse import urlparse, parse_qs
+import db.user
+import unittest
+
+
+class MusicBrainzProviderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeOAuthServer()
+        self.server.start()
+        self.provider = provider.MusicBrainzProvider("client", "secret", base_url=self.server.url)
+
+    def tearDown(self):
+        self.provider.reset()
+        self.server.stop()
+
+    def test_get_authorize_url(self):
+        url = urlparse(self.provider.get_authorize_url("http://localhost/post", "csrf"))
+        self.assertEqual(url.path, "/oauth2/authorize")
+        query = parse_qs(url.query)
+        self.assertEqual(query["client_id"], ["client"])
+        self.assertEqual(query["redirect_uri"], ["http://localhost/post"])
+        self.assertEqual(query["state"], ["csrf"])
+
+    def test_get_username(self):
+        self.assertEqual(self.provider.get_username("tester", "http://localhost/post"), "tester")
+        self.assertEqual(self.provider.get_username("another", "http://localhost/post"), "another")
+        token_request = self.server.requests[0][1]
+        self.assertEqual(token_request["client_secret"], ["secret"])
+        self.assertEqual(token_request["redirect_uri"], ["http://localhost/post"])
+
+    def test_get_username_error(self):
+        self.provider.base_url = self.server.url + "missing/"
+        with self.assertRaises(provider.ProviderError):
+            self.provider.get_username("tester", "http://localhost/post")
+
+
+class LoginFlowTestCase(ServerTestCase):
+
+    def setUp(self):
+        super(LoginFlowTestCase, self).setUp()
+        self.server = FakeOAuthServer()
+        self.server.start()
+        provider.init("client", "secret", base_url=self.server.url)
+
+    def tearDown(self):
+        provider.get_provider().reset()
+        self.server.stop()
+        super(LoginFlowTestCase, self).tearDown()
+
+    def test_login(self):
+        resp = self.client.get(url_for('login.musicbrainz'))
+        self.assertStatus(resp, 302)
+        state = parse_qs(urlparse(resp.location).query)["state"][0]
+
+        resp = self.client.get(url_for('login.musicbrainz_post', code="tester", state=state))
+        self.assertStatus(resp, 302)
+        self.assertIsNotNone(db.user.get_by_mb_id("tester"))
+        self.assert200(self.client.get("/user-info"))
+        self.assertEqual(self.client.get("/user-info").json["user"]["musicbrainz_id"], "tester")
+
+    def test_login_wrong_state(self):
+        self.client.get(url_for('login.musicbrainz'))
+        self.client.get(url_for('login.musicbrainz_post', code="tester", state="wrong"))
+        self.assertIsNone(db.user.get_by_mb_id("tester"))
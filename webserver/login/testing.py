@@ -0,0 +1,91 @@
+"""
+Fake OAuth server for tests and benchmarks.
+
+It implements the token and user info endpoints of MusicBrainz OAuth just
+enough for `MusicBrainzProvider` to work with it. Every authorization code is
+accepted, and the code itself is returned as the username, so each test can
+log in as whoever it needs.
+"""
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs
+import json
+import threading
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+
+    def do_POST(self):
+        if self.path != "/oauth2/token":
+            return self._respond(404, {"error": "not_found"})
+        length = int(self.headers.get("Content-Length", 0))
+        data = parse_qs(self.rfile.read(length).decode("utf-8"))
+        self.server.requests.append(("token", data))
+        if data.get("grant_type") != ["authorization_code"] or not data.get("code"):
+            return self._respond(400, {"error": "invalid_request"})
+        self._respond(200, {
+            "access_token": "token-%s" % data["code"][0],
+            "token_type": "Bearer",
+            "expires_in": 3600,
+        })
+
+    def do_GET(self):
+        if self.path != "/oauth2/userinfo":
+            return self._respond(404, {"error": "not_found"})
+        auth = self.headers.get("Authorization", "")
+        self.server.requests.append(("userinfo", auth))
+        if not auth.startswith("Bearer token-"):
+            return self._respond(401, {"error": "invalid_token"})
+        self._respond(200, {"sub": auth[len("Bearer token-"):]})
+
+    def _respond(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOAuthServer(object):
+    """Fake OAuth server that runs in a background thread.
+
+    Usage:
+        server = FakeOAuthServer()
+        server.start()
+        provider = MusicBrainzProvider("id", "secret", base_url=server.url)
+        ...
+        server.stop()
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.requests = []
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://%s:%s/" % (host, port)
+
+    @property
+    def requests(self):
+        """List of requests received by the server."""
+        return self._server.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,190 @@
+"""
+Tracking of memory allocations with tracemalloc.
+
+Every request is tracked with probability MEMORY_TRACKING_SAMPLE_RATE (0 turns
+tracking off). Tracing slows down all allocations, so it's enabled only while
+a tracked request is handled, and only one request per process is tracked at
+a time. In threaded workers allocations made by other requests at the same
+time are counted too.
+
+For each tracked request we record:
+* peak: the largest amount of memory allocated at any point during the request,
+* net: memory that was allocated during the request and is still in use after
+  it (growth of this value over time suggests a leak),
+* allocation sites (lines of code) that allocated the most memory.
+
+Peak and net allocation are exported as metrics for each endpoint. Requests
+whose peak exceeds MEMORY_TRACKING_LOG_THRESHOLD are also logged with their top
+allocation sites.
+
+Admins can take snapshots of all memory that is allocated in a process (see
+/admin/memory). Every snapshot is compared with the previous one to show lines
+that allocated the most memory in between. Tracing stays enabled while
+snapshots are kept.
+
+tracemalloc is available since Python 3.4. Tracking is disabled on older
+versions.
+"""
+from __future__ import division
+from datetime import datetime
+from flask import request, current_app
+from webserver import metrics
+import logging
+import random
+import threading
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+# Held while a request is tracked
+_tracking_lock = threading.Lock()
+# Protects statistics and snapshots
+_lock = threading.Lock()
+_endpoints = {}
+_snapshots = []
+_last_snapshot = None
+
+# Allocations made by tracemalloc itself and by imports are not interesting
+_IGNORED_FILES = ["<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>",
+                  "<unknown>", tracemalloc.__file__ if tracemalloc else ""]
+
+
+def is_available():
+    return tracemalloc is not None
+
+
+def init_app(app):
+    if not is_available() or not app.config["MEMORY_TRACKING_SAMPLE_RATE"]:
+        return
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+
+
+def get_endpoint_stats():
+    """Get statistics of requests tracked in the current process.
+
+    Returns:
+        List of dictionaries with "endpoint", "count", "peak_max", "peak_avg"
+        and "net_avg" values, sorted by maximum peak.
+    """
+    with _lock:
+        stats = [dict(endpoint=endpoint, peak_avg=s["peak_sum"] / s["count"],
+                      net_avg=s["net_sum"] / s["count"], **s)
+                 for endpoint, s in _endpoints.items()]
+    return sorted(stats, key=lambda s: s["peak_max"], reverse=True)
+
+
+def get_snapshots():
+    """Get snapshots taken in the current process, newest first."""
+    return list(reversed(_snapshots))
+
+
+def take_snapshot(limit=20, frames=1):
+    """Take a snapshot of allocated memory and compare it with the previous one.
+
+    The first snapshot only starts tracing.
+
+    Args:
+        limit: Number of lines with the largest difference to keep.
+        frames: Number of frames to store for each allocation.
+    """
+    global _last_snapshot
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        snapshot = _filter(tracemalloc.take_snapshot())
+        if _last_snapshot is None:
+            diff = []
+        else:
+            diff = [{
+                "location": _location(stat.traceback),
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            } for stat in snapshot.compare_to(_last_snapshot, "lineno")[:limit]]
+        _last_snapshot = snapshot
+        _snapshots.append({
+            "taken": datetime.utcnow(),
+            "total": sum(stat.size for stat in snapshot.statistics("filename")),
+            "diff": diff,
+        })
+        del _snapshots[:-current_app.config["MEMORY_TRACKING_MAX_SNAPSHOTS"]]
+
+
+def clear_snapshots():
+    """Remove all snapshots and stop tracing."""
+    global _last_snapshot
+    with _lock:
+        del _snapshots[:]
+        _last_snapshot = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def _filter(snapshot):
+    return snapshot.filter_traces([tracemalloc.Filter(False, f) for f in _IGNORED_FILES])
+
+
+def _location(traceback):
+    frame = traceback[0]
+    return "%s:%d" % (frame.filename, frame.lineno)
+
+
+def _before_request():
+    _local.tracking = None
+    if random.random() >= current_app.config["MEMORY_TRACKING_SAMPLE_RATE"]:
+        return
+    if not _tracking_lock.acquire(False):
+        return  # another request is tracked
+    if tracemalloc.is_tracing():
+        # Tracing has been started for snapshots
+        started = False
+        baseline = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+    else:
+        started = True
+        baseline = 0
+        tracemalloc.start(current_app.config["MEMORY_TRACKING_FRAMES"])
+    _local.tracking = (started, baseline)
+
+
+def _teardown_request(exception):
+    tracking = getattr(_local, "tracking", None)
+    if tracking is None:
+        return
+    _local.tracking = None
+    started, baseline = tracking
+    try:
+        current, peak = tracemalloc.get_traced_memory()
+        peak, net = peak - baseline, current - baseline
+        top = []
+        if peak >= current_app.config["MEMORY_TRACKING_LOG_THRESHOLD"]:
+            snapshot = _filter(tracemalloc.take_snapshot())
+            top = snapshot.statistics("lineno")[:current_app.config["MEMORY_TRACKING_TOP_SITES"]]
+        if started and _last_snapshot is None and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    finally:
+        _tracking_lock.release()
+    _record(request.url_rule.endpoint if request.url_rule is not None else "none", peak, net, top)
+
+
+def _record(endpoint, peak, net, top):
+    with _lock:
+        stats = _endpoints.setdefault(endpoint, {"count": 0, "peak_max": 0, "peak_sum": 0, "net_sum": 0})
+        stats["count"] += 1
+        stats["peak_max"] = max(stats["peak_max"], peak)
+        stats["peak_sum"] += peak
+        stats["net_sum"] += net
+    endpoint_labels = metrics.labels(endpoint=endpoint)
+    metrics.observe("http_request_memory_peak_bytes", endpoint_labels, peak)
+    metrics.observe("http_request_memory_net_bytes", endpoint_labels, net)
+    if top:
+        logger.info("Request to %s allocated %d bytes at peak, %d bytes retained. Top allocation sites: %s",
+                    endpoint, peak, net,
+                    "; ".join("%s %d bytes" % (_location(stat.traceback), stat.size) for stat in top))
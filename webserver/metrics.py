@@ -0,0 +1,333 @@
+"""
+Request metrics in Prometheus format.
+
+Every request is measured: latency, status code, response size and the number
+of SQL statements it ran (with their total duration). Measurements are kept in
+memory of each process in a `Registry`.
+
+When the server runs multiple worker processes, each of them writes its
+registry into a separate file in METRICS_DIR every METRICS_FLUSH_INTERVAL
+seconds. The /metrics endpoint combines all these files, so it reports totals
+for the whole server no matter which worker handles the scrape. Counters of
+workers that have exited are kept in an archive file, so that they never go
+backwards; their gauges are dropped.
+"""
+from __future__ import division
+from collections import defaultdict
+from flask import request
+from webserver import query_timing
+import atexit
+import errno
+import fcntl
+import json
+import os
+import threading
+import time
+import db
+
+HISTOGRAM_BUCKETS = {
+    "http_request_duration_seconds": (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+    "http_response_size_bytes": (100, 1000, 10000, 100000, 1000000, 10000000, 100000000),
+    "http_request_db_statements": (0, 1, 2, 5, 10, 25, 50, 100, 1000),
+    "http_request_memory_peak_bytes": (10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8, 10 ** 9),
+    "http_request_memory_net_bytes": (0, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8),
+}
+
+METRICS = {
+    "http_requests_total": ("counter", "Number of handled requests."),
+    "http_requests_in_flight": ("gauge", "Number of requests that are being handled."),
+    "http_request_duration_seconds": ("histogram", "Time spent handling requests."),
+    "http_response_size_bytes": ("histogram", "Size of response bodies (streamed responses are not included)."),
+    "http_request_db_statements": ("histogram", "Number of SQL statements run by each request."),
+    "db_statements_total": ("counter", "Number of SQL statements run while handling requests."),
+    "db_statement_duration_seconds_total": ("counter", "Time spent running SQL statements while handling requests."),
+    "http_request_memory_peak_bytes": ("histogram", "Peak memory allocated by sampled requests."),
+    "http_request_memory_net_bytes": ("histogram", "Memory allocated by sampled requests and retained after them."),
+}
+
+_registry = None
+_store = None
+_local = threading.local()
+_last_flush = 0
+_flush_interval = 0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(**kwargs):
+    """Format labels of a sample."""
+    return ",".join('%s="%s"' % (k, _escape(v)) for k, v in sorted(kwargs.items()))
+
+
+class Registry(object):
+    """Metrics of a single process.
+
+    Samples are identified by metric name and a string with formatted labels
+    (see `labels` function).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, label_str, value=1):
+        with self._lock:
+            self.counters[(name, label_str)] += value
+
+    def add_gauge(self, name, label_str, value):
+        with self._lock:
+            self.gauges[(name, label_str)] += value
+
+    def observe(self, name, label_str, value):
+        buckets = HISTOGRAM_BUCKETS[name]
+        with self._lock:
+            histogram = self.histograms.get((name, label_str))
+            if histogram is None:
+                # Count for each bucket (non-cumulative) + one for +Inf, sum, count
+                histogram = self.histograms[(name, label_str)] = [0] * (len(buckets) + 3)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(buckets)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def dump(self):
+        """Get contents of the registry as a JSON-serializable dictionary."""
+        with self._lock:
+            return {
+                "counters": [[n, l, v] for (n, l), v in self.counters.items()],
+                "gauges": [[n, l, v] for (n, l), v in self.gauges.items()],
+                "histograms": [[n, l, list(h)] for (n, l), h in self.histograms.items()],
+            }
+
+    def merge(self, data, gauges=True):
+        """Add contents of another registry (see `dump`) to this one."""
+        with self._lock:
+            for name, label_str, value in data["counters"]:
+                self.counters[(name, label_str)] += value
+            if gauges:
+                for name, label_str, value in data["gauges"]:
+                    self.gauges[(name, label_str)] += value
+            for name, label_str, values in data["histograms"]:
+                histogram = self.histograms.get((name, label_str))
+                if histogram is None:
+                    self.histograms[(name, label_str)] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        histogram[i] += value
+
+    def render(self):
+        """Render metrics in Prometheus text format."""
+        series = defaultdict(list)  # name -> [(labels, lines)]
+        with self._lock:
+            for (name, label_str), value in list(self.counters.items()) + list(self.gauges.items()):
+                series[name].append((label_str, ["%s{%s} %r" % (name, label_str, float(value))]))
+            for (name, label_str), histogram in self.histograms.items():
+                prefix = label_str + "," if label_str else ""
+                lines = []
+                cumulative = 0
+                for bound, count in zip(HISTOGRAM_BUCKETS[name] + ("+Inf",), histogram):
+                    cumulative += count
+                    lines.append('%s_bucket{%sle="%s"} %d' % (name, prefix, bound, cumulative))
+                lines.append("%s_sum{%s} %r" % (name, label_str, float(histogram[-2])))
+                lines.append("%s_count{%s} %d" % (name, label_str, histogram[-1]))
+                series[name].append((label_str, lines))
+        output = []
+        for name in sorted(series):
+            metric_type, help_text = METRICS.get(name, ("untyped", ""))
+            output.append("# HELP %s %s" % (name, help_text))
+            output.append("# TYPE %s %s" % (name, metric_type))
+            for _, lines in sorted(series[name]):
+                output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+class FileStore(object):
+    """Stores registries of all worker processes in a directory."""
+
+    ARCHIVE = "archive.json"
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def clear(self):
+        """Remove all stored metrics. Should be done when the server starts."""
+        for filename in os.listdir(self.path):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(self.path, filename))
+
+    def write(self, registry):
+        """Write registry of the current process."""
+        filename = os.path.join(self.path, "%d.json" % os.getpid())
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(registry.dump(), f)
+        os.rename(tmp_filename, filename)
+
+    def collect(self):
+        """Combine registries of all processes.
+
+        Registries of processes that no longer exist are moved into the
+        archive without their gauges.
+        """
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive = Registry()
+            archive_path = os.path.join(self.path, self.ARCHIVE)
+            if os.path.exists(archive_path):
+                archive.merge(self._read(archive_path))
+            result = Registry()
+            archive_changed = False
+            for filename in os.listdir(self.path):
+                if not filename.endswith(".json") or filename == self.ARCHIVE:
+                    continue
+                path = os.path.join(self.path, filename)
+                data = self._read(path)
+                if _is_alive(int(filename[:-len(".json")])):
+                    result.merge(data)
+                else:
+                    archive.merge(data, gauges=False)
+                    os.remove(path)
+                    archive_changed = True
+            if archive_changed:
+                with open(archive_path + ".tmp", "w") as f:
+                    json.dump(archive.dump(), f)
+                os.rename(archive_path + ".tmp", archive_path)
+            result.merge(archive.dump())
+            return result
+
+    @staticmethod
+    def _read(path):
+        with open(path) as f:
+            return json.load(f)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def init_app(app):
+    global _registry, _flush_interval
+    if not app.config["METRICS_ENABLED"]:
+        return
+    _registry = Registry()
+    _flush_interval = app.config["METRICS_FLUSH_INTERVAL"]
+    if app.config["METRICS_DIR"]:
+        set_directory(app.config["METRICS_DIR"])
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    query_timing.subscribe(_on_statement)
+    if db.engine is not None:
+        query_timing.attach(db.engine)
+
+
+def set_directory(path, clear=False):
+    """Start sharing metrics with other processes through a directory.
+
+    Args:
+        path: Directory that is shared by all worker processes.
+        clear: True to remove metrics that are already stored there.
+    """
+    global _store
+    if _store is None:
+        atexit.register(flush)
+    _store = FileStore(path)
+    if clear:
+        _store.clear()
+
+
+def inc(name, label_str, value=1):
+    """Increase a counter. Does nothing if metrics are disabled."""
+    if _registry is not None:
+        _registry.inc(name, label_str, value)
+
+
+def observe(name, label_str, value):
+    """Add an observation to a histogram. Does nothing if metrics are disabled."""
+    if _registry is not None:
+        _registry.observe(name, label_str, value)
+
+
+def get_registry():
+    """Get metrics of the whole server (all processes)."""
+    if _registry is None:
+        return Registry()
+    if _store is None:
+        return _registry
+    flush()
+    return _store.collect()
+
+
+def flush():
+    """Write metrics of the current process into the shared directory."""
+    global _last_flush
+    if _store is None or _registry is None:
+        return
+    _last_flush = time.time()
+    _store.write(_registry)
+
+
+def _endpoint():
+    return request.url_rule.endpoint if request.url_rule is not None else "none"
+
+
+def _before_request():
+    _local.start = time.time()
+    _local.sql_count = 0
+    _local.sql_time = 0.0
+    _local.recorded = False
+    _registry.add_gauge("http_requests_in_flight", "", 1)
+
+
+def _after_request(response):
+    _record(response.status_code, None if response.is_streamed else response.calculate_content_length())
+    return response
+
+
+def _teardown_request(exception):
+    if getattr(_local, "start", None) is None:
+        return
+    if not _local.recorded:
+        _record(500, None)
+    _registry.add_gauge("http_requests_in_flight", "", -1)
+    _local.start = None
+    if _store is not None and time.time() - _last_flush > _flush_interval:
+        flush()
+
+
+def _record(status_code, size):
+    if getattr(_local, "start", None) is None:
+        return
+    _local.recorded = True
+    endpoint = _endpoint()
+    endpoint_labels = labels(endpoint=endpoint)
+    _registry.inc("http_requests_total", labels(endpoint=endpoint, method=request.method,
+                                                status=status_code))
+    _registry.observe("http_request_duration_seconds", endpoint_labels, time.time() - _local.start)
+    if size is not None:
+        _registry.observe("http_response_size_bytes", endpoint_labels, size)
+    _registry.observe("http_request_db_statements", endpoint_labels, _local.sql_count)
+    if _local.sql_count:
+        _registry.inc("db_statements_total", endpoint_labels, _local.sql_count)
+        _registry.inc("db_statement_duration_seconds_total", endpoint_labels, _local.sql_time)
+
+
+def _on_statement(statement, parameters, executemany, start, duration):
+    if getattr(_local, "start", None) is not None:
+        _local.sql_count += 1
+        _local.sql_time += duration
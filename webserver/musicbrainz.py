@@ -0,0 +1,39 @@
+"""
+Access to the MusicBrainz web service.
+
+musicbrainzngs is imported and configured when it's used for the first time,
+so that processes that never talk to MusicBrainz don't pay for it.
+"""
+import threading
+
+_config = None
+_client = None
+_lock = threading.Lock()
+
+
+def init(useragent, version, hostname=None):
+    """Set configuration that is applied when the client is first used.
+
+    Args:
+        useragent: Name of the application in the User-Agent header.
+        version: Version of the application in the User-Agent header.
+        hostname: MusicBrainz server to use instead of musicbrainz.org.
+    """
+    global _config, _client
+    _config = (useragent, version, hostname)
+    _client = None
+
+
+def get_client():
+    """Get the configured musicbrainzngs module."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import musicbrainzngs
+                useragent, version, hostname = _config
+                musicbrainzngs.set_useragent(useragent, version)
+                if hostname:
+                    musicbrainzngs.set_hostname(hostname)
+                _client = musicbrainzngs
+    return _client
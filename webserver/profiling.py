@@ -0,0 +1,250 @@
+"""
+Profiling of individual requests.
+
+Profiling is turned on for a request with the X-Profile header or the
+`_profile` query parameter. Its value must be either "1" if the request comes
+from a logged in admin, or a token generated with `manage.py profile_token`
+(for clients that use API keys or are not logged in). Profiler is selected with
+the X-Profile-Mode header or `_profile_mode` parameter:
+* "sampling" (default) records stacks of the request thread every
+  PROFILING_SAMPLING_INTERVAL seconds. Result is written in the collapsed stack
+  format that flamegraph.pl (https://github.com/brendangregg/FlameGraph) and
+  speedscope (https://www.speedscope.app/) accept.
+* "cprofile" uses cProfile. Result is written as a pstats file.
+
+Results are stored in the "profiles" subdirectory of FILE_STORAGE_DIR together
+with a JSON file that describes the request and lists SQL statements that it
+ran. ID of the profile is returned in the X-Profile-Id header.
+
+If PROFILING_SAMPLE_RATE is above 0, that fraction of all requests is profiled
+with the sampling profiler, which is cheap enough to run in production.
+"""
+from __future__ import division
+from collections import Counter
+from datetime import datetime
+from flask import request, current_app
+from flask_login import current_user
+from itsdangerous import URLSafeTimedSerializer, BadData
+from webserver import query_timing
+from six.moves.urllib.parse import urlencode
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import db
+
+TOKEN_SALT = "profiling"
+PROFILES_DIR = "profiles"
+MODE_SAMPLING = "sampling"
+MODE_CPROFILE = "cprofile"
+# Query parameters that request profiling
+QUERY_ARGS = ("_profile", "_profile_mode")
+
+_local = threading.local()
+# cProfile can't run in multiple threads at the same time
+_cprofile_lock = threading.Lock()
+
+
+class SamplingProfiler(object):
+    """Records stacks of a thread at a fixed interval from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("%s:%s:%d" % (code.co_filename, code.co_name, code.co_firstlineno))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        path += ".folded"
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("%s %d\n" % (stack, count))
+        return path
+
+
+class CProfiler(object):
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        _cprofile_lock.release()
+
+    def write(self, path):
+        path += ".prof"
+        self._profile.dump_stats(path)
+        return path
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=TOKEN_SALT)
+
+
+def generate_token():
+    """Generate a token that allows to profile requests.
+
+    Tokens expire after PROFILING_TOKEN_MAX_AGE seconds.
+    """
+    return _serializer().dumps("profile")
+
+
+def _is_allowed(value):
+    if value == "1":
+        return current_user.is_authenticated and current_user.admin
+    try:
+        _serializer().loads(value, max_age=current_app.config["PROFILING_TOKEN_MAX_AGE"])
+    except BadData:
+        return False
+    return True
+
+
+def get_directory():
+    return os.path.join(current_app.config["FILE_STORAGE_DIR"], PROFILES_DIR)
+
+
+def get_profiles(limit=100):
+    """Get descriptions of stored profiles, newest first."""
+    directory = get_directory()
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((n for n in os.listdir(directory) if n.endswith(".json")), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        with open(os.path.join(directory, name)) as f:
+            profiles.append(json.load(f))
+    return profiles
+
+
+def init_app(app):
+    if not app.config["PROFILING_ENABLED"]:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    query_timing.subscribe(_on_statement)
+    if db.engine is not None:
+        query_timing.attach(db.engine)
+
+
+def _requested_mode():
+    value = request.headers.get("X-Profile") or request.args.get("_profile")
+    if value is not None:
+        if not _is_allowed(value):
+            return None
+        return request.headers.get("X-Profile-Mode") or request.args.get("_profile_mode", MODE_SAMPLING)
+    sample_rate = current_app.config["PROFILING_SAMPLE_RATE"]
+    if sample_rate and random.random() < sample_rate:
+        return MODE_SAMPLING
+    return None
+
+
+def _before_request():
+    _local.profile = None
+    mode = _requested_mode()
+    if mode is None:
+        return
+    if mode == MODE_CPROFILE and _cprofile_lock.acquire(False):
+        profiler = CProfiler()
+    else:
+        mode = MODE_SAMPLING
+        profiler = SamplingProfiler(threading.current_thread().ident,
+                                    current_app.config["PROFILING_SAMPLING_INTERVAL"])
+    _local.profile = {
+        "id": "%s-%s" % (datetime.utcnow().strftime("%Y%m%d-%H%M%S"), uuid.uuid4().hex[:8]),
+        "mode": mode,
+        "method": request.method,
+        "url": _profiled_url(),
+        "endpoint": request.endpoint,
+        "started": time.time(),
+        "sql": [],
+        "profiler": profiler,
+    }
+    profiler.start()
+
+
+def _profiled_url():
+    """URL of the current request without the profiling token, which could be
+    reused by anyone who can read the profile.
+    """
+    args = [(k.encode("utf-8"), v.encode("utf-8"))
+            for k, v in request.args.items(multi=True) if k not in QUERY_ARGS]
+    if not args:
+        return request.base_url
+    return "%s?%s" % (request.base_url, urlencode(args))
+
+
+def _after_request(response):
+    profile = getattr(_local, "profile", None)
+    if profile is not None:
+        response.headers["X-Profile-Id"] = profile["id"]
+        profile["status"] = response.status_code
+    return response
+
+
+def _teardown_request(exception):
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return
+    _local.profile = None
+    profiler = profile.pop("profiler")
+    profiler.stop()
+    profile["duration"] = time.time() - profile["started"]
+
+    directory = get_directory()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, profile["id"])
+    profile["file"] = os.path.basename(profiler.write(path))
+    with open(path + ".json", "w") as f:
+        json.dump(profile, f)
+    _remove_old_profiles(directory, current_app.config["PROFILING_MAX_PROFILES"])
+
+
+def _remove_old_profiles(directory, keep):
+    """Keep only `keep` newest profiles (IDs start with a timestamp)."""
+    files = {}
+    for name in os.listdir(directory):
+        files.setdefault(name.split(".")[0], []).append(name)
+    for profile_id in sorted(files, reverse=True)[keep:]:
+        for name in files[profile_id]:
+            os.remove(os.path.join(directory, name))
+
+
+def _on_statement(statement, parameters, executemany, start, duration):
+    profile = getattr(_local, "profile", None)
+    if profile is not None:
+        profile["sql"].append({
+            "statement": statement,
+            "started": start - profile["started"],
+            "duration": duration,
+        })
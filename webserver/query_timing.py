@@ -0,0 +1,47 @@
+"""
+Timing of SQL statements.
+
+A single pair of listeners on the engine measures how long each statement
+takes. Everything that needs these durations (metrics, profiling and the slow
+query log) subscribes to them with `subscribe`, so every statement is timed
+only once no matter how many of them are enabled.
+
+Subscribers are called after each statement with the statement, its
+parameters, `executemany` flag, time when it started and its duration (in
+seconds). They run in the thread that executed the statement.
+"""
+from sqlalchemy import event
+import time
+
+_subscribers = []
+
+
+def attach(engine):
+    """Start timing statements that are executed by an engine."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def subscribe(callback):
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_timing_start", []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_timing_start")
+    if not starts:
+        return  # listeners were attached while the statement was running
+    start = starts.pop()
+    duration = time.time() - start
+    for callback in _subscribers:
+        callback(statement, parameters, executemany, start, duration)
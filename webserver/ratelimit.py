@@ -0,0 +1,250 @@
+"""
+Rate limiting for API endpoints.
+
+Limits are enforced using the token bucket algorithm. Every client gets a
+separate bucket for each endpoint. Bucket holds up to `rate` tokens and is
+refilled at the speed of `rate` tokens per `per` seconds. Each request takes
+one token from the bucket. Requests that find the bucket empty are rejected.
+
+Buckets are kept in a backend:
+* `LocalBackend` keeps them in memory of the current process. This is enough
+  when the server runs in a single process.
+* `MemcachedBackend` keeps them in memcached, so that limits are shared between
+  all worker processes and servers.
+
+Clients are identified by their API key if the request is authenticated with
+one, by user ID if it is authenticated with a session, and by IP address
+otherwise.
+"""
+from __future__ import division
+from collections import OrderedDict
+from flask import request
+from flask_login import current_user
+from webserver.views.api import exceptions as api_exceptions
+import math
+import threading
+import time
+
+_limiter = None
+
+
+class LocalBackend(object):
+    """Backend that stores buckets in memory of the current process."""
+
+    def __init__(self, max_buckets=100000):
+        """Create new backend.
+
+        Args:
+            max_buckets: Maximum number of buckets kept in memory. When there
+                are more, buckets that haven't been used for the longest time
+                are removed. They are usually full, and a full bucket is
+                equivalent to a missing one.
+        """
+        self.max_buckets = max_buckets
+        # Buckets in order of their last use
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, per, now):
+        """Take one token from a bucket.
+
+        Returns:
+            Tuple with two values: True if the token has been taken (False if
+            bucket is empty), and number of tokens left in the bucket.
+        """
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None:
+                tokens = rate
+            else:
+                tokens = min(rate, bucket[0] + (now - bucket[1]) * rate / per)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def reset(self):
+        with self._lock:
+            self._buckets = OrderedDict()
+
+
+class MemcachedBackend(object):
+    """Backend that stores buckets in memcached.
+
+    Buckets are updated using compare-and-swap, so concurrent requests from
+    the same client are counted correctly. If memcached is unavailable or
+    contention is too high, requests are allowed.
+    """
+
+    def __init__(self, servers, namespace, max_retries=5):
+        import memcache
+        self.namespace = namespace
+        self.max_retries = max_retries
+        self._client = memcache.Client(servers, cache_cas=True)
+
+    def consume(self, key, rate, per, now):
+        key = str("%s:ratelimit:%s" % (self.namespace, key))
+        expire = int(math.ceil(per)) + 1  # expired bucket is a full bucket
+        for _ in range(self.max_retries):
+            value = self._client.gets(key)
+            if value is None:
+                tokens = rate - 1
+                if self._client.add(key, _pack(tokens, now), time=expire):
+                    return True, tokens
+                continue
+            tokens, last = _unpack(value)
+            tokens = min(rate, tokens + (now - last) * rate / per)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if self._client.cas(key, _pack(tokens, now), time=expire):
+                return allowed, tokens
+        return True, 0
+
+    def reset(self):
+        self._client.disconnect_all()
+        self._client.reset_cas()
+
+
+def _pack(tokens, last):
+    return "%r:%r" % (tokens, last)
+
+
+def _unpack(value):
+    tokens, last = value.split(":")
+    return float(tokens), float(last)
+
+
+class RateLimit(object):
+    """Result of a rate limit check."""
+    __slots__ = ("allowed", "limit", "remaining", "reset", "retry_after")
+
+    def __init__(self, allowed, limit, remaining, reset, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+class RateLimiter(object):
+
+    def __init__(self, backend, default_limit, endpoint_limits=None, key_limits=None):
+        """Create new rate limiter.
+
+        Limits are (rate, per) tuples that allow `rate` requests per `per`
+        seconds.
+
+        Args:
+            backend: Backend that stores the buckets.
+            default_limit: Limit for endpoints that don't have their own.
+            endpoint_limits: Dictionary that maps endpoint names to limits.
+                These override limits defined in the code.
+            key_limits: Dictionary that maps API keys to limits. These
+                override all other limits.
+        """
+        self.backend = backend
+        self.default_limit = default_limit
+        self.endpoint_limits = endpoint_limits or {}
+        self.key_limits = key_limits or {}
+
+    def hit(self, endpoint, client, api_key=None, limit=None):
+        """Register a request from a client to an endpoint.
+
+        Args:
+            endpoint: Name of the endpoint.
+            client: String that identifies the client.
+            api_key: API key that the request has been authenticated with.
+            limit: Limit defined for the endpoint in the code.
+
+        Returns:
+            RateLimit object.
+        """
+        if api_key is not None and api_key in self.key_limits:
+            rate, per = self.key_limits[api_key]
+        elif endpoint in self.endpoint_limits:
+            rate, per = self.endpoint_limits[endpoint]
+        else:
+            rate, per = limit or self.default_limit
+        now = time.time()
+        allowed, tokens = self.backend.consume("%s:%s" % (endpoint, client), rate, per, now)
+        return RateLimit(
+            allowed=allowed,
+            limit=rate,
+            remaining=int(tokens),
+            reset=int(math.ceil(now + (rate - tokens) * per / rate)),
+            retry_after=0 if allowed else int(math.ceil((1 - tokens) * per / rate)),
+        )
+
+
+def init(app):
+    global _limiter
+    if not app.config["RATELIMIT_ENABLED"]:
+        _limiter = None
+        return
+    if app.config["RATELIMIT_BACKEND"] == "memcached":
+        backend = MemcachedBackend(app.config["MEMCACHED_SERVERS"], app.config["MEMCACHED_NAMESPACE"])
+    else:
+        backend = LocalBackend()
+    _limiter = RateLimiter(
+        backend,
+        default_limit=app.config["RATELIMIT_DEFAULT"],
+        endpoint_limits=app.config["RATELIMIT_ENDPOINTS"],
+        key_limits=app.config["RATELIMIT_KEYS"],
+    )
+
+
+def reset():
+    """Close connections that the backend holds.
+
+    Must be called in a child process after fork.
+    """
+    if _limiter is not None:
+        _limiter.backend.reset()
+
+
+def check(limit=None):
+    """Check if current request is within the rate limit.
+
+    Args:
+        limit: (rate, per) tuple defined for the endpoint in the code.
+
+    Returns:
+        RateLimit object, or None if rate limiting is disabled.
+
+    Raises:
+        APITooManyRequests: Client has exceeded the limit.
+    """
+    if _limiter is None:
+        return None
+    api_key = None
+    if current_user.is_authenticated:
+        parts = request.headers.get("Authorization", "").split(" ")
+        if len(parts) == 2 and parts[0] == "Token":
+            api_key = parts[1]
+            client = "key:%s" % api_key
+        else:
+            client = "user:%s" % current_user.id
+    else:
+        client = "ip:%s" % request.remote_addr
+    result = _limiter.hit(request.endpoint, client, api_key, limit)
+    if not result.allowed:
+        raise api_exceptions.APITooManyRequests(
+            "Rate limit exceeded. Try again in %s seconds." % result.retry_after,
+            headers=result.headers,
+        )
+    return result
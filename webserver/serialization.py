@@ -0,0 +1,132 @@
+"""
+JSON serialization of API responses.
+
+Responses are encoded with the fastest encoder that is available:
+* orjson (https://github.com/ijl/orjson) if it's installed,
+* `json` module from the standard library otherwise.
+
+Encoder can also be selected with the JSON_ENCODER config value, and new ones
+can be added with `register_encoder`. All encoders produce compact output
+(no indentation or extra whitespace) and return bytes that are used as the
+response body as is.
+
+Values that JSON doesn't support are converted the same way as Flask does it:
+UUIDs become strings and datetimes become HTTP dates. Sets are converted to
+lists, so collections of recording MBIDs don't need to be copied into a list
+before serialization.
+"""
+from datetime import date, datetime
+from flask import current_app
+from werkzeug.http import http_date
+import json
+import uuid
+
+DEFAULT_ENCODER = "auto"
+MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+_encoders = {}
+_priority = []
+
+
+def _default(obj):
+    """Converts values that are not supported by JSON."""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return http_date(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError("%r is not JSON serializable" % obj)
+
+
+def register_encoder(name, encode, priority=0):
+    """Add new encoder.
+
+    Args:
+        name: Name of the encoder that can be used in the JSON_ENCODER config
+            value.
+        encode: Function that takes an object and returns its JSON
+            representation as bytes. It must support values that are handled
+            by `_default` (it can be passed as the `default` argument to most
+            JSON libraries).
+        priority: Encoders with higher priority are preferred when encoder
+            is selected automatically.
+    """
+    _encoders[name] = encode
+    _priority.append((priority, name))
+    _priority.sort(reverse=True)
+
+
+_stdlib_encoder = json.JSONEncoder(separators=(",", ":"), default=_default)
+
+
+def _encode_stdlib(obj):
+    return _stdlib_encoder.encode(obj).encode("utf-8")
+
+
+register_encoder("json", _encode_stdlib, priority=0)
+
+try:
+    import orjson
+
+    def _encode_orjson(obj):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+    register_encoder("orjson", _encode_orjson, priority=10)
+except ImportError:
+    pass
+
+
+def get_encoder(name=DEFAULT_ENCODER):
+    """Get encoding function by name.
+
+    Args:
+        name: Name of the encoder, or "auto" to get the fastest one.
+    """
+    if name == "auto":
+        return _encoders[_priority[0][1]]
+    return _encoders[name]
+
+
+def dumps(obj, encoder=None):
+    """Serialize an object to JSON.
+
+    Args:
+        obj: Object to serialize.
+        encoder: Name of the encoder. If not specified, JSON_ENCODER config
+            value of the current app is used.
+
+    Returns:
+        JSON as bytes.
+    """
+    if encoder is None:
+        encoder = current_app.config.get("JSON_ENCODER", DEFAULT_ENCODER)
+    return get_encoder(encoder)(obj)
+
+
+def json_response(obj, status=200, headers=None):
+    """Create a response with a JSON representation of an object.
+
+    Unlike `flask.jsonify`, this function accepts any serializable object,
+    not only dictionaries.
+    """
+    return current_app.response_class(dumps(obj), status=status, headers=headers,
+                                      mimetype=MIMETYPE)
+
+
+def ndjson_response(objects, status=200, headers=None):
+    """Create a streamed response with newline-delimited JSON.
+
+    Each object from the iterable is serialized on its own line as it is
+    sent, so the whole response is never held in memory.
+    """
+    encode = get_encoder(current_app.config.get("JSON_ENCODER", DEFAULT_ENCODER))
+
+    def generate():
+        for obj in objects:
+            yield encode(obj) + b"\n"
+    return current_app.response_class(generate(), status=status, headers=headers,
+                                      mimetype=NDJSON_MIMETYPE)
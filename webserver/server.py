@@ -0,0 +1,78 @@
+"""
+Production web server.
+
+Runs the application in a pool of pre-forked worker processes managed by
+Gunicorn (http://gunicorn.org/). Application is created once in the master
+process and inherited by workers. Everything that can't be shared between
+processes (database connections, memcached sockets, HTTP sessions, background
+threads) is reset in each worker right after fork.
+"""
+from gunicorn.app.base import BaseApplication
+from webserver import metrics
+import tempfile
+
+
+class Server(BaseApplication):
+
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super(Server, self).__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def run(app, host, port, workers, threads=1, max_requests=0,
+        max_requests_jitter=0, timeout=30, graceful_timeout=30):
+    """Start the server and block until it's stopped.
+
+    Server stops gracefully on SIGTERM or SIGINT: workers finish requests
+    that they are processing and exit.
+
+    Args:
+        app: Flask application.
+        host: Address to listen on.
+        port: Port to listen on.
+        workers: Number of worker processes.
+        threads: Number of threads in each worker process. More than one
+            thread uses the gthread worker, which needs the `futures`
+            package on Python 2.
+        max_requests: Number of requests after which a worker is restarted.
+            0 disables restarts.
+        max_requests_jitter: Maximum random number added to `max_requests`,
+            so that workers don't restart at the same time.
+        timeout: Number of seconds after which a silent worker is killed.
+        graceful_timeout: Number of seconds that workers have to finish
+            processing requests when restarted or stopped.
+    """
+    metrics.set_directory(app.config["METRICS_DIR"] or tempfile.mkdtemp(prefix="ab-metrics-"),
+                          clear=True)
+    Server(app, {
+        "bind": "%s:%s" % (host, port),
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests_jitter,
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "preload_app": True,
+        "post_fork": _post_fork,
+        "worker_exit": _worker_exit,
+    }).run()
+
+
+def _post_fork(server, worker):
+    from webserver import after_fork
+    after_fork()
+
+
+def _worker_exit(server, worker):
+    from webserver import api_key_usage
+    api_key_usage.flush()
+    metrics.flush()
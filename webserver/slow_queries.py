@@ -0,0 +1,202 @@
+"""
+Log of slow SQL queries.
+
+Every statement that takes longer than SLOW_QUERY_THRESHOLD seconds is
+recorded together with:
+* its parameters, with strings replaced by placeholders, so that no user data
+  ends up in the log,
+* the function in the `db` package that ran it,
+* the endpoint of the request that it's a part of.
+
+Records are kept in a ring buffer of SLOW_QUERY_BUFFER_SIZE latest queries in
+each process (see /admin/slow-queries) and written into the log as JSON.
+
+A fraction of slow SELECT statements (SLOW_QUERY_EXPLAIN_RATE) is executed
+again with EXPLAIN (ANALYZE, BUFFERS) in a background thread, so that the plan
+of the query can be inspected. This runs the query one more time, so the rate
+should be kept low.
+"""
+from __future__ import division
+from collections import deque
+from datetime import datetime
+from flask import request, has_request_context
+from webserver import query_timing
+import logging
+import json
+import numbers
+import os
+import random
+import sys
+import threading
+import db
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+DB_PACKAGE_DIR = os.path.dirname(os.path.realpath(db.__file__))
+EXPLAIN_QUEUE_SIZE = 10
+
+_recorder = None
+
+
+class SlowQueryRecorder(object):
+
+    def __init__(self, threshold, buffer_size=100, explain_rate=0, explain_timeout=30):
+        """Create new recorder.
+
+        Args:
+            threshold: Duration of a query (in seconds) above which it's
+                recorded.
+            buffer_size: Number of latest slow queries that are kept.
+            explain_rate: Fraction of slow SELECT statements that are
+                explained.
+            explain_timeout: Maximum time (in seconds) for EXPLAIN ANALYZE.
+        """
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self.explain_timeout = explain_timeout
+        self.queries = deque(maxlen=buffer_size)
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        query_timing.attach(engine)
+        query_timing.subscribe(self._on_statement)
+
+    def detach(self):
+        query_timing.unsubscribe(self._on_statement)
+
+    def _on_statement(self, statement, parameters, executemany, start, duration):
+        if duration >= self.threshold:
+            self.record(statement, parameters, duration, executemany)
+
+    def record(self, statement, parameters, duration, executemany=False):
+        query = {
+            "time": datetime.utcnow().isoformat(),
+            "duration": round(duration, 6),
+            "statement": statement,
+            "parameters": redact(parameters),
+            "executemany": executemany,
+            "caller": _find_caller(),
+            "endpoint": request.endpoint if has_request_context() else None,
+            "explain": None,
+        }
+        self.queries.append(query)
+        logger.warning("Slow query: %s", json.dumps(query, default=str))
+        if not executemany and _is_explainable(statement) and \
+                self.explain_rate and random.random() < self.explain_rate:
+            self._enqueue_explain(query, parameters)
+
+    def _enqueue_explain(self, query, parameters):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait((query, parameters))
+        except queue.Full:
+            pass  # already explaining enough queries
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(EXPLAIN_QUEUE_SIZE)
+            thread = threading.Thread(target=self._run, args=(self._queue,), name="slow-query-explain")
+            thread.daemon = True
+            thread.start()
+
+    def _run(self, explain_queue):
+        while True:
+            query, parameters = explain_queue.get()
+            try:
+                query["explain"] = self.explain(query["statement"], parameters)
+                logger.warning("Plan of a slow query: %s", json.dumps({
+                    "time": query["time"],
+                    "statement": query["statement"],
+                    "explain": query["explain"],
+                }))
+            except Exception as e:
+                logger.error("Failed to explain a slow query: %s", e)
+
+    def explain(self, statement, parameters):
+        """Run EXPLAIN (ANALYZE, BUFFERS) on a statement.
+
+        Statement is executed in a transaction that is rolled back. A raw DBAPI
+        connection is used, so this query doesn't pass through the recorder.
+
+        Returns:
+            Plan as text.
+        """
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SET LOCAL statement_timeout = %s", (int(self.explain_timeout * 1000),))
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            connection.rollback()
+            connection.close()
+
+
+def _is_explainable(statement):
+    """Check if a statement can be safely run again with EXPLAIN ANALYZE."""
+    normalized = " ".join(statement.split()).upper()
+    return normalized.startswith("SELECT ") and " FOR UPDATE" not in normalized and \
+        " FOR SHARE" not in normalized
+
+
+def redact(parameters):
+    """Replace strings in query parameters with placeholders.
+
+    Numbers, booleans and NULLs are kept, since they are useful for
+    reproducing queries and don't contain user data.
+    """
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if len(parameters) > 10:
+            return "<%d values>" % len(parameters)
+        return [redact(value) for value in parameters]
+    if parameters is None or isinstance(parameters, numbers.Number):
+        return parameters
+    return "<%s>" % type(parameters).__name__
+
+
+def _find_caller():
+    """Find the function in the `db` package that is running the query."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.realpath(frame.f_code.co_filename)
+        if filename.startswith(DB_PACKAGE_DIR + os.sep):
+            return "%s.%s:%d" % (frame.f_globals.get("__name__"), frame.f_code.co_name, frame.f_lineno)
+        frame = frame.f_back
+    return None
+
+
+def init_app(app):
+    global _recorder
+    if _recorder is not None:
+        _recorder.detach()
+    _recorder = None
+    if app.config["SLOW_QUERY_THRESHOLD"] is None:
+        return
+    _recorder = SlowQueryRecorder(
+        threshold=app.config["SLOW_QUERY_THRESHOLD"],
+        buffer_size=app.config["SLOW_QUERY_BUFFER_SIZE"],
+        explain_rate=app.config["SLOW_QUERY_EXPLAIN_RATE"],
+        explain_timeout=app.config["SLOW_QUERY_EXPLAIN_TIMEOUT"],
+    )
+    if db.engine is not None:
+        _recorder.attach(db.engine)
+
+
+def get_queries():
+    """Get slow queries recorded in the current process, newest first."""
+    if _recorder is None:
+        return []
+    return list(reversed(_recorder.queries))
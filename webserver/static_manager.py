@@ -1,19 +1,93 @@
 import os.path
 import json
 
-MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "static", "build", "rev-manifest.json")
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BUILD_DIR = os.path.join(STATIC_DIR, "build")
+MANIFEST_PATH = os.path.join(BUILD_DIR, "rev-manifest.json")
 
-manifest_content = {}
+# Extensions of precompressed files with their content encodings, in order of
+# preference
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+# Only text files are worth compressing, other formats are already compressed
+COMPRESSIBLE_EXTENSIONS = (".js", ".css", ".map", ".svg", ".json", ".txt", ".ttf", ".eot")
+
+manifest_content = None
+# Revisioned file names from the manifest. Their content never changes.
+_revisioned = frozenset()
+# Memoized results of `get_static_path`
+_paths = {}
 
 
 def read_manifest():
+    global manifest_content, _revisioned, _paths
     if os.path.isfile(MANIFEST_PATH):
         with open(MANIFEST_PATH) as manifest_file:
-            global manifest_content
-            manifest_content = json.load(manifest_file)
+            content = json.load(manifest_file)
+    else:
+        content = {}
+    _paths = {}
+    _revisioned = frozenset(content.values())
+    manifest_content = content
 
 
 def get_static_path(resource_name):
+    try:
+        return _paths[resource_name]
+    except KeyError:
+        pass
+    if manifest_content is None:
+        # Manifest is read when the first page is rendered, not on startup
+        read_manifest()
     if resource_name not in manifest_content:
-        return "/static/%s" % resource_name
-    return "/static/build/%s" % manifest_content[resource_name]
+        path = "/static/%s" % resource_name
+    else:
+        path = "/static/build/%s" % manifest_content[resource_name]
+    _paths[resource_name] = path
+    return path
+
+
+def is_revisioned(filename):
+    """Check if a file in the build directory is a revisioned one.
+
+    Names of revisioned files contain a hash of their content, so they can be
+    cached forever.
+    """
+    if manifest_content is None:
+        read_manifest()
+    return filename in _revisioned
+
+
+def compress_build(compress, encodings, level=9):
+    """Create precompressed copies of files in the build directory.
+
+    Args:
+        compress: Function that takes data, encoding and compression level and
+            returns compressed data (see `webserver.compression.compress`).
+        encodings: Names of encodings to create files for.
+        level: Compression level. Files are compressed once, so it's the
+            highest one by default.
+
+    Returns:
+        List of created files.
+    """
+    created = []
+    extensions = dict(PRECOMPRESSED)
+    for root, _, filenames in os.walk(BUILD_DIR):
+        for filename in filenames:
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            with open(path, "rb") as f:
+                data = f.read()
+            for encoding in encodings:
+                compressed_path = path + extensions[encoding]
+                if os.path.exists(compressed_path) and \
+                        os.path.getmtime(compressed_path) >= os.path.getmtime(path):
+                    continue
+                compressed = compress(data, encoding, min(level, 11 if encoding == "br" else 9))
+                if len(compressed) >= len(data):
+                    continue
+                with open(compressed_path, "wb") as f:
+                    f.write(compressed)
+                created.append(compressed_path)
+    return created
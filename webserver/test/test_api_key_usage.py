@@ -0,0 +1,49 @@
+from webserver.api_key_usage import UsageTracker
+import unittest
+import mock
+
+
+class UsageTrackerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Large interval and threshold to make sure that background thread
+        # doesn't flush anything while the test is running.
+        self.tracker = UsageTracker(flush_interval=3600, flush_threshold=1000)
+
+    @mock.patch("db.api_key.record_usage")
+    def test_flush(self, record_usage):
+        self.tracker.record("key_1")
+        self.tracker.record("key_1")
+        self.tracker.record("key_2")
+        self.tracker.flush()
+
+        record_usage.assert_called_once_with(mock.ANY)
+        usage = record_usage.call_args[0][0]
+        self.assertEqual(usage["key_1"][0], 2)
+        self.assertEqual(usage["key_2"][0], 1)
+
+        # Nothing to write after a flush
+        record_usage.reset_mock()
+        self.tracker.flush()
+        self.assertFalse(record_usage.called)
+
+    @mock.patch("db.api_key.record_usage")
+    def test_flush_failure(self, record_usage):
+        record_usage.side_effect = Exception("Database is down")
+        self.tracker.record("key_1")
+        self.tracker.flush()
+        self.tracker.record("key_1")
+
+        # Counts from the failed flush must be written with the next one
+        record_usage.side_effect = None
+        self.tracker.flush()
+        usage = record_usage.call_args[0][0]
+        self.assertEqual(usage["key_1"][0], 2)
+
+    def test_threshold(self):
+        self.tracker.flush_threshold = 2
+        self.tracker.record("key_1")
+        self.assertFalse(self.tracker._wakeup.is_set())
+        with mock.patch.object(self.tracker, "_wakeup") as wakeup:
+            self.tracker.record("key_1")
+            wakeup.set.assert_called_once_with()
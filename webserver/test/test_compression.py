@@ -0,0 +1,84 @@
+from flask import Flask, Response
+from webserver import compression
+from db import cache
+import default_config
+import gzip
+import io
+import mock
+import unittest
+
+
+class CompressionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config.from_object(default_config)
+        app.config["COMPRESSION_ENCODINGS"] = ["gzip"]
+        compression.init_app(app)
+        self.body = b'{"recordings": ["' + b'770cc467-8dde-4d22-bc4c-a42f91e1a1d4", "' * 1000 + b'"]}'
+
+        @app.route("/large")
+        def large():
+            return Response(self.body, mimetype="application/json")
+
+        @app.route("/small")
+        def small():
+            return Response(b"{}", mimetype="application/json")
+
+        @app.route("/stream")
+        def stream():
+            return Response((self.body for _ in range(3)), mimetype="application/json")
+
+        @app.route("/cached")
+        def cached():
+            return compression.set_cache_key(Response(self.body, mimetype="application/json"), "test:1")
+
+        @app.route("/image")
+        def image():
+            return Response(self.body, mimetype="image/png")
+
+        self.client = app.test_client()
+
+    def _decompress(self, data):
+        return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+    def test_compressed(self):
+        resp = self.client.get("/large", headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertLess(len(resp.data), len(self.body))
+        self.assertEqual(self._decompress(resp.data), self.body)
+
+    def test_not_accepted(self):
+        resp = self.client.get("/large")
+        self.assertNotIn("Content-Encoding", resp.headers)
+        self.assertEqual(resp.data, self.body)
+
+        resp = self.client.get("/large", headers={"Accept-Encoding": "gzip;q=0, br"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_small(self):
+        resp = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_mimetype(self):
+        resp = self.client.get("/image", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_streamed(self):
+        resp = self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertEqual(self._decompress(resp.data), self.body * 3)
+
+    def test_compress(self):
+        for encoding in compression._compressors:
+            self.assertLess(len(compression.compress(self.body, encoding, 1)), len(self.body))
+
+    def test_cached(self):
+        cache.init([])
+        with mock.patch("webserver.compression.compress", wraps=compression.compress) as compress:
+            first = self.client.get("/cached", headers={"Accept-Encoding": "gzip"})
+            second = self.client.get("/cached", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second.headers["Content-Encoding"], "gzip")
@@ -0,0 +1,116 @@
+from db.testing import DatabaseTestCase
+from webserver import jobs
+from utils import dataset_validator
+from db import cache
+import db.dataset
+import db.job
+import db.user
+import threading
+import mock
+
+
+class JobsTestCase(DatabaseTestCase):
+
+    def setUp(self):
+        super(JobsTestCase, self).setUp()
+        cache.init([])
+        self.user_id = db.user.create("fuzzy_dunlop")
+        self.calls = []
+        jobs.handler("test")(self.handle)
+        self.addCleanup(jobs._handlers.pop, "test")
+
+    def handle(self, job):
+        self.calls.append(job.payload)
+        if job.payload.get("error") == "invalid":
+            raise dataset_validator.ValidationException("invalid")
+        if job.payload.get("error"):
+            raise ValueError(job.payload["error"])
+        if job.payload.get("cancel"):
+            job.cancel_requested = True
+            job.progress(0.5)
+        return {"ok": True}
+
+    def run_once(self):
+        row = db.job.claim()
+        jobs.run_job(jobs.Job(**row))
+
+    def test_run_job(self):
+        job_id = db.job.create("test", {"a": 1})
+        self.run_once()
+        self.assertEqual(self.calls, [{"a": 1}])
+        job = db.job.get(job_id)
+        self.assertEqual(job["status"], db.job.STATUS_DONE)
+        self.assertEqual(job["result"], {"ok": True})
+
+    def test_run_job_error(self):
+        job_id = db.job.create("test", {"error": "oops"}, max_attempts=2)
+        self.run_once()
+        job = db.job.get(job_id)
+        self.assertEqual(job["status"], db.job.STATUS_PENDING)
+        self.assertEqual(job["error"], "Internal error.")
+
+    def test_run_job_permanent_error(self):
+        job_id = db.job.create("test", {"error": "invalid"}, max_attempts=2)
+        self.run_once()
+        self.assertEqual(db.job.get(job_id)["status"], db.job.STATUS_FAILED)
+
+    def test_run_job_cancelled(self):
+        job_id = db.job.create("test", {"cancel": True})
+        self.run_once()
+        self.assertEqual(db.job.get(job_id)["status"], db.job.STATUS_CANCELLED)
+
+    def test_work(self):
+        stop = threading.Event()
+        unknown_id = db.job.create("unknown", {})
+        db.job.create("test", {"a": 1})
+
+        def handle(job):
+            stop.set()
+            return self.handle(job)
+        jobs.handler("test")(handle)
+        jobs.work(stop, poll_interval=0)
+        self.assertEqual(self.calls, [{"a": 1}])
+        self.assertEqual(db.job.get(unknown_id)["status"], db.job.STATUS_FAILED)
+
+    def test_create_dataset(self):
+        job_id = db.job.create("create_dataset", {"dataset": {
+            "name": "Test",
+            "public": True,
+            "classes": [{"name": "A", "recordings": ["0dad432b-16cc-4bf0-8961-fd31d124b01b"]}],
+        }}, owner=self.user_id)
+        self.run_once()
+        job = db.job.get(job_id)
+        self.assertEqual(job["status"], db.job.STATUS_DONE)
+        dataset = db.dataset.get(job["result"]["dataset_id"])
+        self.assertEqual(dataset["author"], self.user_id)
+        self.assertEqual(dataset["classes"][0]["recordings"], ["0dad432b-16cc-4bf0-8961-fd31d124b01b"])
+
+    def test_create_dataset_again(self):
+        job_id = db.job.create("create_dataset", {"dataset": {
+            "name": "Test",
+            "public": True,
+            "classes": [],
+        }}, owner=self.user_id, max_attempts=2)
+        row = db.job.claim()
+        job = jobs.Job(**row)
+        result = jobs.create_dataset(job)
+        # Worker stopped before finishing the job, which is run again
+        self.assertEqual(jobs.create_dataset(job), result)
+        self.assertEqual(len(db.dataset.get_by_user_id(self.user_id)), 1)
+        self.assertEqual(db.job.get(job_id)["result"], result)
+
+    def test_create_dataset_concurrently(self):
+        job_id = db.job.create("create_dataset", {"dataset": {
+            "name": "Test",
+            "public": True,
+            "classes": [],
+        }}, owner=self.user_id, max_attempts=2)
+        first = jobs.Job(**db.job.claim())
+        # Heartbeat of the first attempt went stale and another worker took the job
+        second = jobs.Job(**db.job.claim(stale_after=-1))
+        result = jobs.create_dataset(second)
+
+        # First attempt didn't see the result of the second one when it started
+        with mock.patch("db.job.get_result", side_effect=[None, result]):
+            self.assertEqual(jobs.create_dataset(first), result)
+        self.assertEqual(len(db.dataset.get_by_user_id(self.user_id)), 1)
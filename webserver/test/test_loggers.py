@@ -0,0 +1,170 @@
+from flask import Flask
+from six.moves import socketserver
+from webserver import loggers
+import default_config
+import threading
+import tempfile
+import logging
+import shutil
+import socket
+import json
+import mock
+import os
+import unittest
+
+
+class FakeSMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Minimal SMTP server that keeps received messages in memory."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        socketserver.TCPServer.__init__(self, ("127.0.0.1", 0), _SMTPHandler)
+        self.messages = []
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self._reply("220 localhost")
+        while True:
+            line = self.rfile.readline().decode("utf-8").strip()
+            command = line[:4].upper()
+            if not line or command == "QUIT":
+                self._reply("221 Bye")
+                return
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    line = self.rfile.readline().decode("utf-8")
+                    if line.rstrip("\r\n") == ".":
+                        break
+                    data.append(line)
+                self.server.messages.append("".join(data))
+                self._reply("250 OK")
+            else:
+                self._reply("250 OK")
+
+
+class LoggersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.smtp = FakeSMTPServer()
+        self.smtp.start()
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        loggers.stop_listeners()
+        del loggers._listeners[:]
+        self.smtp.stop()
+        shutil.rmtree(self.log_dir)
+
+    def create_app(self, **config):
+        app = Flask("webserver_test_%s" % self.id())
+        app.config.from_object(default_config)
+        app.config.update(
+            LOG_FILE=os.path.join(self.log_dir, "test.log"),
+            SMTP_SERVER="127.0.0.1",
+            SMTP_PORT=self.smtp.port,
+            LOG_EMAIL_RECIPIENTS=["admin@example.org"],
+        )
+        app.config.update(config)
+        loggers.init_loggers(app)
+
+        @app.route("/error")
+        def error():
+            app.logger.error("Something failed: %s", "details")
+            return "error"
+
+        return app
+
+    def test_file(self):
+        app = self.create_app(LOG_FILE_ENABLED=True)
+        resp = app.test_client().get("/error", headers={"X-Request-Id": "test-request"})
+        self.assertEqual(resp.headers["X-Request-Id"], "test-request")
+        loggers.stop_listeners()
+
+        with open(app.config["LOG_FILE"]) as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record["message"], "Something failed: details")
+        self.assertEqual(record["level"], "ERROR")
+        self.assertEqual(record["request_id"], "test-request")
+        self.assertEqual(record["endpoint"], "error")
+
+    def test_invalid_request_id(self):
+        app = self.create_app()
+        resp = app.test_client().get("/error", headers={"X-Request-Id": "not a valid id"})
+        self.assertNotEqual(resp.headers["X-Request-Id"], "not a valid id")
+
+    def test_email_deduplication(self):
+        app = self.create_app(LOG_EMAIL_ENABLED=True)
+        for _ in range(3):
+            app.logger.error("Something failed: %s", "details")
+        app.logger.error("Something else failed: %s", "details")
+        loggers.stop_listeners()
+
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertIn("Something failed: details", self.smtp.messages[0])
+        self.assertIn("Something else failed: details", self.smtp.messages[1])
+
+    def test_email_rate_limit(self):
+        app = self.create_app(LOG_EMAIL_ENABLED=True, LOG_EMAIL_MAX_PER_HOUR=2)
+        for i in range(5):
+            app.logger.error("Failure %d" % i)
+        loggers.stop_listeners()
+        self.assertEqual(len(self.smtp.messages), 2)
+
+    def test_mail_server_down(self):
+        # Port that nothing listens on
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        app = self.create_app(LOG_EMAIL_ENABLED=True, SMTP_PORT=port)
+        logging.raiseExceptions = False
+        try:
+            app.logger.error("Mail server is down")
+            loggers.stop_listeners()
+        finally:
+            logging.raiseExceptions = True
+        self.assertEqual(self.smtp.messages, [])
+
+    def test_email_doesnt_block(self):
+        app = self.create_app(LOG_EMAIL_ENABLED=True)
+        sending = threading.Event()
+        release = threading.Event()
+
+        def connect(*args, **kwargs):
+            sending.set()
+            release.wait()
+            return mock.MagicMock()
+
+        with mock.patch("smtplib.SMTP", side_effect=connect):
+            try:
+                thread = threading.Thread(target=app.logger.error, args=("Mail server hangs",))
+                thread.start()
+                # Listener is stuck sending the email, but logging has returned
+                self.assertTrue(sending.wait(10))
+                thread.join(10)
+                self.assertFalse(thread.is_alive())
+            finally:
+                release.set()
+            loggers.stop_listeners()
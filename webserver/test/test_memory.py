@@ -0,0 +1,50 @@
+from flask import Flask
+from webserver import memory
+import default_config
+import unittest
+
+
+@unittest.skipUnless(memory.is_available(), "tracemalloc is not available")
+class MemoryTrackingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.from_object(default_config)
+        self.app.config["MEMORY_TRACKING_SAMPLE_RATE"] = 1
+        memory.init_app(self.app)
+        self.retained = []
+
+        @self.app.route("/allocate")
+        def allocate():
+            temporary = [str(i) for i in range(10000)]
+            self.retained.append(bytearray(1024 * 1024))
+            return str(len(temporary))
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            memory.clear_snapshots()
+        memory._endpoints.clear()
+
+    def test_request(self):
+        self.client.get("/allocate")
+        stats = memory.get_endpoint_stats()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]["endpoint"], "allocate")
+        self.assertEqual(stats[0]["count"], 1)
+        self.assertGreater(stats[0]["net_avg"], 1024 * 1024)
+        self.assertGreater(stats[0]["peak_max"], stats[0]["net_avg"])
+        # Tracing is stopped after the request
+        self.assertFalse(memory.tracemalloc.is_tracing())
+
+    def test_snapshots(self):
+        with self.app.app_context():
+            memory.take_snapshot()
+            self.client.get("/allocate")
+            self.assertTrue(memory.tracemalloc.is_tracing())
+            memory.take_snapshot()
+        snapshots = memory.get_snapshots()
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(snapshots[1]["diff"], [])
+        self.assertGreater(snapshots[0]["diff"][0]["size_diff"], 1024 * 1024)
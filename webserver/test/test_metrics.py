@@ -0,0 +1,86 @@
+from webserver.metrics import Registry, FileStore, labels
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def test_render(self):
+        registry = Registry()
+        registry.inc("http_requests_total", labels(endpoint="index.index", method="GET", status=200))
+        registry.inc("http_requests_total", labels(endpoint="index.index", method="GET", status=200))
+        registry.observe("http_request_duration_seconds", labels(endpoint="index.index"), 0.02)
+        registry.observe("http_request_duration_seconds", labels(endpoint="index.index"), 100)
+        output = registry.render()
+
+        self.assertIn("# TYPE http_requests_total counter", output)
+        self.assertIn('http_requests_total{endpoint="index.index",method="GET",status="200"} 2.0', output)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", output)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="index.index",le="0.01"} 0', output)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="index.index",le="0.025"} 1', output)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="index.index",le="30"} 1', output)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="index.index",le="+Inf"} 2', output)
+        self.assertIn('http_request_duration_seconds_count{endpoint="index.index"} 2', output)
+
+    def test_labels_escaping(self):
+        self.assertEqual(labels(b='x"y', a="1\n"), 'a="1\\n",b="x\\"y"')
+
+    def test_merge(self):
+        first, second = Registry(), Registry()
+        first.inc("http_requests_total", "", 2)
+        first.add_gauge("http_requests_in_flight", "", 1)
+        second.inc("http_requests_total", "", 3)
+        second.add_gauge("http_requests_in_flight", "", 1)
+        second.observe("http_request_db_statements", "", 3)
+        first.merge(second.dump())
+        self.assertEqual(first.counters[("http_requests_total", "")], 5)
+        self.assertEqual(first.gauges[("http_requests_in_flight", "")], 2)
+        self.assertEqual(first.histograms[("http_request_db_statements", "")][-1], 1)
+
+        first.merge(second.dump(), gauges=False)
+        self.assertEqual(first.gauges[("http_requests_in_flight", "")], 2)
+
+
+class FileStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = FileStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write_dead_process(self, registry):
+        # PIDs are never this large, so the process is considered dead
+        with open(os.path.join(self.path, "99999999.json"), "w") as f:
+            json.dump(registry.dump(), f)
+
+    def test_collect(self):
+        current = Registry()
+        current.inc("http_requests_total", "", 1)
+        current.add_gauge("http_requests_in_flight", "", 1)
+        self.store.write(current)
+
+        dead = Registry()
+        dead.inc("http_requests_total", "", 10)
+        dead.add_gauge("http_requests_in_flight", "", 5)
+        self._write_dead_process(dead)
+
+        result = self.store.collect()
+        self.assertEqual(result.counters[("http_requests_total", "")], 11)
+        self.assertEqual(result.gauges[("http_requests_in_flight", "")], 1)
+
+        # Counters of the dead process are moved into the archive
+        self.assertFalse(os.path.exists(os.path.join(self.path, "99999999.json")))
+        result = self.store.collect()
+        self.assertEqual(result.counters[("http_requests_total", "")], 11)
+
+    def test_clear(self):
+        registry = Registry()
+        registry.inc("http_requests_total", "", 1)
+        self.store.write(registry)
+        self.store.clear()
+        self.assertEqual(len(self.store.collect().counters), 0)
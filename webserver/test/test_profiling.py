@@ -0,0 +1,68 @@
+from flask import Flask
+from webserver import profiling
+import default_config
+import tempfile
+import shutil
+import json
+import os
+import unittest
+
+
+class ProfilingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config.from_object(default_config)
+        self.app.config["FILE_STORAGE_DIR"] = self.storage_dir
+        self.app.config["PROFILING_SAMPLING_INTERVAL"] = 0.001
+        profiling.init_app(self.app)
+
+        @self.app.route("/slow")
+        def slow():
+            total = 0
+            for i in range(300000):
+                total += i
+            return str(total)
+
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            self.token = profiling.generate_token()
+
+    def tearDown(self):
+        shutil.rmtree(self.storage_dir)
+
+    def _get_profile(self, profile_id):
+        with open(os.path.join(self.storage_dir, profiling.PROFILES_DIR, profile_id + ".json")) as f:
+            return json.load(f)
+
+    def test_sampling(self):
+        resp = self.client.get("/slow", headers={"X-Profile": self.token})
+        profile = self._get_profile(resp.headers["X-Profile-Id"])
+        self.assertEqual(profile["mode"], profiling.MODE_SAMPLING)
+        self.assertEqual(profile["status"], 200)
+        with open(os.path.join(self.storage_dir, profiling.PROFILES_DIR, profile["file"])) as f:
+            self.assertIn(":slow:", f.read())
+
+    def test_cprofile(self):
+        resp = self.client.get("/slow?n=1&_profile=%s&_profile_mode=cprofile" % self.token)
+        profile = self._get_profile(resp.headers["X-Profile-Id"])
+        self.assertEqual(profile["mode"], profiling.MODE_CPROFILE)
+        self.assertEqual(profile["url"], "http://localhost/slow?n=1")
+        self.assertTrue(profile["file"].endswith(".prof"))
+
+    def test_invalid_token(self):
+        resp = self.client.get("/slow", headers={"X-Profile": "invalid"})
+        self.assertNotIn("X-Profile-Id", resp.headers)
+
+    def test_sample_rate(self):
+        self.app.config["PROFILING_SAMPLE_RATE"] = 1
+        resp = self.client.get("/slow")
+        self.assertIn("X-Profile-Id", resp.headers)
+
+    def test_max_profiles(self):
+        self.app.config["PROFILING_MAX_PROFILES"] = 2
+        for _ in range(3):
+            self.client.get("/slow", headers={"X-Profile": self.token})
+        with self.app.app_context():
+            self.assertEqual(len(profiling.get_profiles()), 2)
@@ -0,0 +1,33 @@
+from webserver import query_timing
+import sqlalchemy
+import unittest
+
+
+class QueryTimingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine("sqlite://")
+        query_timing.attach(self.engine)
+        self.calls = []
+        query_timing.subscribe(self.on_statement)
+        self.addCleanup(query_timing.unsubscribe, self.on_statement)
+
+    def on_statement(self, statement, parameters, executemany, start, duration):
+        self.calls.append((statement, start, duration))
+
+    def test_subscribe(self):
+        # Subscribing and attaching again doesn't duplicate calls
+        query_timing.subscribe(self.on_statement)
+        query_timing.attach(self.engine)
+        with self.engine.connect() as connection:
+            connection.execute(sqlalchemy.text("SELECT 1"))
+        self.assertEqual(len(self.calls), 1)
+        statement, start, duration = self.calls[0]
+        self.assertEqual(statement, "SELECT 1")
+        self.assertGreaterEqual(duration, 0)
+
+    def test_unsubscribe(self):
+        query_timing.unsubscribe(self.on_statement)
+        with self.engine.connect() as connection:
+            connection.execute(sqlalchemy.text("SELECT 1"))
+        self.assertEqual(self.calls, [])
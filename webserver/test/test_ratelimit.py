@@ -0,0 +1,73 @@
+from webserver import ratelimit
+import unittest
+
+
+class LocalBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = ratelimit.LocalBackend()
+
+    def test_consume(self):
+        # Bucket starts full
+        self.assertEqual(self.backend.consume("a", 2, 10, now=100), (True, 1))
+        self.assertEqual(self.backend.consume("a", 2, 10, now=100), (True, 0))
+        allowed, tokens = self.backend.consume("a", 2, 10, now=100)
+        self.assertFalse(allowed)
+
+        # Other buckets are not affected
+        self.assertTrue(self.backend.consume("b", 2, 10, now=100)[0])
+
+        # One token is added every 5 seconds
+        self.assertFalse(self.backend.consume("a", 2, 10, now=104)[0])
+        self.assertEqual(self.backend.consume("a", 2, 10, now=105), (True, 0))
+
+        # Bucket can't hold more than `rate` tokens
+        self.assertEqual(self.backend.consume("a", 2, 10, now=1000), (True, 1))
+
+    def test_prune(self):
+        self.backend.max_buckets = 1
+        self.backend.consume("a", 2, 10, now=100)
+        self.backend.consume("b", 2, 10, now=200)
+        self.assertEqual(list(self.backend._buckets.keys()), ["b"])
+
+    def test_prune_least_recently_used(self):
+        self.backend.max_buckets = 2
+        self.backend.consume("a", 2, 10, now=100)
+        self.backend.consume("b", 2, 10, now=100)
+        self.backend.consume("a", 2, 10, now=100)
+        self.backend.consume("c", 2, 10, now=100)
+        self.assertEqual(sorted(self.backend._buckets.keys()), ["a", "c"])
+        self.assertFalse(self.backend.consume("a", 2, 10, now=100)[0])
+
+
+class RateLimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = ratelimit.RateLimiter(
+            ratelimit.LocalBackend(),
+            default_limit=(2, 60),
+            endpoint_limits={"configured": (5, 60)},
+            key_limits={"trusted_key": (10, 60)},
+        )
+
+    def test_limits(self):
+        self.assertEqual(self.limiter.hit("endpoint", "ip:127.0.0.1").limit, 2)
+        self.assertEqual(self.limiter.hit("endpoint", "ip:127.0.0.1", limit=(3, 60)).limit, 3)
+        self.assertEqual(self.limiter.hit("configured", "ip:127.0.0.1", limit=(3, 60)).limit, 5)
+        self.assertEqual(self.limiter.hit("configured", "key:trusted_key", "trusted_key").limit, 10)
+
+    def test_hit(self):
+        result = self.limiter.hit("endpoint", "ip:127.0.0.1")
+        self.assertTrue(result.allowed)
+        self.assertEqual(result.remaining, 1)
+        self.assertNotIn("Retry-After", result.headers)
+
+        self.limiter.hit("endpoint", "ip:127.0.0.1")
+        result = self.limiter.hit("endpoint", "ip:127.0.0.1")
+        self.assertFalse(result.allowed)
+        self.assertEqual(result.remaining, 0)
+        self.assertEqual(result.retry_after, 30)
+        self.assertEqual(result.headers["Retry-After"], "30")
+
+        # Each endpoint has a separate bucket
+        self.assertTrue(self.limiter.hit("another_endpoint", "ip:127.0.0.1").allowed)
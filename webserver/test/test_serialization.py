@@ -0,0 +1,42 @@
+from webserver import serialization
+from datetime import datetime
+import json
+import pytz
+import unittest
+import uuid
+
+
+class SerializationTestCase(unittest.TestCase):
+
+    def test_encoders(self):
+        mbid = "770cc467-8dde-4d22-bc4c-a42f91e1a1d4"
+        data = {
+            "id": uuid.UUID(mbid),
+            "created": datetime(2016, 1, 2, 3, 4, 5, tzinfo=pytz.utc),
+            "recordings": {mbid},
+            "name": u"Tést",
+            "public": True,
+            "count": 1,
+        }
+        for priority, name in serialization._priority:
+            encoded = serialization.dumps(data, encoder=name)
+            self.assertIsInstance(encoded, bytes)
+            self.assertNotIn(b" ", encoded.replace(b"Sat, 02 Jan 2016 03:04:05 GMT", b""))
+            self.assertEqual(json.loads(encoded.decode("utf-8")), {
+                "id": mbid,
+                "created": "Sat, 02 Jan 2016 03:04:05 GMT",
+                "recordings": [mbid],
+                "name": u"Tést",
+                "public": True,
+                "count": 1,
+            })
+
+    def test_unsupported_type(self):
+        for priority, name in serialization._priority:
+            with self.assertRaises(TypeError):
+                serialization.dumps({"object": object()}, encoder=name)
+
+    def test_get_encoder(self):
+        self.assertEqual(serialization.get_encoder("json"), serialization._encode_stdlib)
+        self.assertEqual(serialization.get_encoder("auto"),
+                         serialization._encoders[serialization._priority[0][1]])
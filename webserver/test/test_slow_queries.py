@@ -0,0 +1,65 @@
+from webserver.slow_queries import SlowQueryRecorder, redact, _is_explainable
+import sqlalchemy
+import unittest
+import mock
+import time
+
+
+class SlowQueryRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine("sqlite://")
+        self.recorder = SlowQueryRecorder(threshold=0, buffer_size=2)
+        self.recorder.attach(self.engine)
+
+    def tearDown(self):
+        self.recorder.detach()
+
+    def test_record(self):
+        with self.engine.connect() as connection:
+            connection.execute(sqlalchemy.text("SELECT :value"), {"value": "secret"})
+        self.assertEqual(len(self.recorder.queries), 1)
+        query = self.recorder.queries[0]
+        self.assertIn("SELECT", query["statement"])
+        self.assertNotIn("secret", str(query["parameters"]))
+        self.assertIsNone(query["endpoint"])
+
+    def test_threshold(self):
+        self.recorder.threshold = 60
+        with self.engine.connect() as connection:
+            connection.execute(sqlalchemy.text("SELECT 1"))
+        self.assertEqual(len(self.recorder.queries), 0)
+
+    def test_buffer_size(self):
+        with self.engine.connect() as connection:
+            for i in range(3):
+                connection.execute(sqlalchemy.text("SELECT %d" % i))
+        self.assertEqual([q["statement"] for q in self.recorder.queries], ["SELECT 1", "SELECT 2"])
+
+    def test_explain(self):
+        self.recorder.explain_rate = 1
+        with mock.patch.object(self.recorder, "explain", return_value="Seq Scan") as explain:
+            self.recorder.record("SELECT * FROM dataset WHERE id = %(id)s", {"id": "x"}, 1)
+            self.recorder.record("DELETE FROM dataset", {}, 1)
+            for _ in range(100):
+                if self.recorder.queries[0]["explain"] is not None:
+                    break
+                time.sleep(0.01)
+        # Parameters are not redacted for EXPLAIN, only in the log
+        explain.assert_called_once_with("SELECT * FROM dataset WHERE id = %(id)s", {"id": "x"})
+        self.assertEqual(self.recorder.queries[0]["explain"], "Seq Scan")
+        self.assertIsNone(self.recorder.queries[1]["explain"])
+
+
+class RedactTestCase(unittest.TestCase):
+
+    def test_redact(self):
+        self.assertEqual(redact({"id": 1, "name": "test", "public": True, "desc": None}),
+                         {"id": 1, "name": "<str>", "public": True, "desc": None})
+        self.assertEqual(redact({"mbids": ["a"] * 100}), {"mbids": "<100 values>"})
+
+    def test_is_explainable(self):
+        self.assertTrue(_is_explainable("\n  SELECT id\n  FROM dataset"))
+        self.assertFalse(_is_explainable("SELECT id FROM dataset FOR UPDATE"))
+        self.assertFalse(_is_explainable("WITH x AS (INSERT INTO t VALUES (1) RETURNING id) SELECT * FROM x"))
+        self.assertFalse(_is_explainable("UPDATE dataset SET name = 'x'"))
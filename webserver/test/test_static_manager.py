@@ -1,5 +1,9 @@
 from webserver.testing import ServerTestCase
-from webserver import static_manager
+from webserver import static_manager, compression
+import tempfile
+import shutil
+import mock
+import os
 
 
 class StaticManagerTestCase(ServerTestCase):
@@ -7,3 +11,18 @@ class StaticManagerTestCase(ServerTestCase):
     def test_get_file_path(self):
         self.assertEqual(static_manager.get_static_path("script.js"), "/static/script.js")
         self.assertEqual(static_manager.get_static_path("img/test.png"), "/static/img/test.png")
+
+    def test_compress_build(self):
+        build_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(build_dir, "main.css"), "wb") as f:
+                f.write(b"body { color: red; }\n" * 100)
+            with open(os.path.join(build_dir, "logo.png"), "wb") as f:
+                f.write(b"\x89PNG" * 100)
+            with mock.patch.object(static_manager, "BUILD_DIR", build_dir):
+                created = static_manager.compress_build(compression.compress, ["gzip"])
+                self.assertEqual(created, [os.path.join(build_dir, "main.css.gz")])
+                # Up-to-date files are not compressed again
+                self.assertEqual(static_manager.compress_build(compression.compress, ["gzip"]), [])
+        finally:
+            shutil.rmtree(build_dir)
@@ -1,6 +1,7 @@
 import flask_testing
 from db.testing import DatabaseTestCase
 from webserver import create_app
+from db import cache
 
 
 class ServerTestCase(flask_testing.TestCase, DatabaseTestCase):
@@ -8,6 +9,9 @@ class ServerTestCase(flask_testing.TestCase, DatabaseTestCase):
     def create_app(self):
         app = create_app()
         app.config['TESTING'] = True
+        # In-process cache is recreated for every test, so values cached
+        # in one test can't affect others.
+        cache.init([])
         return app
 
     def temporary_login(self, user_id):
@@ -0,0 +1,54 @@
+from __future__ import absolute_import
+from flask import Blueprint, render_template, send_from_directory, redirect, url_for, current_app
+from werkzeug.exceptions import NotFound
+from webserver.decorators import admin_required
+from webserver import profiling, memory, slow_queries
+
+admin_bp = Blueprint('admin', __name__)
+
+
+@admin_bp.route("/profiles")
+@admin_required
+def profiles():
+    return render_template("admin/profiles.html", profiles=profiling.get_profiles())
+
+
+@admin_bp.route("/profiles/<filename>")
+@admin_required
+def profile_file(filename):
+    return send_from_directory(profiling.get_directory(), filename, as_attachment=True)
+
+
+@admin_bp.route("/memory")
+@admin_required
+def memory_usage():
+    return render_template(
+        "admin/memory.html",
+        available=memory.is_available(),
+        endpoints=memory.get_endpoint_stats(),
+        snapshots=memory.get_snapshots(),
+    )
+
+
+@admin_bp.route("/memory/snapshot", methods=["POST"])
+@admin_required
+def memory_snapshot():
+    if not memory.is_available():
+        raise NotFound("Memory tracking is not available.")
+    memory.take_snapshot(frames=current_app.config["MEMORY_TRACKING_FRAMES"])
+    return redirect(url_for("admin.memory_usage"))
+
+
+@admin_bp.route("/memory/clear", methods=["POST"])
+@admin_required
+def memory_clear():
+    if not memory.is_available():
+        raise NotFound("Memory tracking is not available.")
+    memory.clear_snapshots()
+    return redirect(url_for("admin.memory_usage"))
+
+
+@admin_bp.route("/slow-queries")
+@admin_required
+def slow_query_log():
+    return render_template("admin/slow-queries.html", queries=slow_queries.get_queries())
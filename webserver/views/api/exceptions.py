@@ -1,10 +1,11 @@
 class APIError(Exception):
 
-    def __init__(self, message, status_code, payload=None):
+    def __init__(self, message, status_code, payload=None, headers=None):
         super(APIError, self).__init__()
         self.message = message
         self.status_code = status_code
         self.payload = payload
+        self.headers = headers
 
     def to_dict(self):
         rv = dict(self.payload or ())
@@ -22,3 +23,7 @@ class APIUnauthorized(APIError):
 class APIBadRequest(APIError):
     def __init__(self, message, payload=None):
         super(APIBadRequest, self).__init__(message, 400, payload)
+
+class APITooManyRequests(APIError):
+    def __init__(self, message, payload=None, headers=None):
+        super(APITooManyRequests, self).__init__(message, 429, payload, headers)
@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+from flask import Blueprint, current_app, request
+from flask_login import current_user
+from webserver.decorators import auth_required, rate_limited
+from webserver.views.api import exceptions as api_exceptions
+from webserver.serialization import json_response
+import db.batch
+
+bp_batch = Blueprint('api_v1_batch', __name__)
+
+
+@bp_batch.route("", methods=["POST"])
+@rate_limited(rate=20, per=60)
+@auth_required
+def run_batch():
+    """Run a batch of changes to datasets in one transaction.
+
+    Operations are run in order. By default the batch is atomic: if one of
+    the operations fails, none of the changes are saved. With ``"atomic":
+    false`` each operation is saved or rolled back on its own. At most
+    ``BATCH_MAX_OPERATIONS`` operations can be sent at once.
+
+    **Example request**:
+
+    .. sourcecode:: json
+
+        {
+            "atomic": true,
+            "operations": [
+                {"op": "create", "dataset": {"name": "Mood", "classes": []}},
+                {"op": "add_recordings", "dataset_id": "6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0",
+                 "class_name": "Happy", "recordings": ["770cc467-8dde-4d22-bc4c-a42f91e"]},
+                {"op": "remove_recordings", "dataset_id": "6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0",
+                 "class_name": "Sad", "recordings": ["770cc467-8dde-4d22-bc4c-a42f91e"]},
+                {"op": "update", "dataset_id": "6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0", "dataset": {...}},
+                {"op": "delete", "dataset_id": "6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0"}
+            ]
+        }
+
+    :reqheader Content-Type: *application/json*
+    :resheader Content-Type: *application/json*
+    :>json boolean committed: ``true`` if changes have been saved.
+    :>json array results: Result of each operation, with ``success`` field and ``error`` message if it
+        failed. Results of ``create`` operations contain ``dataset_id``.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get("operations"), list):
+        raise api_exceptions.APIBadRequest("Operations must be submitted in JSON format.")
+    max_operations = current_app.config["BATCH_MAX_OPERATIONS"]
+    if len(data["operations"]) > max_operations:
+        raise api_exceptions.APIBadRequest("Batches can't contain more than %d operations." % max_operations)
+    committed, results = db.batch.run(data["operations"], current_user.id, atomic=data.get("atomic", True) is not False)
+    return json_response({
+        "committed": committed,
+        "results": results,
+    })
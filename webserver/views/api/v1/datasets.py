@@ -1,25 +1,218 @@
 from __future__ import absolute_import
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, request
 from flask_login import current_user
-from webserver.decorators import auth_required
+from webserver.decorators import auth_required, rate_limited
 from webserver.views.api import exceptions as api_exceptions
+from webserver.views.api.v1.jobs import accepted
+from webserver.serialization import json_response, ndjson_response, MIMETYPE, NDJSON_MIMETYPE
+from webserver import compression
 import db.dataset
 import db.exceptions
+import db.job
 from utils import dataset_validator
+import base64
 
 bp_datasets = Blueprint('api_v1_datasets', __name__)
 
 
 @bp_datasets.route("/<uuid:dataset_id>", methods=["GET"])
+@rate_limited
 def get_dataset(dataset_id):
     """Retrieve a dataset.
 
+    By default the whole dataset is returned, including all recordings. Parts
+    of it can be selected with ``fields`` and ``include`` arguments, which
+    contain comma-separated lists of these fields:
+
+    * ``id``, ``name``, ``description``, ``author``, ``created``, ``public``,
+      ``last_edited``: fields of the dataset.
+    * ``classes``: classes without their recordings (same as
+      ``classes.id,classes.name,classes.description``).
+    * ``classes.id``, ``classes.name``, ``classes.description``: fields of
+      classes.
+    * ``classes.count``: number of recordings in each class.
+    * ``recordings`` or ``classes.recordings``: recordings in each class.
+
+    ``fields`` replaces the default fields, ``include`` adds to them. With
+    ``summary=true`` the dataset is returned with classes and their counts,
+    but without recordings. Only data that is requested is loaded, so
+    responses without recordings are fast even for large datasets.
+
+    For example, ``?fields=name,classes.name,classes.count`` returns the name
+    of the dataset and names and sizes of its classes.
+
+    :query fields: *Optional.* Fields to return instead of the default ones.
+    :query include: *Optional.* Fields to return in addition to the default ones.
+    :query summary: *Optional.* ``true`` to return the dataset with counts instead of recordings.
     :resheader Content-Type: *application/json*
     """
-    return jsonify(get_check_dataset(dataset_id))
+    fields, class_fields = _get_requested_fields()
+    ds = get_check_dataset(
+        dataset_id,
+        fields=sorted(set(fields) | set(_REQUIRED_FIELDS)),
+        class_fields=class_fields,
+    )
+    cache_key = "dataset:%s:%s:%s" % (
+        ds["id"],
+        ds["last_edited"].isoformat(),
+        ",".join(fields + ["classes." + field for field in class_fields]),
+    )
+    for field in _REQUIRED_FIELDS:
+        if field not in fields:
+            del ds[field]
+    return compression.set_cache_key(json_response(ds), cache_key)
+
+
+# Fields of datasets that are always loaded to check access and to identify
+# versions of responses
+_REQUIRED_FIELDS = ["id", "author", "public", "last_edited"]
+
+
+def _get_requested_fields():
+    """Get fields of a dataset and its classes requested in arguments of
+    `get_dataset`.
+
+    Returns:
+        Tuple with sorted lists of fields of the dataset and fields of
+        classes (see `db.dataset.get`).
+    """
+    if request.args.get("summary", "").lower() in ("1", "true"):
+        fields = set(db.dataset.FIELDS)
+        class_fields = {"id", "name", "description", "count"}
+    elif "fields" in request.args:
+        fields, class_fields = set(), set()
+    else:
+        fields = set(db.dataset.FIELDS)
+        class_fields = set(db.dataset.DEFAULT_CLASS_FIELDS)
+
+    for name in request.args.get("fields", "").split(",") + request.args.get("include", "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name in db.dataset.FIELDS:
+            fields.add(name)
+        elif name == "classes":
+            class_fields.update(["id", "name", "description"])
+        elif name == "recordings":
+            class_fields.add("recordings")
+        elif name.startswith("classes.") and name[len("classes."):] in db.dataset.CLASS_FIELDS:
+            class_fields.add(name[len("classes."):])
+        else:
+            raise api_exceptions.APIBadRequest("Unknown field: %s" % name)
+    return sorted(fields), sorted(class_fields)
+
+
+@bp_datasets.route("/<uuid:dataset_id>/stats", methods=["GET"])
+@rate_limited
+def get_dataset_stats(dataset_id):
+    """Retrieve statistics of a dataset.
+
+    Statistics are kept up to date as the dataset changes, so this is fast
+    even for large datasets.
+
+    :resheader Content-Type: *application/json*
+    :>json number classes: Number of classes.
+    :>json number recordings: Number of recordings in all classes. Recordings
+        that are in multiple classes are counted once for each class.
+    :>json array class_sizes: Names of classes with numbers of their recordings.
+    :>json number balance: Size of the smallest class divided by size of the largest one, or ``null`` if all classes
+        are empty.
+    """
+    get_check_dataset(dataset_id, fields=_REQUIRED_FIELDS, class_fields=[])
+    return json_response(db.dataset.get_stats(dataset_id))
+
+
+@bp_datasets.route("/<uuid:dataset_id>/classes/<path:class_name>/recordings", methods=["GET"])
+@rate_limited
+def get_class_recordings(dataset_id, class_name):
+    """Retrieve recordings in a class of a dataset, one page at a time.
+
+    The response contains ``next_cursor`` if there are more recordings. Pass
+    it as ``cursor`` to get the next page. Cursors stay valid when the
+    dataset is changed: recordings that are added or removed between requests
+    don't cause other recordings to be skipped or repeated.
+
+    If the request accepts ``application/x-ndjson``, but not
+    ``application/json``, all recordings from the cursor to the end of the
+    class are streamed instead, one JSON object per line. If the class is
+    renamed or deleted while they are streamed, the last line is an object with
+    an ``error`` message instead of a recording.
+
+    :query cursor: *Optional.* Cursor from the previous page.
+    :query limit: *Optional.* Number of recordings on the page, up to ``DATASET_RECORDINGS_PAGE_MAX``.
+    :resheader Content-Type: *application/json* or *application/x-ndjson*
+    :>json array recordings: MBIDs of recordings.
+    :>json string next_cursor: Cursor of the next page, or ``null`` if this is the last page.
+    """
+    get_check_dataset(dataset_id, fields=_REQUIRED_FIELDS, class_fields=[])
+    after = _decode_cursor(request.args.get("cursor"))
+    if request.accept_mimetypes.best_match([MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        limit = current_app.config["DATASET_RECORDINGS_PAGE_MAX"]
+        page = _get_class_recordings_page(dataset_id, class_name, after, limit)
+        return ndjson_response(_iter_class_recordings(dataset_id, class_name, page, limit))
+
+    try:
+        limit = int(request.args.get("limit", current_app.config["DATASET_RECORDINGS_PAGE_SIZE"]))
+    except ValueError:
+        raise api_exceptions.APIBadRequest("Limit must be a number.")
+    if not 1 <= limit <= current_app.config["DATASET_RECORDINGS_PAGE_MAX"]:
+        raise api_exceptions.APIBadRequest("Limit must be between 1 and %d." %
+                                           current_app.config["DATASET_RECORDINGS_PAGE_MAX"])
+    # One more recording is requested to find out if there's a next page
+    page = _get_class_recordings_page(dataset_id, class_name, after, limit + 1)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = _encode_cursor(page[-1][0])
+    return json_response({
+        "recordings": [mbid for _, mbid in page],
+        "next_cursor": next_cursor,
+    })
+
+
+def _get_class_recordings_page(dataset_id, class_name, after, limit):
+    try:
+        return db.dataset.get_class_recordings(dataset_id, class_name, after, limit)
+    except db.exceptions.NoDataFoundException as e:
+        raise api_exceptions.APINotFound(str(e))
+    except db.exceptions.BadDataException as e:
+        raise api_exceptions.APIBadRequest(str(e))
+
+
+def _iter_class_recordings(dataset_id, class_name, page, limit):
+    """Get recordings from pages of a class, starting with the first one.
+
+    Status of the response has already been sent when the next pages are
+    read, so errors are reported in the last object.
+    """
+    while page:
+        for _, mbid in page:
+            yield {"mbid": mbid}
+        if len(page) < limit:
+            return
+        try:
+            page = db.dataset.get_class_recordings(dataset_id, class_name, page[-1][0], limit)
+        except (db.exceptions.NoDataFoundException, db.exceptions.BadDataException) as e:
+            yield {"error": str(e)}
+            return
+
+
+def _encode_cursor(recording_id):
+    return base64.urlsafe_b64encode(str(recording_id).encode("ascii")).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    """Get ID of the last recording on the previous page from a cursor."""
+    if not cursor:
+        return None
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii"))
+    except (ValueError, TypeError):
+        raise api_exceptions.APIBadRequest("Invalid cursor.")
 
 
 @bp_datasets.route("/", methods=["POST"])
+@rate_limited(rate=20, per=60)
 @auth_required
 def create_dataset():
     """Create a new dataset.
@@ -61,9 +254,14 @@ def create_dataset():
             }
 
 
+    Datasets with many recordings (``JOB_ASYNC_RECORDINGS`` in the config)
+    are created in the background. The response is ``202 Accepted`` with ID of
+    the job, which can be followed at ``/api/v1/jobs/<job_id>``.
+
     :resheader Content-Type: *application/json*
     :>json boolean success: ``True`` on successful creation.
     :>json string dataset_id: ID (UUID) of newly created dataset.
+    :>json string job_id: ID of the job that creates the dataset, if it's created in the background.
     """
     dataset_dict = request.get_json()
     if not dataset_dict:
@@ -72,32 +270,42 @@ def create_dataset():
         dataset_dict["public"] = True
     if "classes" not in dataset_dict:
         dataset_dict["classes"] = []
+    if _count_recordings(dataset_dict) >= current_app.config["JOB_ASYNC_RECORDINGS"]:
+        try:
+            dataset_validator.validate(dataset_dict)
+        except dataset_validator.ValidationException as e:
+            raise api_exceptions.APIBadRequest(str(e))
+        job_id = db.job.create("create_dataset", {"dataset": dataset_dict}, owner=current_user.id,
+                               max_attempts=current_app.config["JOB_MAX_ATTEMPTS"])
+        return accepted(job_id)
     try:
         dataset_id = db.dataset.create_from_dict(dataset_dict, current_user.id)
     except dataset_validator.ValidationException as e:
         raise api_exceptions.APIBadRequest(e.message)
 
-    return jsonify(
-        success=True,
-        dataset_id=dataset_id,
-    )
+    return json_response({
+        "success": True,
+        "dataset_id": dataset_id,
+    })
 
 
 @bp_datasets.route("/<uuid:dataset_id>", methods=["DELETE"])
+@rate_limited
 @auth_required
 def delete_dataset(dataset_id):
     """Delete a dataset."""
-    ds = get_dataset(dataset_id)
+    ds = get_check_dataset(dataset_id, class_fields=[])
     if ds["author"] != current_user.id:
         raise api_exceptions.APIUnauthorized("You can't delete this dataset.")
     db.dataset.delete(ds["id"])
-    return jsonify(
-        success=True,
-        message="Dataset has been deleted."
-    )
+    return json_response({
+        "success": True,
+        "message": "Dataset has been deleted.",
+    })
 
 
 @bp_datasets.route("/<uuid:dataset_id>", methods=["PUT"])
+@rate_limited
 @auth_required
 def update_dataset_details(dataset_id):
     """Update dataset details.
@@ -125,6 +333,7 @@ def update_dataset_details(dataset_id):
 
 
 @bp_datasets.route("/<uuid:dataset_id>/classes", methods=["POST"])
+@rate_limited
 @auth_required
 def add_class(dataset_id):
     """Add class into a dataset.
@@ -151,6 +360,7 @@ def add_class(dataset_id):
 
 
 @bp_datasets.route("/<uuid:dataset_id>/classes", methods=["PUT"])
+@rate_limited
 @auth_required
 def update_class(dataset_id):
     """Update class in a dataset.
@@ -177,6 +387,7 @@ def update_class(dataset_id):
 
 
 @bp_datasets.route("/<uuid:dataset_id>/classes", methods=["DELETE"])
+@rate_limited
 @auth_required
 def delete_class(dataset_id):
     """Delete class from a dataset.
@@ -198,6 +409,7 @@ def delete_class(dataset_id):
 
 
 @bp_datasets.route("/<uuid:dataset_id>/recordings", methods=["PUT"])
+@rate_limited
 @auth_required
 def add_recordings(dataset_id):
     """Add recordings to a class in a dataset.
@@ -217,10 +429,16 @@ def add_recordings(dataset_id):
 
     :resheader Content-Type: *application/json*
     """
-    raise NotImplementedError
+    class_name, recordings = _get_recordings_request(dataset_id)
+    _call_recordings_function(db.dataset.add_recordings, dataset_id, class_name, recordings)
+    return json_response({
+        "success": True,
+        "message": "Recordings have been added.",
+    })
 
 
 @bp_datasets.route("/<uuid:dataset_id>/recordings", methods=["DELETE"])
+@rate_limited
 @auth_required
 def delete_recordings(dataset_id):
     """Delete recordings from a class in a dataset.
@@ -240,19 +458,59 @@ def delete_recordings(dataset_id):
 
     :resheader Content-Type: *application/json*
     """
-    raise NotImplementedError
+    class_name, recordings = _get_recordings_request(dataset_id)
+    _call_recordings_function(db.dataset.remove_recordings, dataset_id, class_name, recordings)
+    return json_response({
+        "success": True,
+        "message": "Recordings have been deleted.",
+    })
+
+
+def _get_recordings_request(dataset_id):
+    """Check that the current user can change a dataset and get the class
+    name and recordings from the request.
+    """
+    ds = get_check_dataset(dataset_id, class_fields=[])
+    if ds["author"] != current_user.id:
+        raise api_exceptions.APIUnauthorized("You can't change this dataset.")
+    data = request.get_json()
+    if not data or "class_name" not in data or "recordings" not in data:
+        raise api_exceptions.APIBadRequest("Fields `class_name` and `recordings` are required.")
+    return data["class_name"], data["recordings"]
+
+
+def _call_recordings_function(function, dataset_id, class_name, recordings):
+    try:
+        function(dataset_id, class_name, recordings)
+    except dataset_validator.ValidationException as e:
+        raise api_exceptions.APIBadRequest(str(e))
+    except db.exceptions.NoDataFoundException as e:
+        raise api_exceptions.APINotFound(str(e))
+    except db.exceptions.BadDataException as e:
+        raise api_exceptions.APIBadRequest(str(e))
+
 
+def _count_recordings(dataset_dict):
+    try:
+        return sum(len(cls.get("recordings", [])) for cls in dataset_dict["classes"])
+    except (TypeError, AttributeError):
+        # Invalid datasets are rejected by validation
+        return 0
 
-def get_check_dataset(dataset_id):
+
+def get_check_dataset(dataset_id, **kwargs):
     """Wrapper for `dataset.get` function in `db` package. Meant for use with the API.
 
     Checks the following conditions and raises NotFound exception if they
     aren't met:
     * Specified dataset exists.
     * Current user is allowed to access this dataset.
+
+    Keyword arguments are passed to `dataset.get`. If fields are specified,
+    they must include `public` and `author`.
     """
     try:
-        ds = db.dataset.get(dataset_id)
+        ds = db.dataset.get(dataset_id, **kwargs)
     except db.exceptions.NoDataFoundException as e:
         raise api_exceptions.APINotFound("Can't find this dataset.")
     if ds["public"] or (current_user.is_authenticated and
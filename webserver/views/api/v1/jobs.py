@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+from flask import Blueprint, url_for
+from flask_login import current_user
+from webserver.decorators import auth_required, rate_limited
+from webserver.views.api import exceptions as api_exceptions
+from webserver.serialization import json_response
+import db.job
+import db.exceptions
+
+bp_jobs = Blueprint('api_v1_jobs', __name__)
+
+
+@bp_jobs.route("/<uuid:job_id>", methods=["GET"])
+@rate_limited
+@auth_required
+def get_job(job_id):
+    """Retrieve status of a background job.
+
+    Jobs are created by endpoints that respond with ``202 Accepted``.
+
+    :resheader Content-Type: *application/json*
+    :>json string id: ID of the job.
+    :>json string type: Type of the job, for example ``create_dataset``.
+    :>json string status: ``pending``, ``running``, ``done``, ``failed`` or ``cancelled``.
+    :>json number progress: Fraction of the job that is done (0 to 1).
+    :>json object result: Result of the job when it's done, for example ``{"dataset_id": "..."}``.
+    :>json string error: Error of the last attempt, if it failed.
+    """
+    return json_response(_serialize(get_check_job(job_id)))
+
+
+@bp_jobs.route("/<uuid:job_id>", methods=["DELETE"])
+@rate_limited
+@auth_required
+def cancel_job(job_id):
+    """Cancel a background job.
+
+    Pending jobs are cancelled immediately, running jobs stop shortly after
+    and undo their changes. Finished jobs are not affected.
+
+    :resheader Content-Type: *application/json*
+    :>json string status: New status of the job.
+    """
+    get_check_job(job_id)
+    return json_response({
+        "success": True,
+        "status": db.job.cancel(job_id),
+    })
+
+
+def accepted(job_id):
+    """Create a ``202 Accepted`` response for a job that has been queued."""
+    return json_response({
+        "success": True,
+        "job_id": job_id,
+    }, status=202, headers={"Location": url_for("api_v1_jobs.get_job", job_id=job_id)})
+
+
+def get_check_job(job_id):
+    """Get a job, checking that it belongs to the current user."""
+    try:
+        job = db.job.get(job_id)
+    except db.exceptions.NoDataFoundException:
+        raise api_exceptions.APINotFound("Can't find this job.")
+    if job["owner"] != current_user.id:
+        raise api_exceptions.APINotFound("Can't find this job.")
+    return job
+
+
+def _serialize(job):
+    return {
+        "id": job["id"],
+        "type": job["type"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "cancel_requested": job["cancel_requested"],
+        "result": job["result"],
+        "error": job["error"],
+        "created": job["created"],
+        "finished": job["finished"],
+    }
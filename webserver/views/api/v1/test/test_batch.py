@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+import db.dataset
+import db.user
+import json
+
+RECORDING_1 = "0dad432b-16cc-4bf0-8961-fd31d124b01b"
+
+
+class APIBatchViewsTestCase(ServerTestCase):
+
+    def setUp(self):
+        super(APIBatchViewsTestCase, self).setUp()
+        self.user_id = db.user.create("tester")
+
+    def post_json(self, url, data):
+        return self.client.post(url, data=json.dumps(data), content_type="application/json")
+
+    def test_batch_forbidden(self):
+        resp = self.post_json("/api/v1/batch", {"operations": []})
+        self.assertEqual(resp.status_code, 401)
+
+    def test_batch_invalid(self):
+        self.temporary_login(self.user_id)
+        resp = self.post_json("/api/v1/batch", {"operations": {}})
+        self.assert400(resp)
+
+        self.app.config["BATCH_MAX_OPERATIONS"] = 1
+        resp = self.post_json("/api/v1/batch", {"operations": [{"op": "delete"}, {"op": "delete"}]})
+        self.assert400(resp)
+
+    def test_batch(self):
+        self.temporary_login(self.user_id)
+        resp = self.post_json("/api/v1/batch", {"operations": [
+            {"op": "create", "dataset": {"name": "Test", "classes": [{"name": "A", "recordings": [RECORDING_1]}]}},
+        ]})
+        self.assert200(resp)
+        self.assertTrue(resp.json["committed"])
+        dataset = db.dataset.get(resp.json["results"][0]["dataset_id"])
+        self.assertEqual(dataset["classes"][0]["recordings"], [RECORDING_1])
+
+    def test_batch_failed(self):
+        self.temporary_login(self.user_id)
+        resp = self.post_json("/api/v1/batch", {"operations": [
+            {"op": "delete", "dataset_id": "6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0"},
+        ]})
+        self.assert200(resp)
+        self.assertFalse(resp.json["committed"])
+        self.assertFalse(resp.json["results"][0]["success"])
@@ -6,10 +6,13 @@ from db.testing import TEST_DATA_PATH
 import db.exceptions
 import webserver.views.api.exceptions
 import webserver.views.api.v1.datasets
+import webserver.ratelimit
 from utils import dataset_validator
 
+from datetime import datetime
 import json
 import mock
+import pytz
 import os
 import uuid
 
@@ -126,3 +129,147 @@ class APIDatasetViewsTestCase(ServerTestCase):
             webserver.views.api.v1.datasets.get_check_dataset("6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0")
         get.assert_called_once_with("6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0")
 
+
+    def test_get_dataset_fields(self):
+        dataset_id = db.dataset.create_from_dict({
+            "name": "Test", "public": True,
+            "classes": [{"name": "A", "recordings": ["0dad432b-16cc-4bf0-8961-fd31d124b01b"]}],
+        }, self.test_user_id)
+        url = "/api/v1/datasets/%s" % dataset_id
+
+        resp = self.client.get(url + "?fields=name,classes.name,classes.count")
+        self.assert200(resp)
+        self.assertEqual(resp.json, {"name": "Test", "classes": [{"name": "A", "count": 1}]})
+
+        resp = self.client.get(url + "?summary=true")
+        self.assertEqual(resp.json["author"], self.test_user_id)
+        self.assertEqual(resp.json["classes"][0]["count"], 1)
+        self.assertNotIn("recordings", resp.json["classes"][0])
+
+        resp = self.client.get(url + "?include=classes.count")
+        self.assertEqual(resp.json["classes"][0]["count"], 1)
+        self.assertEqual(len(resp.json["classes"][0]["recordings"]), 1)
+
+        resp = self.client.get(url + "?fields=size")
+        self.assert400(resp)
+
+    def test_get_class_recordings(self):
+        recordings = [
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+            "19e698e7-71df-48a9-930e-d4b1a2026c82",
+            "fd528ddb-411c-47bc-a383-1f8a222ed213",
+        ]
+        dataset_id = db.dataset.create_from_dict({
+            "name": "Test", "public": True, "classes": [{"name": "A/B", "recordings": recordings}],
+        }, self.test_user_id)
+        url = "/api/v1/datasets/%s/classes/A/B/recordings" % dataset_id
+
+        resp = self.client.get(url + "?limit=2")
+        self.assert200(resp)
+        self.assertEqual(len(resp.json["recordings"]), 2)
+        resp_next = self.client.get(url + "?limit=2&cursor=" + resp.json["next_cursor"])
+        self.assertIsNone(resp_next.json["next_cursor"])
+        self.assertEqual(sorted(resp.json["recordings"] + resp_next.json["recordings"]), recordings)
+
+        resp = self.client.get(url, headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(resp.mimetype, "application/x-ndjson")
+        lines = resp.get_data(as_text=True).splitlines()
+        self.assertEqual(sorted(json.loads(line)["mbid"] for line in lines), recordings)
+
+        self.assert400(self.client.get(url + "?limit=0"))
+        self.assert400(self.client.get(url + "?cursor=abc"))
+        self.assert404(self.client.get("/api/v1/datasets/%s/classes/C/recordings" % dataset_id))
+
+    def test_get_class_recordings_deleted(self):
+        recordings = [
+            "0dad432b-16cc-4bf0-8961-fd31d124b01b",
+            "19e698e7-71df-48a9-930e-d4b1a2026c82",
+            "fd528ddb-411c-47bc-a383-1f8a222ed213",
+        ]
+        dataset_id = db.dataset.create_from_dict({
+            "name": "Test", "public": True, "classes": [{"name": "A", "recordings": recordings}],
+        }, self.test_user_id)
+        self.app.config["DATASET_RECORDINGS_PAGE_MAX"] = 2
+        first_page = db.dataset.get_class_recordings(dataset_id, "A", limit=2)
+        # Class is deleted after the first page has been sent
+        with mock.patch("db.dataset.get_class_recordings", side_effect=[
+                first_page, db.exceptions.NoDataFoundException("Can't find this class.")]):
+            resp = self.client.get("/api/v1/datasets/%s/classes/A/recordings" % dataset_id,
+                                   headers={"Accept": "application/x-ndjson"})
+            self.assert200(resp)
+            # Response is streamed while it's read
+            lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        self.assertEqual(lines[:2], [{"mbid": mbid} for _, mbid in first_page])
+        self.assertEqual(lines[2], {"error": "Can't find this class."})
+
+    def test_get_dataset_stats(self):
+        dataset_id = db.dataset.create_from_dict({
+            "name": "Test", "public": False,
+            "classes": [{"name": "A", "recordings": ["0dad432b-16cc-4bf0-8961-fd31d124b01b"]}, {"name": "B", "recordings": []}],
+        }, self.test_user_id)
+        url = "/api/v1/datasets/%s/stats" % dataset_id
+        self.assert404(self.client.get(url))
+
+        self.temporary_login(self.test_user_id)
+        resp = self.client.get(url)
+        self.assert200(resp)
+        self.assertEqual(resp.json, {
+            "classes": 2,
+            "recordings": 1,
+            "class_sizes": [{"name": "A", "recordings": 1}, {"name": "B", "recordings": 0}],
+            "balance": 0,
+        })
+
+    @mock.patch("db.dataset.get")
+    def test_get_dataset_rate_limit(self, get):
+        get.return_value = {
+            "id": "6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0",
+            "public": True,
+            "last_edited": datetime(2016, 1, 1, tzinfo=pytz.utc),
+        }
+        self.app.config["RATELIMIT_ENDPOINTS"] = {"api_v1_datasets.get_dataset": (2, 60)}
+        webserver.ratelimit.init(self.app)
+
+        resp = self.client.get("/api/v1/datasets/6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["X-RateLimit-Limit"], "2")
+        self.assertEqual(resp.headers["X-RateLimit-Remaining"], "1")
+        self.assertIn("X-RateLimit-Reset", resp.headers)
+
+        self.client.get("/api/v1/datasets/6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0")
+        resp = self.client.get("/api/v1/datasets/6b6b9205-f9c8-4674-92f5-2ae17bcb3cb0")
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp.headers["X-RateLimit-Remaining"], "0")
+        self.assertEqual(resp.headers["Retry-After"], "30")
+        self.assertEqual(get.call_count, 2)
+
+    def test_add_recordings(self):
+        dataset_id = db.dataset.create_from_dict({
+            "name": "Test", "public": True, "classes": [{"name": "A", "recordings": []}],
+        }, self.test_user_id)
+        self.temporary_login(self.test_user_id)
+        url = "/api/v1/datasets/%s/recordings" % dataset_id
+        recordings = ["0dad432b-16cc-4bf0-8961-fd31d124b01b"]
+
+        resp = self.client.put(url, data=json.dumps({"class_name": "A", "recordings": recordings}),
+                               content_type="application/json")
+        self.assert200(resp)
+        self.assertEqual(db.dataset.get(dataset_id)["classes"][0]["recordings"], recordings)
+
+        resp = self.client.delete(url, data=json.dumps({"class_name": "A", "recordings": recordings}),
+                                  content_type="application/json")
+        self.assert200(resp)
+        self.assertEqual(db.dataset.get(dataset_id)["classes"][0]["recordings"], [])
+
+        resp = self.client.put(url, data=json.dumps({"class_name": "B", "recordings": recordings}),
+                               content_type="application/json")
+        self.assert404(resp)
+
+    def test_add_recordings_other_user(self):
+        dataset_id = db.dataset.create_from_dict({"name": "Test", "public": True, "classes": []},
+                                                 self.test_user_id)
+        self.temporary_login(db.user.create("other"))
+        resp = self.client.put("/api/v1/datasets/%s/recordings" % dataset_id,
+                               data=json.dumps({"class_name": "A", "recordings": []}),
+                               content_type="application/json")
+        self.assertEqual(resp.status_code, 401)
@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+import db.job
+import db.user
+import json
+
+
+class APIJobViewsTestCase(ServerTestCase):
+
+    def setUp(self):
+        super(APIJobViewsTestCase, self).setUp()
+        self.user_id = db.user.create("tester")
+        self.other_user_id = db.user.create("other")
+
+    def test_get_job(self):
+        job_id = db.job.create("create_dataset", {}, owner=self.user_id)
+        resp = self.client.get("/api/v1/jobs/%s" % job_id)
+        self.assertEqual(resp.status_code, 401)
+
+        self.temporary_login(self.user_id)
+        resp = self.client.get("/api/v1/jobs/%s" % job_id)
+        self.assert200(resp)
+        self.assertEqual(resp.json["id"], job_id)
+        self.assertEqual(resp.json["status"], "pending")
+        self.assertEqual(resp.json["progress"], 0)
+
+    def test_get_job_other_user(self):
+        job_id = db.job.create("create_dataset", {}, owner=self.other_user_id)
+        self.temporary_login(self.user_id)
+        resp = self.client.get("/api/v1/jobs/%s" % job_id)
+        self.assert404(resp)
+
+    def test_cancel_job(self):
+        job_id = db.job.create("create_dataset", {}, owner=self.user_id)
+        self.temporary_login(self.user_id)
+        resp = self.client.delete("/api/v1/jobs/%s" % job_id)
+        self.assert200(resp)
+        self.assertEqual(resp.json["status"], "cancelled")
+        self.assertEqual(db.job.get(job_id)["status"], "cancelled")
+
+    def test_create_dataset_in_background(self):
+        self.app.config["JOB_ASYNC_RECORDINGS"] = 2
+        self.temporary_login(self.user_id)
+        dataset = {
+            "name": "Test",
+            "classes": [{
+                "name": "A",
+                "recordings": ["0dad432b-16cc-4bf0-8961-fd31d124b01b", "19e698e7-71df-48a9-930e-d4b1a2026c82"],
+            }],
+        }
+        resp = self.client.post("/api/v1/datasets/", data=json.dumps(dataset), content_type="application/json")
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json["job_id"]
+        self.assertTrue(resp.headers["Location"].endswith("/api/v1/jobs/%s" % job_id))
+        job = db.job.claim()
+        self.assertEqual(job["id"], job_id)
+        self.assertEqual(job["owner"], self.user_id)
+        self.assertEqual(job["payload"]["dataset"]["name"], "Test")
+
+    def test_create_dataset_in_background_invalid(self):
+        self.app.config["JOB_ASYNC_RECORDINGS"] = 1
+        self.temporary_login(self.user_id)
+        dataset = {"classes": [{"name": "A", "recordings": ["0dad432b-16cc-4bf0-8961-fd31d124b01b"]}]}
+        resp = self.client.post("/api/v1/datasets/", data=json.dumps(dataset), content_type="application/json")
+        self.assert400(resp)
+        self.assertIsNone(db.job.claim())
@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+import db.dataset
+import db.job
+import db.user
+import json
+
+RECORDING_1 = "0dad432b-16cc-4bf0-8961-fd31d124b01b"
+RECORDING_2 = "19e698e7-71df-48a9-930e-d4b1a2026c82"
+
+
+class APIUploadViewsTestCase(ServerTestCase):
+
+    def setUp(self):
+        super(APIUploadViewsTestCase, self).setUp()
+        self.user_id = db.user.create("tester")
+
+    def post_json(self, url, data):
+        return self.client.post(url, data=json.dumps(data), content_type="application/json")
+
+    def put_json(self, url, data):
+        return self.client.put(url, data=json.dumps(data), content_type="application/json")
+
+    def create_session(self):
+        resp = self.post_json("/api/v1/datasets/uploads/", {
+            "name": "Test",
+            "classes": [{"name": "Class A"}, {"name": "Class B"}],
+        })
+        self.assert200(resp)
+        return resp.json["session_id"]
+
+    def test_create_forbidden(self):
+        resp = self.post_json("/api/v1/datasets/uploads/", {"name": "Test"})
+        self.assertEqual(resp.status_code, 401)
+
+    def test_create_invalid(self):
+        self.temporary_login(self.user_id)
+        resp = self.post_json("/api/v1/datasets/uploads/", {"classes": []})
+        self.assert400(resp)
+
+    def test_upload(self):
+        self.temporary_login(self.user_id)
+        session_id = self.create_session()
+
+        url = "/api/v1/datasets/uploads/%s/chunks/%d"
+        chunk = {"classes": [{"name": "Class A", "recordings": [RECORDING_1]}]}
+        resp = self.put_json(url % (session_id, 0), chunk)
+        self.assert200(resp)
+        self.assertTrue(resp.json["received"])
+        resp = self.put_json(url % (session_id, 0), chunk)
+        self.assertFalse(resp.json["received"])
+        self.put_json(url % (session_id, 1), {"classes": [{"name": "Class B", "recordings": [RECORDING_2]}]})
+
+        resp = self.client.get("/api/v1/datasets/uploads/%s" % session_id)
+        self.assertEqual(resp.json["chunks"], [0, 1])
+        self.assertEqual(resp.json["recordings"], 2)
+
+        resp = self.client.post("/api/v1/datasets/uploads/%s/commit" % session_id)
+        self.assert200(resp)
+        dataset = db.dataset.get(resp.json["dataset_id"])
+        self.assertEqual(dataset["public"], True)
+        self.assertEqual(len(dataset["classes"]), 2)
+
+    def test_add_chunk_invalid(self):
+        self.temporary_login(self.user_id)
+        session_id = self.create_session()
+        url = "/api/v1/datasets/uploads/%s/chunks/0" % session_id
+        resp = self.put_json(url, {"classes": [{"name": "Class C", "recordings": [RECORDING_1]}]})
+        self.assert400(resp)
+
+        self.app.config["UPLOAD_CHUNK_MAX_RECORDINGS"] = 1
+        resp = self.put_json(url, {"classes": [{"name": "Class A", "recordings": [RECORDING_1, RECORDING_2]}]})
+        self.assert400(resp)
+
+    def test_commit_in_background(self):
+        self.temporary_login(self.user_id)
+        session_id = self.create_session()
+        self.put_json("/api/v1/datasets/uploads/%s/chunks/0" % session_id,
+                      {"classes": [{"name": "Class A", "recordings": [RECORDING_1, RECORDING_2]}]})
+        self.app.config["JOB_ASYNC_RECORDINGS"] = 2
+        resp = self.client.post("/api/v1/datasets/uploads/%s/commit" % session_id)
+        self.assertEqual(resp.status_code, 202)
+        job = db.job.claim()
+        self.assertEqual(job["type"], "commit_upload")
+        self.assertEqual(job["payload"], {"session_id": session_id})
+
+    def test_other_user(self):
+        self.temporary_login(self.user_id)
+        session_id = self.create_session()
+        self.temporary_login(db.user.create("other"))
+        resp = self.client.get("/api/v1/datasets/uploads/%s" % session_id)
+        self.assert404(resp)
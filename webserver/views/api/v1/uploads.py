@@ -0,0 +1,153 @@
+from __future__ import absolute_import
+from flask import Blueprint, current_app, request
+from flask_login import current_user
+from webserver.decorators import auth_required, rate_limited
+from webserver.views.api import exceptions as api_exceptions
+from webserver.views.api.v1.jobs import accepted
+from webserver.serialization import json_response
+import db.exceptions
+import db.job
+import db.upload
+from utils import dataset_validator
+
+bp_uploads = Blueprint('api_v1_uploads', __name__)
+
+
+@bp_uploads.route("/", methods=["POST"])
+@rate_limited(rate=20, per=60)
+@auth_required
+def create_upload():
+    """Open a session for uploading a large dataset in chunks.
+
+    Request is the same as for creating a dataset, but recordings of classes
+    are optional and can be sent later with ``PUT
+    /api/v1/datasets/uploads/<session_id>/chunks/<seq>``. Names of classes must
+    be unique. Sessions that haven't been used for ``UPLOAD_SESSION_TTL``
+    seconds are deleted.
+
+    :reqheader Content-Type: *application/json*
+    :resheader Content-Type: *application/json*
+    :>json string session_id: ID of the upload session.
+    """
+    dataset_dict = request.get_json()
+    if not dataset_dict:
+        raise api_exceptions.APIBadRequest("Data must be submitted in JSON format.")
+    if "public" not in dataset_dict:
+        dataset_dict["public"] = True
+    if "classes" not in dataset_dict:
+        dataset_dict["classes"] = []
+    try:
+        session_id = db.upload.create(current_user.id, dataset_dict)
+    except dataset_validator.ValidationException as e:
+        raise api_exceptions.APIBadRequest(str(e))
+    return json_response({
+        "success": True,
+        "session_id": session_id,
+    })
+
+
+@bp_uploads.route("/<uuid:session_id>", methods=["GET"])
+@rate_limited
+@auth_required
+def get_upload(session_id):
+    """Retrieve status of an upload session.
+
+    :resheader Content-Type: *application/json*
+    :>json array chunks: Sequence numbers of chunks that have been received.
+    :>json number recordings: Number of recordings in received chunks.
+    :>json string dataset_id: ID of the dataset, if the session has been committed.
+    """
+    session = get_check_session(session_id)
+    return json_response({
+        "id": session["id"],
+        "chunks": session["chunks"],
+        "recordings": session["recordings"],
+        "dataset_id": session["dataset_id"],
+        "created": session["created"],
+        "last_activity": session["last_activity"],
+    })
+
+
+@bp_uploads.route("/<uuid:session_id>/chunks/<int:seq>", methods=["PUT"])
+@rate_limited
+@auth_required
+def add_chunk(session_id, seq):
+    """Add a chunk of recordings to an upload session.
+
+    Chunks are identified by their sequence numbers and can be sent in any
+    order. Sending a chunk again has no effect, so failed requests can be
+    retried.
+
+    **Example request**:
+
+    .. sourcecode:: json
+
+        {
+            "classes": [
+                {
+                    "name": "Happy",
+                    "recordings": ["770cc467-8dde-4d22-bc4c-a42f91e"]
+                }
+            ]
+        }
+
+    :reqheader Content-Type: *application/json*
+    :resheader Content-Type: *application/json*
+    :>json boolean received: ``false`` if the chunk had been received before.
+    """
+    get_check_session(session_id)
+    chunk = request.get_json()
+    if not chunk:
+        raise api_exceptions.APIBadRequest("Data must be submitted in JSON format.")
+    try:
+        size = sum(len(cls["recordings"]) for cls in chunk["classes"])
+    except (TypeError, KeyError):
+        size = 0
+    if size > current_app.config["UPLOAD_CHUNK_MAX_RECORDINGS"]:
+        raise api_exceptions.APIBadRequest("Chunks can't contain more than %d recordings." %
+                                           current_app.config["UPLOAD_CHUNK_MAX_RECORDINGS"])
+    try:
+        received = db.upload.add_chunk(session_id, seq, chunk)
+    except (dataset_validator.ValidationException, db.exceptions.BadDataException) as e:
+        raise api_exceptions.APIBadRequest(str(e))
+    return json_response({
+        "success": True,
+        "received": received,
+    })
+
+
+@bp_uploads.route("/<uuid:session_id>/commit", methods=["POST"])
+@rate_limited
+@auth_required
+def commit_upload(session_id):
+    """Create the dataset from an upload session.
+
+    Large datasets (``JOB_ASYNC_RECORDINGS`` in the config) are created in the
+    background. The response is then ``202 Accepted`` with ID of the job.
+    Committing a session again returns the same dataset.
+
+    :resheader Content-Type: *application/json*
+    :>json string dataset_id: ID of the new dataset.
+    :>json string job_id: ID of the job that creates the dataset, if it's created in the background.
+    """
+    session = get_check_session(session_id)
+    if session["dataset_id"] is None and \
+            session["recordings"] >= current_app.config["JOB_ASYNC_RECORDINGS"]:
+        job_id = db.job.create("commit_upload", {"session_id": session["id"]}, owner=current_user.id,
+                               max_attempts=current_app.config["JOB_MAX_ATTEMPTS"])
+        return accepted(job_id)
+    return json_response({
+        "success": True,
+        "dataset_id": db.upload.commit(session_id),
+    })
+
+
+def get_check_session(session_id):
+    """Get an upload session, checking that it belongs to the current user."""
+    try:
+        session = db.upload.get(session_id)
+    except db.exceptions.NoDataFoundException:
+        raise api_exceptions.APINotFound("Can't find this upload session.")
+    if session["owner"] != current_user.id:
+        raise api_exceptions.APINotFound("Can't find this upload session.")
+    return session
@@ -1,5 +1,5 @@
 from __future__ import absolute_import
-from flask import Blueprint, request, redirect, render_template, url_for, session
+from flask import Blueprint, request, redirect, render_template, url_for, session, current_app
 from flask_login import login_user, logout_user, login_required
 from webserver.login import login_forbidden, provider
 from webserver import flash
@@ -25,7 +25,13 @@ def musicbrainz():
 def musicbrainz_post():
     """Callback endpoint."""
     if provider.validate_post_login():
-        login_user(provider.get_user())
+        try:
+            user = provider.get_user()
+        except provider.ProviderError as e:
+            current_app.logger.error("Login failed: %s", e)
+            flash.error("Login failed.")
+            return redirect(url_for('index.index'))
+        login_user(user)
         next = session.get('next')
         if next:
             return redirect(next)
@@ -0,0 +1,58 @@
+from __future__ import absolute_import
+from flask import Blueprint, Response, current_app, request
+from werkzeug.exceptions import Unauthorized
+from webserver import metrics
+from webserver.serialization import json_response
+from sqlalchemy.exc import SQLAlchemyError
+import sqlalchemy
+import logging
+import hmac
+import time
+import db
+
+monitoring_bp = Blueprint('monitoring', __name__)
+
+
+@monitoring_bp.route("/metrics")
+def prometheus_metrics():
+    """Metrics of the server in Prometheus text format.
+
+    If METRICS_TOKEN is set, requests must include it in the
+    `Authorization: Bearer <token>` header.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    if token and not hmac.compare_digest(request.headers.get("Authorization", "").encode("utf-8"),
+                                         ("Bearer %s" % token).encode("utf-8")):
+        raise Unauthorized
+    return Response(metrics.get_registry().render(), headers={"Cache-Control": "no-cache"},
+                    content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@monitoring_bp.route("/health")
+def health():
+    """Check that the server can reach the database.
+
+    Returns 200 if it can and 503 otherwise. Response also includes the time
+    it takes to run a trivial query and the number of connections to the
+    database (from all clients).
+    """
+    result = {"database": {}}
+    start = time.time()
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(sqlalchemy.text("SELECT 1"))
+            latency = time.time() - start
+            connections = connection.execute(sqlalchemy.text("""
+                SELECT count(*)
+                  FROM pg_stat_activity
+                 WHERE datname = current_database()
+            """)).fetchone()[0]
+    except SQLAlchemyError:
+        logging.exception("Health check failed")
+        result["status"] = "error"
+        result["database"]["error"] = "database unavailable"
+        return json_response(result, status=503)
+    result["status"] = "ok"
+    result["database"]["latency_ms"] = round(latency * 1000, 3)
+    result["database"]["connections"] = connections
+    return json_response(result)
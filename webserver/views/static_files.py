@@ -0,0 +1,103 @@
+"""
+Serving of built static files (/static/build).
+
+* Revisioned files (the ones listed in the manifest) never change, so they are
+  marked as immutable and cached for a year. Other files are cached for
+  SEND_FILE_MAX_AGE_DEFAULT seconds.
+* If the client accepts it, a precompressed copy (.br or .gz) created at build
+  time with `manage.py compress_static` is sent instead of the original file.
+* Range requests are supported for uncompressed files.
+* With USE_X_SENDFILE, files are sent by the front-end web server.
+
+Other static files are served by Flask as usual.
+"""
+from __future__ import absolute_import
+from flask import Blueprint, Response, request, send_file, current_app, safe_join
+from werkzeug.exceptions import NotFound
+from webserver import static_manager
+import mimetypes
+import os
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CHUNK_SIZE = 64 * 1024
+
+static_files_bp = Blueprint('static_files', __name__)
+
+
+@static_files_bp.route("/static/build/<path:filename>")
+def build_file(filename):
+    path = safe_join(static_manager.BUILD_DIR, filename)
+    if not os.path.isfile(path):
+        raise NotFound
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    encoding = None
+    use_sendfile = current_app.config["USE_X_SENDFILE"]
+    if request.range is None or use_sendfile:
+        encoding, path = _choose_precompressed(path)
+    stat = os.stat(path)
+    etag = "%x-%x-%s" % (int(stat.st_mtime), stat.st_size, encoding or "identity")
+
+    if request.range is not None and not use_sendfile and _if_range_matches(etag):
+        response = _send_range(path, mimetype, stat.st_size)
+    else:
+        response = send_file(path, mimetype=mimetype, add_etags=False, conditional=False)
+        response.headers["Accept-Ranges"] = "none" if encoding else "bytes"
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if filename.endswith(static_manager.COMPRESSIBLE_EXTENSIONS):
+        response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    response.last_modified = int(stat.st_mtime)
+    # Cache-Control is enough, send_file's Expires would contradict it
+    response.headers.pop("Expires", None)
+    if static_manager.is_revisioned(filename):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = "public, max-age=%d" % \
+            current_app.get_send_file_max_age(filename)
+    return response.make_conditional(request)
+
+
+def _choose_precompressed(path):
+    """Find a precompressed copy of a file that the client accepts.
+
+    Returns:
+        Tuple with the content encoding (None if the original file should be
+        sent) and the path of the file.
+    """
+    accepted = request.accept_encodings
+    for encoding, extension in static_manager.PRECOMPRESSED:
+        if accepted[encoding] and os.path.isfile(path + extension):
+            return encoding, path + extension
+    return None, path
+
+
+def _if_range_matches(etag):
+    """Check the If-Range header. If it doesn't match, full file is sent."""
+    if_range = request.headers.get("If-Range")
+    return if_range is None or if_range.strip('"') == etag
+
+
+def _send_range(path, mimetype, size):
+    byte_range = request.range.range_for_length(size)
+    if byte_range is None:
+        return Response(status=416, headers={"Content-Range": "bytes */%d" % size})
+    start, stop = byte_range
+
+    def generate():
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return Response(generate(), status=206, mimetype=mimetype, headers={
+        "Content-Range": "bytes %d-%d/%d" % (start, stop - 1, size),
+        "Content-Length": str(stop - start),
+        "Accept-Ranges": "bytes",
+    })
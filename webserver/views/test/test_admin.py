@@ -0,0 +1,35 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+from flask import url_for
+import db.user
+
+
+class AdminViewsTestCase(ServerTestCase):
+
+    def setUp(self):
+        super(AdminViewsTestCase, self).setUp()
+        self.user_id = db.user.create("tester")
+        self.admin_id = db.user.create("admin")
+        db.user.set_admin("admin", admin=True)
+
+    def test_profiles(self):
+        resp = self.client.get(url_for('admin.profiles'))
+        self.assert401(resp)
+
+        self.temporary_login(self.user_id)
+        resp = self.client.get(url_for('admin.profiles'))
+        self.assert403(resp)
+
+        self.temporary_login(self.admin_id)
+        resp = self.client.get(url_for('admin.profiles'))
+        self.assert200(resp)
+
+    def test_memory(self):
+        self.temporary_login(self.admin_id)
+        resp = self.client.get(url_for('admin.memory_usage'))
+        self.assert200(resp)
+
+    def test_slow_queries(self):
+        self.temporary_login(self.admin_id)
+        resp = self.client.get(url_for('admin.slow_query_log'))
+        self.assert200(resp)
@@ -0,0 +1,42 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+from flask import url_for
+from sqlalchemy.exc import OperationalError
+import json
+import mock
+
+
+class MonitoringViewsTestCase(ServerTestCase):
+
+    def test_metrics(self):
+        self.client.get(url_for('index.index'))
+        resp = self.client.get(url_for('monitoring.prometheus_metrics'))
+        self.assert200(resp)
+        self.assertIn('http_requests_total{endpoint="index.index",method="GET",status="200"}',
+                      resp.data.decode("utf-8"))
+
+    def test_metrics_token(self):
+        self.app.config["METRICS_TOKEN"] = "secret"
+        self.assert401(self.client.get(url_for('monitoring.prometheus_metrics')))
+        self.assert401(self.client.get(url_for('monitoring.prometheus_metrics'),
+                                       headers={"Authorization": "Bearer wrong"}))
+        self.assert200(self.client.get(url_for('monitoring.prometheus_metrics'),
+                                       headers={"Authorization": "Bearer secret"}))
+
+    def test_health(self):
+        resp = self.client.get(url_for('monitoring.health'))
+        self.assert200(resp)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["status"], "ok")
+        self.assertIn("latency_ms", data["database"])
+        self.assertGreater(data["database"]["connections"], 0)
+
+    @mock.patch("db.engine.connect")
+    def test_health_error(self, connect):
+        connect.side_effect = OperationalError("SELECT 1", {}, Exception(
+            'could not connect to server: host "db.internal" (10.0.0.5), port 5432'))
+        resp = self.client.get(url_for('monitoring.health'))
+        self.assertEqual(resp.status_code, 503)
+        data = json.loads(resp.data.decode("utf-8"))
+        self.assertEqual(data["database"]["error"], "database unavailable")
+        self.assertNotIn("10.0.0.5", resp.data.decode("utf-8"))
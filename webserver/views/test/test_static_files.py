@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+from webserver.testing import ServerTestCase
+from webserver import static_manager, compression
+import tempfile
+import shutil
+import zlib
+import mock
+import os
+
+
+class StaticFilesViewsTestCase(ServerTestCase):
+
+    def setUp(self):
+        super(StaticFilesViewsTestCase, self).setUp()
+        self.build_dir = tempfile.mkdtemp()
+        self.content = b"body { color: red; }\n" * 100
+        with open(os.path.join(self.build_dir, "main-0123abcd.css"), "wb") as f:
+            f.write(self.content)
+        with open(os.path.join(self.build_dir, "main-0123abcd.css.gz"), "wb") as f:
+            f.write(compression.compress(self.content, "gzip", 6))
+        with open(os.path.join(self.build_dir, "other.css"), "wb") as f:
+            f.write(self.content)
+        patches = [
+            mock.patch.object(static_manager, "BUILD_DIR", self.build_dir),
+            mock.patch.object(static_manager, "manifest_content", {"main.css": "main-0123abcd.css"}),
+            mock.patch.object(static_manager, "_revisioned", frozenset(["main-0123abcd.css"])),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.build_dir)
+        super(StaticFilesViewsTestCase, self).tearDown()
+
+    def test_revisioned(self):
+        resp = self.client.get("/static/build/main-0123abcd.css")
+        self.assert200(resp)
+        self.assertEqual(resp.data, self.content)
+        self.assertIn("immutable", resp.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", resp.headers["Cache-Control"])
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+    def test_not_revisioned(self):
+        resp = self.client.get("/static/build/other.css")
+        self.assert200(resp)
+        self.assertNotIn("immutable", resp.headers["Cache-Control"])
+
+    def test_missing(self):
+        self.assert404(self.client.get("/static/build/missing.css"))
+        self.assert404(self.client.get("/static/build/../static_manager.py"))
+
+    def test_precompressed(self):
+        resp = self.client.get("/static/build/main-0123abcd.css", headers={"Accept-Encoding": "gzip"})
+        self.assert200(resp)
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertEqual(zlib.decompress(resp.data, 16 + zlib.MAX_WBITS), self.content)
+
+    def test_conditional(self):
+        resp = self.client.get("/static/build/main-0123abcd.css")
+        resp = self.client.get("/static/build/main-0123abcd.css",
+                               headers={"If-None-Match": resp.headers["ETag"]})
+        self.assertStatus(resp, 304)
+
+    def test_range(self):
+        resp = self.client.get("/static/build/main-0123abcd.css", headers={"Range": "bytes=5-9"})
+        self.assertStatus(resp, 206)
+        self.assertEqual(resp.data, self.content[5:10])
+        self.assertEqual(resp.headers["Content-Range"], "bytes 5-9/%d" % len(self.content))
+
+        resp = self.client.get("/static/build/main-0123abcd.css", headers={"Range": "bytes=100000-"})
+        self.assertStatus(resp, 416)
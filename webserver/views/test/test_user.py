@@ -3,6 +3,8 @@ from werkzeug.http import http_date
 from webserver.testing import ServerTestCase
 import db.user
 import db.api_key
+import db.dataset
+import mock
 
 
 class UserViewsTestCase(ServerTestCase):
@@ -14,6 +16,54 @@ class UserViewsTestCase(ServerTestCase):
         self.test_user_id = db.user.create(self.test_user_mb_name)
         self.test_user = db.user.get(self.test_user_id)
 
+    def create_dataset(self, name, public=True):
+        return db.dataset.create_from_dict({
+            "name": name,
+            "description": "",
+            "classes": [],
+            "public": public,
+        }, author_id=self.test_user_id)
+
+    def test_profile(self):
+        self.create_dataset("Public dataset")
+        self.create_dataset("Private dataset", public=False)
+
+        resp = self.client.get("/user/tester")
+        self.assert200(resp)
+        self.assertIn(b"Public dataset", resp.data)
+        self.assertNotIn(b"Private dataset", resp.data)
+        self.assertNotIn(b"API key", resp.data)
+
+        resp = self.client.get("/user/unknown")
+        self.assert404(resp)
+
+    def test_profile_own_page(self):
+        self.create_dataset("Private dataset", public=False)
+        key = db.api_key.generate(self.test_user_id)
+        self.temporary_login(self.test_user_id)
+
+        resp = self.client.get("/user/tester")
+        self.assert200(resp)
+        self.assertIn(b"Private dataset", resp.data)
+        self.assertIn(key.encode("ascii"), resp.data)
+
+    def test_profile_cache(self):
+        self.create_dataset("First dataset")
+        with mock.patch("db.dataset.get_by_user_id", wraps=db.dataset.get_by_user_id) as get_by_user_id:
+            self.client.get("/user/tester")
+            self.client.get("/user/tester")
+            self.assertEqual(get_by_user_id.call_count, 1)
+
+            self.create_dataset("Second dataset")
+            resp = self.client.get("/user/tester")
+            self.assertEqual(get_by_user_id.call_count, 2)
+            self.assertIn(b"Second dataset", resp.data)
+
+            # Owner's list includes private datasets, so it's cached separately
+            self.temporary_login(self.test_user_id)
+            self.client.get("/user/tester")
+            self.assertEqual(get_by_user_id.call_count, 3)
+
     def generate_api_key(self):
         resp = self.client.get("/user/generate-api-key")
         self.assertStatus(resp, 200)
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 from flask import Blueprint, render_template, jsonify
 from flask_login import current_user, login_required
 from werkzeug.exceptions import NotFound
+from webserver import fragments
 import db.user
 import db.dataset
 import db.api_key
@@ -14,24 +15,36 @@ def profile(musicbrainz_id):
     own_page = current_user.is_authenticated and \
                current_user.musicbrainz_id.lower() == musicbrainz_id.lower()
     if own_page:
+        user = {
+            "id": current_user.id,
+            "created": current_user.created,
+            "musicbrainz_id": current_user.musicbrainz_id,
+        }
         api_keys = db.api_key.get_active(current_user.id)
         args = {
-            "own_page": True,
-            "user": current_user,
-            "datasets": db.dataset.get_by_user_id(current_user.id, public_only=False),
             "api_key": api_keys[-1] if api_keys else None,
+            "api_key_usage": db.api_key.get_usage(current_user.id),
         }
     else:
         user = db.user.get_by_mb_id(musicbrainz_id)
         if user is None:
             raise NotFound("Can't find this user.")
-        args = {
-            "own_page": False,
-            "user": user,
-            "datasets": db.dataset.get_by_user_id(user["id"]),
-        }
+        args = {}
 
-    return render_template("user/profile.html", **args)
+    # Header and the list of datasets are the same for all visitors (owner
+    # also sees private datasets), so they are cached. Version must be read
+    # before datasets are loaded, otherwise a change made in between could
+    # be cached under the new version.
+    version = db.dataset.get_user_version(user["id"])
+    header = fragments.render("user/profile-header.html", user["id"], version, lambda: {
+        "user": user,
+    })
+    key = "%s:%s" % (user["id"], "all" if own_page else "public")
+    dataset_list = fragments.render("user/profile-datasets.html", key, version, lambda: {
+        "datasets": db.dataset.get_by_user_id(user["id"], public_only=not own_page),
+    })
+    return render_template("user/profile.html", own_page=own_page, user=user,
+                           header=header, dataset_list=dataset_list, **args)
 
 
 @user_bp.route("/user/generate-api-key", methods=['POST'])